@@ -0,0 +1,264 @@
+#!/usr/bin/env python3
+
+"""
+rough timings for the vectorized code paths, using synthetic data
+
+usage: python3 benchmark.py [ NAME ... ; default all ]
+"""
+
+import os
+import random
+import sys
+import tempfile
+import time
+
+from PIL import Image, ImageDraw
+
+
+def _timed(f, *args, **kwargs):
+    t = time.perf_counter()
+    result = f(*args, **kwargs)
+    return time.perf_counter() - t, result
+
+
+def _random_bytes(n, seed=6001):
+    return random.Random(seed).randbytes(n)
+
+
+def bench_paint_glyphs():
+    """one 128 KiB sheet worth of glyphs, per-pixel ImageDraw.point vs kanjisheet.paint_glyphs"""
+    from kanjisheet import glyph_bit_planes, paint_glyphs
+
+    b = _random_bytes(128 * 1024)
+    xb = bytes(0xFF if i % 7 == 0 else 0 for i in range(len(b)))
+    colors = [(0, 0, 0, 255), (255, 255, 255, 255), (255, 0, 255), (63, 0, 63)]
+    n = len(b) // 32
+    cx, cy = [cc % 256 for cc in range(n)], [cc // 256 for cc in range(n)]
+
+    def per_pixel():
+        im = Image.new("RGBA", (16 * 256, 16 * 16), (127, 127, 127, 0))
+        dr = ImageDraw.Draw(im)
+        for i in range(8 * len(b)):
+            dr.point(
+                (cx[i // 256] * 16 + i % 16, cy[i // 256] * 16 + (i // 16) % 16),
+                colors[2 * (xb[i // 8] != 0) + (1 if b[i // 8] & (128 >> (i % 8)) else 0)],
+            )
+        return im
+
+    def vectorized():
+        im = Image.new("RGBA", (16 * 256, 16 * 16), (127, 127, 127, 0))
+        bits, masked = glyph_bit_planes(b, xb)
+        paint_glyphs(im, colors, 2 * masked + bits, cx, cy)
+        return im
+
+    slow, slow_im = _timed(per_pixel)
+    fast, fast_im = _timed(vectorized)
+    assert slow_im.tobytes() == fast_im.tobytes()
+    return slow, fast
+
+
+def bench_exkanjiviz():
+    """exkanjiviz end to end on a 128 KiB synthetic EXKANJI.ROM (no baseline)"""
+    from exkanjiviz import exkanjiviz
+
+    with tempfile.TemporaryDirectory() as tmp:
+        rom, png = os.path.join(tmp, "EXKANJI.ROM"), os.path.join(tmp, "exkanji.png")
+        open(rom, "wb").write(_random_bytes(128 * 1024))
+        elapsed, _ = _timed(exkanjiviz, rom, png)
+    return None, elapsed
+
+
+def bench_exkanji_layout():
+    """EXKANJI.ROM to JIS order plus mask, per-byte generators vs exkanjilayout gathers"""
+    from exkanjilayout import HALF_WIDTH_SIZE, exkanji_mask, exkanji_to_jis, swiz
+
+    rom = _random_bytes(128 * 1024)
+
+    def per_byte():
+        b = bytes(
+            rom[(i & 1) * 128 * 32 + (i >> (2 if i & 1 else 1))]
+            for i in range(256 * 32)
+        ) + swiz(rom[HALF_WIDTH_SIZE:])
+        b = b[: (256 + 32 * 21) * 32] + b"\x00" * (4 * 32 * 32) + b[(256 + 32 * 21) * 32 :]
+        xb = bytes(
+            0xFF
+            if (i >= (256 + 32 * 21) * 32 and i < ((256 + 32 * 25) * 32))
+            or ((i >= 256 * 32) and (((i - 256 * 32) // 32) % 96) in (0, 95))
+            or (i >= (256 + 1 * 96 + 16) * 32 and i < (256 + 2 * 96) * 32)
+            else 0x00
+            for i in range(len(b))
+        )
+        return b, xb
+
+    def gathered():
+        b = exkanji_to_jis(rom)
+        return b, exkanji_mask(len(b))
+
+    gathered()  # build the index arrays outside the timing
+    slow, slow_result = _timed(per_byte)
+    fast, fast_result = _timed(gathered)
+    assert slow_result == fast_result
+    return slow, fast
+
+
+def bench_kanjiconvert():
+    """PC-8801 kanji1.rom and kanji2.rom to a 256 KiB MSX KANJI.ROM in IC order, one cached gather (no baseline)"""
+    from kanjiconvert import convert
+
+    rom = _random_bytes(256 * 1024)
+    convert(rom, "pc8801", "msx-ic")  # builds the index arrays
+    elapsed, _ = _timed(convert, rom, "pc8801", "msx-ic")
+    return None, elapsed
+
+
+def bench_interleave():
+    """two 1 MiB pages, per-byte generator vs interleave.interleave"""
+    from interleave import interleave
+
+    pages = [_random_bytes(1024 * 1024, seed) for seed in range(2)]
+
+    def per_byte():
+        n = len(pages)
+        return bytes(pages[i % n][i // n] for i in range(n * len(pages[0])))
+
+    slow, slow_result = _timed(per_byte)
+    fast, fast_result = _timed(interleave, pages=pages)
+    assert slow_result == fast_result
+    return slow, fast
+
+
+def bench_kanjirom_to_jisrom():
+    """KANJIROM subset to JIS level 1, kuten list scan vs kanjirom6x gather"""
+    from kanjirom6x import JIS_TO_KANJIROM6X_KUTEN_DATA, kanjirom_to_jisrom
+
+    kanjirom = _random_bytes(32 * 1024)
+
+    def scanned():
+        jisrom, rest = b"", kanjirom
+        for ku in range(1, 48):
+            if ku >= 10 and ku < 16:
+                continue
+            for ten in range(96):
+                if (ku, ten) in JIS_TO_KANJIROM6X_KUTEN_DATA:
+                    jisrom, rest = jisrom + rest[:32], rest[32:]
+                else:
+                    jisrom += b"\xff" * 32
+        return jisrom
+
+    slow, slow_result = _timed(scanned)
+    fast, fast_result = _timed(kanjirom_to_jisrom, kanjirom)
+    assert slow_result == fast_result
+    return slow, fast
+
+
+def bench_shuffle_kanji():
+    """a 256 KiB MSX Level 2 Kanji ROM and a 128 KiB SKW-01 one as 16x16 cells, per-glyph joins vs one gather each"""
+    import msxbioskanjiviz, skwkanjiviz
+
+    msx, skw = _random_bytes(256 * 1024), _random_bytes(128 * 1024, 1)
+
+    def shuffle_glyph(glyph, right, bottom):
+        return b"".join(
+            [glyph[i : 1 + i] + glyph[right + i : right + 1 + i] for i in range(8)]
+            + [
+                glyph[bottom + i : bottom + 1 + i] + glyph[24 + i : 25 + i]
+                for i in range(8)
+            ]
+        )
+
+    def per_glyph():
+        return [
+            b"".join(
+                shuffle_glyph(
+                    b"".join(bytes([k[32 * ch + o]]) for o in range(32)), right, bottom
+                )
+                for ch in range(len(k) // 32)
+            )
+            for k, right, bottom in ((msx, 8, 16), (skw, 16, 8))
+        ]
+
+    def gathered():
+        return [msxbioskanjiviz.shuffle_kanji(msx), skwkanjiviz.shuffle_kanji(skw)]
+
+    slow, slow_result = _timed(per_glyph)
+    fast, fast_result = _timed(gathered)
+    assert slow_result == fast_result
+    return slow, fast
+
+
+def bench_msxbioskanjiviz():
+    """msxbioskanjiviz end to end on a synthetic BIOS.ROM with 256 KiB of Level 2 KANJI1.ROM and KANJI2.ROM (no baseline)"""
+    from msxbioskanjiviz import msxbioskanjiviz
+
+    bios = bytearray(_random_bytes(32 * 1024))
+    bios[4:6] = (0x1BBF).to_bytes(2, "little")
+    kanji = bytearray(_random_bytes(256 * 1024, 1))
+    # just enough to pass the Level 1 and Level 2 validity checks
+    kanji[0x80 * 32 : 8 + 0x80 * 32] = bytes([(0x80 >> i) & 0x7F for i in range(8)])
+    kanji[0x1D7E * 32] = (0x95 - sum(kanji[1 + 0x1D7E * 32 : 8 + 0x1D7E * 32])) & 0xFF
+    with tempfile.TemporaryDirectory() as tmp:
+        roms = [os.path.join(tmp, name) for name in ("BIOS.ROM", "KANJI1.ROM", "KANJI2.ROM")]
+        for rom, data in zip(roms, (bios, kanji[: 128 * 1024], kanji[128 * 1024 :])):
+            open(rom, "wb").write(data)
+        png = os.path.join(tmp, "msxbioskanji.png")
+        elapsed, _ = _timed(msxbioskanjiviz, roms[0], roms[1:], png)
+    return None, elapsed
+
+
+def bench_typeset():
+    """5000 lines of mixed full-width and half-width text on a synthetic ROM font (no baseline)"""
+    from glyphfont import GlyphFont
+    from typeset import Typesetter, _encode_jisx0201
+
+    b = _random_bytes(32 * 96 * 96)
+    pages = (([32 * c for c in range(256)], 2, 16),)
+    font = GlyphFont(b, bytes(len(b)), 0, tuple(range(96)), b, pages)
+    text = "吾輩は猫である。名前はまだ無い。 ABC abc 123 ｱｲｳｴｵ\n" * 5000
+    elapsed, _ = _timed(Typesetter(font, _encode_jisx0201).render, text, 80)
+    return None, elapsed
+
+
+def bench_charsets():
+    """a 20000 line PC-6001 BASIC listing encoded and decoded through the codec (no baseline)"""
+    import charsets  # registers the codecs
+
+    text = '10 PRINT "ｱｲｳ あいう が ABC ~"\n' * 20000
+
+    def round_trip():
+        assert text.encode("pc6001-8bit").decode("pc6001-8bit") == text
+
+    elapsed, _ = _timed(round_trip)
+    return None, elapsed
+
+
+def bench_n60basic():
+    """a 1000 line N60-BASIC listing (about 50 KiB tokenized) tokenized and detokenized again (no baseline)"""
+    from n60basic import detokenize, tokenize
+
+    body = '"ｱｲｳ",A$:IF INKEY$="" THEN GOTO 10:POKE &HC000+I,PEEK(I)'
+    listing = "".join(f"{n} PRINT {body}\r\n" for n in range(1000))
+
+    def round_trip():
+        assert detokenize(tokenize(listing, 0)) == listing
+
+    elapsed, _ = _timed(round_trip)
+    return None, elapsed
+
+
+BENCHMARKS = {
+    name[len("bench_") :]: f for name, f in globals().items() if name.startswith("bench_")
+}
+
+
+def main():
+    _, *names = sys.argv
+    for name in names or BENCHMARKS:
+        baseline, elapsed = BENCHMARKS[name]()
+        print(
+            f"{name}: {elapsed:.3f}s"
+            + (f" (was {baseline:.3f}s, {baseline / elapsed:.1f}x)" if baseline else "")
+        )
+
+
+if __name__ == "__main__":
+    main()
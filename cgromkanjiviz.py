@@ -17,6 +17,7 @@ It should work with data from SR models too, just adjust the filenames.
      - PC-6601: `python cgromkanjiviz.py CGROM60.66 CGROM66.66 KANJIROM.66 cgromkanji.png`
          or: `python cgromkanjiviz.py CGROM60.66 CGROM66.66 KANJIROM1.66 KANJIROM2.66 cgromkanji.png`
      - SR models: adjust the filenames
+     - add `--indexed` for a smaller 8-bit palette PNG
 3. the created `cgrom.png` or `cgromkanji.png` will have a visualization of the ROM contents with CGROM laid out in grids and the PC-6001mkII/PC-6601 Kanji ROM subset laid out according to JIS ordering, which is not the same as the storage order
 
 ## ROM Data Extraction
@@ -34,49 +35,30 @@ The `kanji1.rom` from the PC-8801 series has identical contents to PC-6007SR's K
 """
 
 
-from PIL import Image, ImageDraw
+from PIL import ImageDraw
+
+from charsets import (
+    ASCII_CONTROLS,
+    MINIMAL_CONTROLS,
+    NO_CONTROLS,
+    PC6001_8BIT_ALTCHARSET,
+    PC6001_8BIT_CHARSET,
+    decode_pc6001_8bit_charset,
+    encode_pc6001_8bit_charset,
+)
+from kanjirom6x import (
+    JIS_TO_KANJIROM6X_KUTEN_DATA,
+    in_kanjirom6x,
+    kanjirom_to_jisrom,
+)
+from kanjisheet import GlyphBlitter, new_sheet
+from oldjis import missing_from_old_jis
+from romsource import Layout, halves, map_rom
 
 import codecs
 import gzip
 import sys
-import unicodedata
-
 
-# The list of kuten codes used to extract the KANJIROM subset from
-# EXKANJIROM is stored as a compressed list of skips.
-
-
-def _decompress_kuten_data(compressed_kuten_data):
-    ku_then_ten_data = gzip.decompress(codecs.decode(compressed_kuten_data, "base64"))
-    ku_data, ten_data = (
-        ku_then_ten_data[: len(ku_then_ten_data) // 2],
-        ku_then_ten_data[len(ku_then_ten_data) // 2 :],
-    )
-    assert len(ku_data) == len(ten_data)
-    kuten_data = []
-    o = (0, None)
-    for i in range(len(ku_data)):
-        o = (
-            (o[0] + ku_data[i], ten_data[i])
-            if ku_data[i]
-            else (o[0], o[1] + ten_data[i] + 1)
-        )
-        kuten_data.append(o)
-    return kuten_data
-
-
-JIS_TO_KANJIROM6X_KUTEN_DATA = _decompress_kuten_data(
-    b"H4sIANj6o2gC/71T7W4bMQwTJVl2Lu1aoEDf/1FHytft17AgvS1BLoktix+i3+3PLzy19VAVvnX6"
-    b"8SpchPL3Qth1UM8cwQVl+C/McY2cp8k+nRj8s2jgulE9VPF7r2q+uAUcgTCHm94RYA3SgA8LZ/ng"
-    b"nhU37OYJrqW6zN0JrNWLZR5A8ie3o0J7bjxaLyCAddtpcV/8Dut/GGycJED8JLbp47spTwrgTn6v"
-    b"3gBa17J+hbt4kyeGEZSdtWqF6taRMSe6cLNPbpl7nR64ZDV1IwkIFRvQtfzqUbbVSyb5UwvurSOE"
-    b"J52EE6pTK5VQsCdtlIeJ1qCzlBXsJark42F9znHOYT9Hq469EhtSj7apraWpS2q0uMHNUpy3V+01"
-    b"IukKmwW2l4d3y2xN8kpAA1ltOKdJos2XT5ftOZQC+dRd39joR5P1pua/wsN0+GgpJ/wX5VSuRkqu"
-    b"vbmVGrf1qs8tB34eiPO7Sqhrb9DJOcjM1hccA6egnG7dNpGhoRDNg7Gzz917LaBzmaJcwVlJN1WN"
-    b"lmk5G5vORRtt+c6OHUDXMofuSxzQE2sZZbe4H0xhn2M1G0Pxky+FQ+HAnl9lbiOKlyH2sJWz0sh1"
-    b"bca5rwBFcI5MxqFq1tChicVOx9B1SJJaLXqAacSk0h771KjGCLnVN043pS8wV3v859UhxZk+FWKP"
-    b"vq+5OPRCzJCwn5XY2LIACAAA"
-)
 
 # M5C6847P-1 inherent character data
 # SG6: 2x3 mosaic tiles
@@ -122,151 +104,6 @@ SG4_PATTERNS = b"".join(
     ]
 )
 
-# 8-bit/single-byte character encoding schemes
-
-NO_CONTROLS = b""
-MINIMAL_CONTROLS = b"\0\r\n\x1a\x7f"
-ASCII_CONTROLS = bytes(range(0x20)) + b"\x7f"
-
-# i am sure this is not the best way to solve this. this mapping
-# should work OK for PC-6001/mkII/SR and PC-6601/SR. it does not
-# handle the alternate character set shift sequences well. it also
-# does not handle fullwidth Kanji (neither the subset built in to
-# mkII/SR and 6601/SR, nor the larger set present in the extended
-# Kanji ROM/RAM cartridge), additional single-byte graphics charsets
-# from PC-6001 mkII/SR and PC-6601/SR, semi-graphics charset, or
-# PC-6001A charset at all! the mapping is intentionally close to the
-# PC-98 one above. the hiragana and kanji here should all be
-# half-width ones, but Unicode is missing those so we live with
-# fullwidth instead. the arrows and control pictures shown here in the
-# first row are actually control characters and are not graphically
-# displayable on a PC-6001. the font data inside the PC-6001's
-# M5C6847P-1 is not normally used by PC-6001 software, but does
-# contain arrow graphics. likewise the extended graphics character set
-# in the PC-6001 mkII/SR and PC-6601/SR CGROM is rearely used by
-# software, but it also contains arrow graphics. those infrequently
-# used character sets are not handled here, though.
-PC6001_8BIT_CHARSET = (
-    "␀␁␂␃␄␅␆␇␈␉␊␋␌␍␎␏␐␑␒␓␔␕␖␗␘␙␚␛￫￩￪￬"
-    " !\"#$%&'()*+,-./0123456789:;<=>?"
-    "@ABCDEFGHIJKLMNOPQRSTUVWXYZ[¥]^_"
-    "`abcdefghijklmnopqrstuvwxyz{¦}~␡"
-    "♠♥♦♣￮•をぁぃぅぇぉゃゅょっ\uf8f4あいうえおかきくけこさしすせそ"
-    "\uf8f0｡｢｣､･ｦｧｨｩｪｫｬｭｮｯｰｱｲｳｴｵｶｷｸｹｺｻｼｽｾｿ"
-    "ﾀﾁﾂﾃﾄﾅﾆﾇﾈﾉﾊﾋﾌﾍﾎﾏﾐﾑﾒﾓﾔﾕﾖﾗﾘﾙﾚﾛﾜﾝﾞﾟ"
-    "たちつてとなにぬねのはひふへほまみむめもやゆよらりるれろわん\uf8f2\uf8f3"
-)
-assert len(PC6001_8BIT_CHARSET) == 256
-PC6001_8BIT_ALTCHARSET = "\uf8f1月火水木金土日年円時分秒百千万" "π┴┬┤├┼│─┌┐└┘╳大中小"
-assert len(PC6001_8BIT_ALTCHARSET) == 32
-PC6001_8BIT_CHARMAP = {PC6001_8BIT_CHARSET[i]: bytes([i]) for i in range(256)} | {
-    PC6001_8BIT_ALTCHARSET[i]: bytes([0x14, i + 0x30]) for i in range(32)
-}
-PC6001_8BIT_CHARMAP_COMPAT = {
-    unicodedata.normalize("NFKD", key): value
-    for key, value in PC6001_8BIT_CHARMAP.items()
-    if unicodedata.normalize("NFKD", key) != key
-} | {
-    "\N{KATAKANA-HIRAGANA VOICED SOUND MARK}": PC6001_8BIT_CHARMAP[
-        "\N{HALFWIDTH KATAKANA VOICED SOUND MARK}"
-    ],
-    "\N{KATAKANA-HIRAGANA SEMI-VOICED SOUND MARK}": PC6001_8BIT_CHARMAP[
-        "\N{HALFWIDTH KATAKANA SEMI-VOICED SOUND MARK}"
-    ],
-    "\N{KATAKANA-HIRAGANA PROLONGED SOUND MARK}": PC6001_8BIT_CHARMAP[
-        "\N{HALFWIDTH KATAKANA-HIRAGANA PROLONGED SOUND MARK}"
-    ],
-}
-
-
-def encode_pc6001_8bit_charset(s, try_harder=True):
-    s = "".join(
-        [
-            (
-                unicodedata.normalize("NFKD", s[i : i + 1])
-                if (
-                    unicodedata.name(s[i : i + 1], "?")
-                    .lower()
-                    .startswith("hiragana letter")
-                    or unicodedata.name(s[i : i + 1], "?")
-                    .lower()
-                    .startswith("katakana letter")
-                )
-                else (
-                    "~"
-                    if s[i : i + 1] == "\N{WAVE DASH}"
-                    else "-" if s[i : i + 1] == "\N{HYPHEN}" else s[i : i + 1]
-                )
-            )
-            for i in range(len(s))
-        ]
-    )
-    byts, chars_consumed, num_chars = b"", 0, len(s)
-    while chars_consumed < num_chars:
-        ch = s[chars_consumed]
-        byt = PC6001_8BIT_CHARMAP.get(ch, PC6001_8BIT_CHARMAP_COMPAT.get(ch)) or (
-            bytes([ord(ch)]) if ord(ch) <= 0x7F else None
-        )
-        if byt is None and try_harder:
-            cch = unicodedata.normalize("NFKD", ch)
-            byt = PC6001_8BIT_CHARMAP.get(cch, PC6001_8BIT_CHARMAP_COMPAT.get(cch)) or (
-                bytes([ord(cch)]) if len(cch) == 1 and ord(cch) <= 0x7F else None
-            )
-        if byt is None and try_harder:
-            cch = unicodedata.normalize("NFC", ch)
-            byt = PC6001_8BIT_CHARMAP.get(cch, PC6001_8BIT_CHARMAP_COMPAT.get(cch)) or (
-                bytes([ord(cch)]) if len(cch) == 1 and ord(cch) <= 0x7F else None
-            )
-        if byt is None:
-            raise UnicodeEncodeError(
-                "pc6001-8bit",
-                s,
-                chars_consumed,
-                chars_consumed + 1,
-                f"no mapping for U+{ord(ch):04X} {unicodedata.name(ch, repr(ch))}",
-            )
-        byts += byt
-        chars_consumed += 1
-    return byts
-
-
-def decode_pc6001_8bit_charset(byts, preserve=MINIMAL_CONTROLS):
-    s, bytes_consumed, num_bytes = "", 0, len(byts)
-    while bytes_consumed < num_bytes:
-        byt = byts[bytes_consumed]
-        if (
-            bytes_consumed > 0
-            and byts[bytes_consumed - 1] == 0x14
-            and byt >= 0x30
-            and byt <= 0x4F
-        ):
-            s = (
-                s[: -len(PC6001_8BIT_CHARSET[0x14])]
-                + PC6001_8BIT_ALTCHARSET[byt - 0x30]
-            )
-        elif byt in preserve:
-            s += chr(byt)
-        else:
-            s += PC6001_8BIT_CHARSET[byt]
-        if (
-            len(s) > 1
-            and s[-1:]
-            in "\N{HALFWIDTH KATAKANA VOICED SOUND MARK}\N{HALFWIDTH KATAKANA SEMI-VOICED SOUND MARK}"
-            and unicodedata.name(s[-2:-1], "?").lower().startswith("hiragana letter")
-        ):
-            s = s[:-2] + unicodedata.normalize("NFKC", s[-2:])
-        bytes_consumed += 1
-    round_trip_byts = encode_pc6001_8bit_charset(s)
-    assert byts == round_trip_byts, UnicodeDecodeError(
-        "pc6001-8bit",
-        byts,
-        0,
-        num_bytes,
-        f"round-trip failure for {repr(s)} with preserve={repr(preserve)}; result:\n {repr(byts)}, got:\n {repr(round_trip_byts)}",
-    )
-    return s
-
-
 def smoke_test_pc6001_8bit_charset():
     assert decode_pc6001_8bit_charset(b"") == ""
     assert encode_pc6001_8bit_charset("") == b""
@@ -474,95 +311,62 @@ def smoke_test_pc6001_8bit_charset():
 smoke_test_pc6001_8bit_charset()
 
 
-def kanjirom_to_jisrom(kanjirom):
-    """
-    expand KANJIROM subset into JIS level 1
-    """
-    assert len(kanjirom) == 32 * 1024
-    jisrom = b""
-    for ku in range(1, 48):
-        if ku >= 10 and ku < 16:
-            continue
-        for ten in range(96):
-            kuten = (ku, ten)
-            if kuten in JIS_TO_KANJIROM6X_KUTEN_DATA:
-                jisrom += kanjirom[:32]
-                kanjirom = kanjirom[32:]
-            else:
-                jisrom += b"\xff" * 32
-    return jisrom
-
-
-def interleave(*, pages):
-    """
-    return the bytes of each page concatenated in an interleaved fashion
-    """
-    assert len(pages) > 1
-    assert len({len(page) for page in pages}) == 1
-    return bytes(
-        pages[i % len(pages)][i // len(pages)]
-        for i in range(len(pages) * len(pages[0]))
-    )
+def cgrom_is_n60(cgrom):
+    """Return True if the CGROM image named by `cgrom` only has the N60 character set, so the semigraphics have to be synthesized."""
+    return len(map_rom(cgrom)) // 16 <= 256
 
 
-def cgromkanjiviz(cgrom, cgrom_m, kanji_roms, cgromkanji_png):
-    """Given an input file named by `cgromkanji_rom` containing Level 1 Kanji font ROM data in PC-8801 series `kanji1.rom` format a.k.a. PC-6007SR Kakuchou Kanji ROM & RAM Cartridge / PC-6601-01 Kakuchou Kakuchou ROM Cartridge `saverkanji` EXKANJI.ROM format, produce a visualization and save it as a PNG in the output file named by `exkanji_png`."""
-    b = open(cgrom, "rb").read()
-    xb = (b"\0" * 12 + b"\xff" * 4) * min(len(b) // 16, 256 + 64)
-    b += b"\0" * (512 * 16 - len(b))
-    xb += b"\xff" * (512 * 16 - len(xb))
-    is_n60 = xb[16 * 256 : 16 * 512] == b"\xff" * 16 * 256
-    if is_n60:
+def cgromkanji_layout(cgrom, cgrom_m, kanji_roms):
+    """Given input files named by `cgrom`, `cgrom_m` (optional) and `kanji_roms` (zero, one or two deinterleaved Kanji ROM images), return `(b, xb)`: the glyph data laid out as 16x16 cells, CGROM and CGROMm interleaved in the first 1024 cells and the KANJIROM subset expanded to JIS order from cell 512, and the matching mask data."""
+    cg = map_rom(cgrom)
+    assert len(cg) <= 512 * 16
+    k = Layout(32 * 1024)
+    xk = Layout(32 * 1024, 0xFF)
+    if kanji_roms:
+        pages = [map_rom(kanji_rom) for kanji_rom in kanji_roms]
+        if len(pages) == 1:
+            pages = halves(pages[0])
+        assert len(pages) * len(pages[0]) <= len(k)
+        k.interleave(pages)
+        xk.fill(0x00, 0, len(pages) * len(pages[0]))
+    k = kanjirom_to_jisrom(k.view())
+    xk = kanjirom_to_jisrom(xk.view())
+    b = Layout(max(128 * 1024, 1024 * 16 + len(k)))
+    xb = Layout(len(b), 0xFF)
+    # CGROM and CGROMm are interleaved byte by byte into 16x16 cells
+    b.write(cg, 0, 2)
+    xb.write((b"\0" * 12 + b"\xff" * 4) * min(len(cg) // 16, 256 + 64), 0, 2)
+    if cgrom_is_n60(cgrom):
         assert len(VDG_FONT) == 128 * 16
         assert len(SG6_PATTERNS) == 64 * 16
         assert len(SG4_PATTERNS) == 16 * 16
-        b = b[: 16 * 256] + SG6_PATTERNS + VDG_FONT + 4 * SG4_PATTERNS + b[16 * 512 :]
-        xb = xb[: 16 * 256] + 256 * (12 * b"\0" + 4 * b"\xff") + xb[16 * 512 :]
-    assert len(b) == 512 * 16
+        b.write(SG6_PATTERNS + VDG_FONT + 4 * SG4_PATTERNS, 2 * 16 * 256, 2)
+        xb.write(256 * (12 * b"\0" + 4 * b"\xff"), 2 * 16 * 256, 2)
     if cgrom_m:
-        b += open(cgrom_m, "rb").read()
-        xb += (b"\0" * 10 + b"\xff" * 6) * ((len(b) - len(xb)) // 16)
-    b += b"\0" * (1024 * 16 - len(b))
-    xb += b"\xff" * (len(b) - len(xb))
-    assert len(b) == 1024 * 16
-    b = interleave(pages=[b[: 512 * 16], b[512 * 16 :]])
-    xb = interleave(pages=[xb[: 512 * 16], xb[512 * 16 :]])
-    k = b""
-    if kanji_roms:
-        pages = [open(kanji_rom, "rb").read() for kanji_rom in kanji_roms]
-        if len(pages) == 1:
-            assert len(pages[0]) % 2 == 0
-            pages = [pages[0][: len(pages[0]) // 2], pages[0][len(pages[0]) // 2 :]]
-        k = interleave(pages=pages)
-    xk = b"\0" * len(k)
-    k = k + b"\0" * (32 * 1024 - len(k))
-    xk += b"\xff" * (len(k) - len(xk))
-    assert len(k) == 32 * 1024
-    k = kanjirom_to_jisrom(k)
-    xk = kanjirom_to_jisrom(xk)
-    b += k
-    xb += xk
-    b += b"\0" * (128 * 1024 - len(b))
-    xb += b"\xff" * (len(b) - len(xb))
+        cg_m = map_rom(cgrom_m)
+        assert len(cg_m) <= 512 * 16
+        b.write(cg_m, 1, 2)
+        xb.write((b"\0" * 10 + b"\xff" * 6) * (len(cg_m) // 16), 1, 2)
+    b.write(k, 1024 * 16)
+    xb.write(xk, 1024 * 16)
+    b, xb = b.view(), xb.view()
+    return b, xb
+
+
+def cgromkanjiviz(cgrom, cgrom_m, kanji_roms, cgromkanji_png, indexed=False):
+    """Given an input file named by `cgromkanji_rom` containing Level 1 Kanji font ROM data in PC-8801 series `kanji1.rom` format a.k.a. PC-6007SR Kakuchou Kanji ROM & RAM Cartridge / PC-6601-01 Kakuchou Kakuchou ROM Cartridge `saverkanji` EXKANJI.ROM format, produce a visualization and save it as a PNG in the output file named by `exkanji_png`. With `indexed`, the PNG is an 8-bit palette image instead of RGBA."""
+    b, xb = cgromkanji_layout(cgrom, cgrom_m, kanji_roms)
+    is_n60 = cgrom_is_n60(cgrom)
 
     def cvtr(r):
         return 1 + r + 6 * (r > 8)
 
-    def rtok(byts):
-        return (
-            byts.decode("EUC-JP", "ignore")
-            .encode("iso2022_jp_1", "ignore")
-            .decode("iso2022_jp_1", "ignore")
-            .encode("EUC-JP")
-            == byts
-        )
-
     def invc(cc):
         return (
             False
             if (cc < 512)
-            else not rtok(
-                bytes([min(cvtr((cc - 512) // 96), 95) + 0xA0, (cc - 512) % 96 + 0xA0])
+            else missing_from_old_jis(
+                min(cvtr((cc - 512) // 96), 95), (cc - 512) % 96
             )
         )
 
@@ -582,8 +386,8 @@ def cgromkanjiviz(cgrom, cgrom_m, kanji_roms, cgromkanji_png):
     k3 = (0, 255, 0)
     w4 = (0, 127, 0)
 
-    im = Image.new(
-        "RGBA",
+    palette = [k, w, g, h, v, w1, k1, w2, k2, w3, k3, w4]
+    im, inks = new_sheet(
         (
             max((z + 1) * z, 16) * 16,
             (
@@ -592,46 +396,25 @@ def cgromkanjiviz(cgrom, cgrom_m, kanji_roms, cgromkanji_png):
             )
             * 16,
         ),
+        palette,
         g,
+        indexed,
     )
+    k, w, g, h, v, w1, k1, w2, k2, w3, k3, w4 = inks
 
     def kuten_ch(kuten):
         return 512 + (kuten[0] - 1 - (6 if kuten[0] >= 16 else 0)) * 96 + kuten[1]
 
-    def putkuten_at(dr, kuten, coords, color_pair):
-        x, y = coords
-        fg, bg = color_pair
-        for i in range(256):
-            dr.point(
-                (x + i % 16, y + i // 16),
-                (fg if b[kuten_ch(kuten) * 32 + (i // 8)] & (0x80 >> (i % 8)) else bg),
-            )
+    def putkuten_at(text, kuten, coords, color_pair):
+        text.blit((16, b[kuten_ch(kuten) * 32 :][:32], b""), coords, color_pair)
 
-    def putch_at(dr, ch, coords, color_pair, font, scale=1):
-        x, y = coords
-        fg, bg = color_pair
-        for i in range(128):
-            if xb[ord(ch) * 32 + (font & 1) + 256 * 32 * (font >> 1) + 2 * (i // 8)] & (
-                0x80 >> (i % 8)
-            ):
-                continue
-            for yo in range(scale):
-                dr.point(
-                    (x + i % 8, y + scale * (i // 8) + yo),
-                    (
-                        fg
-                        if b[
-                            ord(ch) * 32
-                            + (font & 1)
-                            + 256 * 32 * (font >> 1)
-                            + 2 * (i // 8)
-                        ]
-                        & (0x80 >> (i % 8))
-                        else bg
-                    ),
-                )
+    def putch_at(text, ch, coords, color_pair, font, scale=1):
+        o = ord(ch) * 32 + (font & 1) + 256 * 32 * (font >> 1)
+        text.blit(
+            (8, b[o : o + 32 : 2], xb[o : o + 32 : 2]), coords, color_pair, scale
+        )
 
-    def puts_at(dr, s, coords, color_pair, font=0, scale=1):
+    def puts_at(text, s, coords, color_pair, font=0, scale=1):
         x, y = coords
         for i in range(len(s)):
             ch = s[i : i + 1]
@@ -660,58 +443,58 @@ def cgromkanjiviz(cgrom, cgrom_m, kanji_roms, cgromkanji_png):
                     ch_font = 3
                 else:
                     ch = "^"
-            putch_at(dr, ch, (x + 8 * scale * i, y), color_pair, ch_font, scale)
+            putch_at(text, ch, (x + 8 * scale * i, y), color_pair, ch_font, scale)
 
-    dr = ImageDraw.Draw(im)
+    text = GlyphBlitter(im)
     if kanji_roms:
         puts_at(
-            dr,
+            text,
             " NEC PC-6001mkII/PC-6601 Kanji ROM (subset) ",
             (16 * 16 + 8, 4),
             (v, h),
         )
     puts_at(
-        dr,
+        text,
         "\N{LEFTWARDS ARROW} PC-6001/PC-6601 8-bit character set (8x12)",
         (16 * 16 + 4, 20),
         (k3, k),
     )
     if not is_n60:
         puts_at(
-            dr,
+            text,
             "PC-6001mkII/PC-6601 graphics (8x12) \N{RIGHTWARDS ARROW}",
             (16 * 235, 20),
             (k3, k),
         )
     else:
         puts_at(
-            dr,
+            text,
             "M5C6847P-1 SG6 2x3 (8x12) \N{RIGHTWARDS ARROW}",
             (16 * 235, 20),
             (k3, k),
         )
         puts_at(
-            dr,
+            text,
             "M5C6847P-1 VDG FONT (8x12) \N{RIGHTWARDS ARROW}",
             (16 * 235, 84),
             (k3, k),
         )
         puts_at(
-            dr,
+            text,
             "4x M5C6847P-1 SG4 2x2 (8x12) \N{RIGHTWARDS ARROW}",
             (16 * 235, 212),
             (k3, k),
         )
     if cgrom_m:
         puts_at(
-            dr,
+            text,
             "\N{LEFTWARDS ARROW} PC-6001/PC-6601 8-bit character set (8x10)",
             (16 * 16 + 4, 40),
             (w, k),
             font=1,
         )
         puts_at(
-            dr,
+            text,
             "PC-6001mkII/PC-6601 graphics (8x10) \N{RIGHTWARDS ARROW}",
             (16 * 235, 40),
             (w, k),
@@ -719,38 +502,38 @@ def cgromkanjiviz(cgrom, cgrom_m, kanji_roms, cgromkanji_png):
         )
     if kanji_roms:
         puts_at(
-            dr,
+            text,
             "\N{DOWNWARDS ARROW} (row number)",
             ((16 + 1) * 16 + 8, (16 - (96 + z - 1) // z - 1) * 16 - 4),
             (w1, k),
         )
         puts_at(
-            dr,
+            text,
             "\N{DOWNWARDS ARROW} (unallocated code area)",
             ((32 + z + 4) * 16 + 8, (16 - (96 + z - 1) // z - 1) * 16 - 4),
             (w2, k),
         )
         puts_at(
-            dr,
+            text,
             "\N{DOWNWARDS ARROW} (missing from old JIS)",
             ((17 * 7 + 2 + z) * 16 + 8, (16 - (96 + z - 1) // z - 1) * 16 - 4),
             (w1, k),
         )
         puts_at(
-            dr,
+            text,
             "fullwidth character set (subset of old JIS with level 1 Kanji)",
             (16 * 16 + 8, (16 - (96 + z - 1) // z - 2) * 16 - 4),
             (w, k),
         )
         for i in range(1, 95):
             puts_at(
-                dr,
+                text,
                 "%02d" % i,
                 (16 * (i % z + 3 * (z + 1) - z // 2), 24 + 16 * (i // z)),
                 ([w1, k][i % 2], [k, w1][i % 2]),
             )
         puts_at(
-            dr,
+            text,
             "\N{LEFTWARDS ARROW} (column number key)",
             (-12 + 16 * (4 * (z + 1) - z // 2), 24 + 12),
             (w1, k),
@@ -775,6 +558,9 @@ def cgromkanjiviz(cgrom, cgrom_m, kanji_roms, cgromkanji_png):
 
     kanjirom_subset_chs = {kuten_ch(kuten) for kuten in JIS_TO_KANJIROM6X_KUTEN_DATA}
 
+    cell_invc = [invc(cc) for cc in range(len(b) // 32)]
+    dr = ImageDraw.Draw(im)
+
     for i in range(8 * len(b)):
         if (
             not xb[i // 8]
@@ -804,18 +590,18 @@ def cgromkanjiviz(cgrom, cgrom_m, kanji_roms, cgromkanji_png):
                         w2,
                         w1,
                     ]
-                )[2 * invc(i // 256) + (xb[i // 8] != 0)],
+                )[2 * cell_invc[i // 256] + (xb[i // 8] != 0)],
             )
     if kanji_roms:
         for i in range(1, 48 - 6):
             puts_at(
-                dr,
+                text,
                 f"{i + (6 if i >= 10 else 0):02d}",
                 (16 * chx(512 + 96 * (i - 1)), 16 * chy(512 + 96 * (i - 1))),
                 (k, w1),
             )
             puts_at(
-                dr,
+                text,
                 f"{i + (6 if i >= 10 else 0):02d}",
                 (16 * chx(512 + 96 * (i - 1) + 95), 16 * chy(512 + 96 * (i - 1) + 95)),
                 (k, w1),
@@ -823,9 +609,9 @@ def cgromkanjiviz(cgrom, cgrom_m, kanji_roms, cgromkanji_png):
         xdeflect = 0
         for i, ch in enumerate("ＰＣ−６００１ｍｋＩＩとＰＣ−６６０１漢字ＲＯＭ"):
             kuten = [byt - 0xA0 for byt in ch.encode("EUC-JP")]
-            if tuple(kuten) in JIS_TO_KANJIROM6X_KUTEN_DATA:
+            if in_kanjirom6x(*kuten):
                 putkuten_at(
-                    dr,
+                    text,
                     kuten,
                     ((18 + i) * 16 + 4 + xdeflect, 104),
                     (v, h),
@@ -835,7 +621,7 @@ def cgromkanjiviz(cgrom, cgrom_m, kanji_roms, cgromkanji_png):
                     ch = "-"
                 ch = encode_pc6001_8bit_charset(ch)
                 puts_at(
-                    dr,
+                    text,
                     ch,
                     ((18 + i) * 16 + 4 + xdeflect, 104 - 1),
                     (v, h),
@@ -849,21 +635,23 @@ def cgromkanjiviz(cgrom, cgrom_m, kanji_roms, cgromkanji_png):
 def main():
     cgrom_m = None
     kanji_roms = []
+    indexed = "--indexed" in sys.argv
+    argv = [arg for arg in sys.argv if arg != "--indexed"]
     try:
-        _, cgrom, cgromkanji_png = sys.argv
+        _, cgrom, cgromkanji_png = argv
     except:
         try:
-            _, cgrom, cgrom_m, cgromkanji_png = sys.argv
+            _, cgrom, cgrom_m, cgromkanji_png = argv
         except:
             try:
-                _, cgrom, cgrom_m, kanji_rom, cgromkanji_png = sys.argv
+                _, cgrom, cgrom_m, kanji_rom, cgromkanji_png = argv
                 kanji_roms = [kanji_rom]
             except:
                 _, cgrom, cgrom_m, kanji_rom1, kanji_rom2, cgromkanji_png = (
-                    sys.argv
-                )  # usage: python cgromkanjiviz.py CGROM [ CGROMm [ KANJIROM or KANJIROM1 KANJIROM2 ] ] OUTPUT
+                    argv
+                )  # usage: python cgromkanjiviz.py [ --indexed ] CGROM [ CGROMm [ KANJIROM or KANJIROM1 KANJIROM2 ] ] OUTPUT
                 kanji_roms = [kanji_rom1, kanji_rom2]
-    cgromkanjiviz(cgrom, cgrom_m, kanji_roms, cgromkanji_png)
+    cgromkanjiviz(cgrom, cgrom_m, kanji_roms, cgromkanji_png, indexed)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,369 @@
+#!/usr/bin/env python3
+
+"""
+the PC-6001 and Japanese MSX 8-bit character sets, as Python codecs
+
+Importing this module registers the `pc6001-8bit` and `msxjp-8bit`
+codecs, so `open(path, encoding="pc6001-8bit")` and
+`data.decode("msxjp-8bit")` work, incremental and streaming use
+included. Encoding and decoding go through translation tables built
+from the character maps below, one C-level `str.translate` per call.
+The alternate character set (a shift byte, 0x14 on the PC-6001 and
+0x01 on the MSX, followed by the character code) is picked out with a
+regular expression first, and the incremental decoder holds back a
+trailing shift byte, or anything a following sound mark could still
+combine with, until the next chunk arrives.
+
+usage: python3 charsets.py
+
+(running it performs a quick self-test)
+"""
+
+import codecs
+import io
+import re
+import unicodedata
+
+# 8-bit/single-byte character encoding schemes
+
+NO_CONTROLS = b""
+MINIMAL_CONTROLS = b"\0\r\n\x1a\x7f"
+ASCII_CONTROLS = bytes(range(0x20)) + b"\x7f"
+
+# i am sure this is not the best way to solve this. this mapping
+# should work OK for PC-6001/mkII/SR and PC-6601/SR. it does not
+# handle the alternate character set shift sequences well. it also
+# does not handle fullwidth Kanji (neither the subset built in to
+# mkII/SR and 6601/SR, nor the larger set present in the extended
+# Kanji ROM/RAM cartridge), additional single-byte graphics charsets
+# from PC-6001 mkII/SR and PC-6601/SR, semi-graphics charset, or
+# PC-6001A charset at all! the mapping is intentionally close to the
+# PC-98 one above. the hiragana and kanji here should all be
+# half-width ones, but Unicode is missing those so we live with
+# fullwidth instead. the arrows and control pictures shown here in the
+# first row are actually control characters and are not graphically
+# displayable on a PC-6001. the font data inside the PC-6001's
+# M5C6847P-1 is not normally used by PC-6001 software, but does
+# contain arrow graphics. likewise the extended graphics character set
+# in the PC-6001 mkII/SR and PC-6601/SR CGROM is rearely used by
+# software, but it also contains arrow graphics. those infrequently
+# used character sets are not handled here, though.
+PC6001_8BIT_CHARSET = (
+    "␀␁␂␃␄␅␆␇␈␉␊␋␌␍␎␏␐␑␒␓␔␕␖␗␘␙␚␛￫￩￪￬"
+    " !\"#$%&'()*+,-./0123456789:;<=>?"
+    "@ABCDEFGHIJKLMNOPQRSTUVWXYZ[¥]^_"
+    "`abcdefghijklmnopqrstuvwxyz{¦}~␡"
+    "♠♥♦♣￮•をぁぃぅぇぉゃゅょっ\uf8f4あいうえおかきくけこさしすせそ"
+    "\uf8f0｡｢｣､･ｦｧｨｩｪｫｬｭｮｯｰｱｲｳｴｵｶｷｸｹｺｻｼｽｾｿ"
+    "ﾀﾁﾂﾃﾄﾅﾆﾇﾈﾉﾊﾋﾌﾍﾎﾏﾐﾑﾒﾓﾔﾕﾖﾗﾘﾙﾚﾛﾜﾝﾞﾟ"
+    "たちつてとなにぬねのはひふへほまみむめもやゆよらりるれろわん\uf8f2\uf8f3"
+)
+assert len(PC6001_8BIT_CHARSET) == 256
+PC6001_8BIT_ALTCHARSET = "\uf8f1月火水木金土日年円時分秒百千万" "π┴┬┤├┼│─┌┐└┘╳大中小"
+assert len(PC6001_8BIT_ALTCHARSET) == 32
+
+# i am sure this is not the best way to solve this. this mapping
+# should work OK for a Japanese MSX. it does not handle the alternate
+# character set shift sequences well. it also does not handle
+# fullwidth Kanji! the hiragana and kanji here should all be
+# half-width ones, but Unicode is missing those so we live with
+# fullwidth instead. the arrows and control pictures shown here in the
+# first row are actually control characters and are not graphically
+# displayable on an MSX.
+MSXJP_8BIT_CHARSET = (
+    "␀␁␂␃␄␅␆␇␈␉␊␋␌␍␎␏␐␑␒␓␔␕␖␗␘␙␚␛￫￩￪￬"
+    " !\"#$%&'()*+,-./0123456789:;<=>?"
+    "@ABCDEFGHIJKLMNOPQRSTUVWXYZ[¥]^_"
+    "`abcdefghijklmnopqrstuvwxyz{¦}~␡"
+    "♠♥♦♣￮•をぁぃぅぇぉゃゅょっ\uf8f4あいうえおかきくけこさしすせそ"
+    "\uf8f0｡｢｣､･ｦｧｨｩｪｫｬｭｮｯｰｱｲｳｴｵｶｷｸｹｺｻｼｽｾｿ"
+    "ﾀﾁﾂﾃﾄﾅﾆﾇﾈﾉﾊﾋﾌﾍﾎﾏﾐﾑﾒﾓﾔﾕﾖﾗﾘﾙﾚﾛﾜﾝﾞﾟ"
+    "たちつてとなにぬねのはひふへほまみむめもやゆよらりるれろわん\uf8f2\uf8f3"
+)
+assert len(MSXJP_8BIT_CHARSET) == 256
+MSXJP_8BIT_ALTCHARSET = "\uf8f1月火水木金土日年円時分秒百千万" "π┴┬┤├┼│─┌┐└┘╳大中小"
+assert len(MSXJP_8BIT_ALTCHARSET) == 32
+
+SOUND_MARKS = (
+    "\N{HALFWIDTH KATAKANA VOICED SOUND MARK}"
+    "\N{HALFWIDTH KATAKANA SEMI-VOICED SOUND MARK}"
+)
+
+
+def _is_letter(ch, *scripts):
+    return unicodedata.name(ch, "?").lower().startswith(scripts)
+
+
+class _Unmappable(Exception):
+    pass
+
+
+class _EncodingTable(dict):
+    # code point -> encoded bytes as a latin-1 string, filled in on demand
+    # by str.translate; raising anything but LookupError stops it
+    __slots__ = ("encode_char",)
+
+    def __init__(self, encode_char):
+        super().__init__()
+        self.encode_char = encode_char
+
+    def __missing__(self, code):
+        encoded = self.encode_char(chr(code))
+        if encoded is None:
+            raise _Unmappable
+        self[code] = encoded.decode("latin-1")
+        return self[code]
+
+
+class Charset:
+    """
+    an 8-bit character set with a 32-character alternate set reached through `shift` followed by `alt_base` ... `alt_base + 31`
+    """
+
+    __slots__ = (
+        "name",
+        "charset",
+        "altcharset",
+        "shift",
+        "alt_base",
+        "charmap",
+        "charmap_compat",
+        "_encoding_tables",
+        "_decoding_tables",
+        "_alt_sequence",
+        "_sound_marks",
+        "_held",
+    )
+
+    def __init__(self, name, charset, altcharset, shift, alt_base):
+        self.name = name
+        self.charset = charset
+        self.altcharset = altcharset
+        self.shift = shift
+        self.alt_base = alt_base
+        self.charmap = {charset[i]: bytes([i]) for i in range(256)} | {
+            altcharset[i]: bytes([shift, i + alt_base]) for i in range(32)
+        }
+        self.charmap_compat = {
+            unicodedata.normalize("NFKD", key): value
+            for key, value in self.charmap.items()
+            if unicodedata.normalize("NFKD", key) != key
+        } | {
+            "\N{KATAKANA-HIRAGANA VOICED SOUND MARK}": self.charmap[
+                "\N{HALFWIDTH KATAKANA VOICED SOUND MARK}"
+            ],
+            "\N{KATAKANA-HIRAGANA SEMI-VOICED SOUND MARK}": self.charmap[
+                "\N{HALFWIDTH KATAKANA SEMI-VOICED SOUND MARK}"
+            ],
+            "\N{KATAKANA-HIRAGANA PROLONGED SOUND MARK}": self.charmap[
+                "\N{HALFWIDTH KATAKANA-HIRAGANA PROLONGED SOUND MARK}"
+            ],
+        }
+        self._encoding_tables = {
+            try_harder: _EncodingTable(
+                lambda ch, try_harder=try_harder: self._encode_char(ch, try_harder)
+            )
+            for try_harder in (False, True)
+        }
+        self._decoding_tables = {}
+        self._alt_sequence = re.compile(
+            f"\\x{shift:02x}([\\x{alt_base:02x}-\\x{alt_base + 31:02x}])"
+        )
+        hiragana = "".join(ch for ch in charset if _is_letter(ch, "hiragana letter"))
+        self._sound_marks = re.compile(f"([{hiragana}])([{SOUND_MARKS}]+)")
+        # bytes whose decoding may still change with the byte after them
+        self._held = bytes(
+            [shift]
+            + [i for i in range(256) if charset[i] in hiragana + SOUND_MARKS]
+        )
+
+    def _lookup(self, ch):
+        return self.charmap.get(ch, self.charmap_compat.get(ch)) or (
+            bytes([ord(ch)]) if len(ch) == 1 and ord(ch) <= 0x7F else None
+        )
+
+    def _encode_char(self, ch, try_harder):
+        if _is_letter(ch, "hiragana letter", "katakana letter"):
+            chars = unicodedata.normalize("NFKD", ch)
+        else:
+            chars = {"\N{WAVE DASH}": "~", "\N{HYPHEN}": "-"}.get(ch, ch)
+        encoded = b""
+        for ch in chars:
+            byt = self._lookup(ch)
+            if byt is None and try_harder:
+                byt = self._lookup(unicodedata.normalize("NFKD", ch))
+            if byt is None and try_harder:
+                byt = self._lookup(unicodedata.normalize("NFC", ch))
+            if byt is None:
+                return None
+            encoded += byt
+        return encoded
+
+    def encode(self, s, try_harder=True, errors="strict"):
+        """
+        return `s` encoded; `try_harder` also tries the NFKD and NFC forms of characters with no mapping of their own
+        """
+        table = self._encoding_tables[try_harder]
+        try:
+            return s.translate(table).encode("latin-1")
+        except _Unmappable:
+            pass
+        encoded, i = [], 0
+        while i < len(s):
+            try:
+                encoded.append(s[i].translate(table).encode("latin-1"))
+                i += 1
+                continue
+            except _Unmappable:
+                pass
+            error = UnicodeEncodeError(
+                self.name,
+                s,
+                i,
+                i + 1,
+                f"no mapping for U+{ord(s[i]):04X} {unicodedata.name(s[i], repr(s[i]))}",
+            )
+            if errors == "strict":
+                raise error
+            replacement, i = codecs.lookup_error(errors)(error)
+            if isinstance(replacement, str):
+                replacement = self.encode(replacement, try_harder)
+            encoded.append(replacement)
+        return b"".join(encoded)
+
+    def _decoding_table(self, preserve):
+        preserve = bytes(preserve)
+        table = self._decoding_tables.get(preserve)
+        if table is None:
+            table = "".join(
+                chr(i) if i in preserve else self.charset[i] for i in range(256)
+            )
+            self._decoding_tables[preserve] = table
+        return table
+
+    def decode(self, byts, preserve=MINIMAL_CONTROLS):
+        """
+        return `byts` decoded, with the control codes in `preserve` decoded as themselves rather than as control pictures
+        """
+        table = self._decoding_table(preserve)
+        parts = self._alt_sequence.split(bytes(byts).decode("latin-1"))
+        parts[0::2] = [part.translate(table) for part in parts[0::2]]
+        parts[1::2] = [self.altcharset[ord(code) - self.alt_base] for code in parts[1::2]]
+        return self._sound_marks.sub(_combine_sound_marks, "".join(parts))
+
+    def held(self, byts):
+        """
+        return how many bytes at the end of `byts` may decode differently depending on what follows
+        """
+        held = 0
+        while held < len(byts) and byts[len(byts) - 1 - held] in self._held:
+            held += 1
+        return held
+
+    def codec_info(self, preserve=MINIMAL_CONTROLS):
+        """
+        return a `codecs.CodecInfo` for this character set
+        """
+        charset = self
+
+        def encode(input, errors="strict"):
+            return charset.encode(input, errors=errors), len(input)
+
+        def decode(input, errors="strict"):
+            return charset.decode(input, preserve), len(input)
+
+        class IncrementalEncoder(codecs.IncrementalEncoder):
+            def encode(self, input, final=False):
+                return charset.encode(input, errors=self.errors)
+
+        class IncrementalDecoder(codecs.BufferedIncrementalDecoder):
+            def _buffer_decode(self, input, errors, final):
+                cut = len(input) - (0 if final else charset.held(input))
+                return charset.decode(input[:cut], preserve), cut
+
+        return codecs.CodecInfo(
+            name=self.name,
+            encode=encode,
+            decode=decode,
+            incrementalencoder=IncrementalEncoder,
+            incrementaldecoder=IncrementalDecoder,
+        )
+
+
+def _combine_sound_marks(match):
+    # a sound mark after a hiragana letter combines with it, if it can
+    s = match[1]
+    for mark in match[2]:
+        if _is_letter(s[-1], "hiragana letter"):
+            s = s[:-1] + unicodedata.normalize("NFKC", s[-1] + mark)
+        else:
+            s += mark
+    return s
+
+
+PC6001_8BIT = Charset(
+    "pc6001-8bit", PC6001_8BIT_CHARSET, PC6001_8BIT_ALTCHARSET, 0x14, 0x30
+)
+MSXJP_8BIT = Charset("msxjp-8bit", MSXJP_8BIT_CHARSET, MSXJP_8BIT_ALTCHARSET, 0x01, 0x40)
+PC6001_8BIT_CHARMAP = PC6001_8BIT.charmap
+PC6001_8BIT_CHARMAP_COMPAT = PC6001_8BIT.charmap_compat
+MSXJP_8BIT_CHARMAP = MSXJP_8BIT.charmap
+MSXJP_8BIT_CHARMAP_COMPAT = MSXJP_8BIT.charmap_compat
+
+_CODECS = {"pc6001_8bit": PC6001_8BIT, "msxjp_8bit": MSXJP_8BIT}
+
+
+def _search_codec(name):
+    charset = _CODECS.get(name.replace("-", "_"))
+    return charset and charset.codec_info()
+
+
+codecs.register(_search_codec)
+
+
+def encode_pc6001_8bit_charset(s, try_harder=True):
+    return PC6001_8BIT.encode(s, try_harder)
+
+
+def decode_pc6001_8bit_charset(byts, preserve=MINIMAL_CONTROLS):
+    return PC6001_8BIT.decode(byts, preserve)
+
+
+def encode_msxjp_8bit_charset(s, try_harder=True):
+    return MSXJP_8BIT.encode(s, try_harder)
+
+
+def decode_msxjp_8bit_charset(byts, preserve=MINIMAL_CONTROLS):
+    return MSXJP_8BIT.decode(byts, preserve)
+
+
+def smoke_test_charsets():
+    text = "10 PRINT \"パピコン 大すき\"\r\n20 PRINT \"かﾞﾞ 円\"\r\n" * 50
+    for name, charset in (("pc6001-8bit", PC6001_8BIT), ("msxjp_8bit", MSXJP_8BIT)):
+        data = text.encode(name)
+        assert data == charset.encode(text)
+        decoded = data.decode(name)
+        assert decoded == charset.decode(data)
+        assert codecs.decode(data, name) == decoded
+        # every chunk boundary, including ones inside alternate
+        # character set sequences and before sound marks
+        for size in range(1, 8):
+            decoder = codecs.getincrementaldecoder(name)()
+            chunks = [data[i : i + size] for i in range(0, len(data), size)]
+            assert "".join(decoder.decode(chunk) for chunk in chunks) + decoder.decode(
+                b"", final=True
+            ) == decoded, (name, size)
+        stream = io.BytesIO()
+        with io.TextIOWrapper(stream, encoding=name, newline="") as f:
+            f.write(text)
+            f.flush()
+            assert stream.getvalue() == data
+            f.seek(0)
+            assert f.read() == decoded
+    assert "a漢b".encode("pc6001-8bit", "replace") == b"a?b"
+    assert PC6001_8BIT.decode(b"\x14\x14\x30\x30") == "␔0"
+    assert MSXJP_8BIT.decode(b"\x01\x5f") == "小"
+
+
+if __name__ == "__main__":
+    smoke_test_charsets()
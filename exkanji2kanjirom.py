@@ -26,113 +26,17 @@ ROM fingerprint information for the version dumped from my cartridge:
 - `128K PC-6007SR Kakuchou Kanji ROM & RAM Cartridge (NEC) (Japan) (PC-6001mkII) [saverkanji EXKANJI format].rom crc32:6178bd43 md5:d81c6d5d7ad1a4bbbd6ae22a01257603 sha1:82e11a177af6a5091dd67f50a2f4bafda84d6556 sha256:7608040cffb1951e5cc567abb63f75b5746777a1ba96196c1b75606b793bb4bb size:131072`
 """
 
-import codecs
-import gzip
 import sys
 
-# The list of kuten codes used to extract the KANJIROM subset from
-# EXKANJIROM is stored as a compressed list of skips.
-
-
-def _decompress_kuten_data(compressed_kuten_data):
-    ku_then_ten_data = gzip.decompress(codecs.decode(compressed_kuten_data, "base64"))
-    ku_data, ten_data = (
-        ku_then_ten_data[: len(ku_then_ten_data) // 2],
-        ku_then_ten_data[len(ku_then_ten_data) // 2 :],
-    )
-    assert len(ku_data) == len(ten_data)
-    kuten_data = []
-    o = (0, None)
-    for i in range(len(ku_data)):
-        o = (
-            (o[0] + ku_data[i], ten_data[i])
-            if ku_data[i]
-            else (o[0], o[1] + ten_data[i] + 1)
-        )
-        kuten_data.append(o)
-    return kuten_data
-
-
-JIS_TO_KANJIROM6X_KUTEN_DATA = _decompress_kuten_data(
-    b"H4sIANj6o2gC/71T7W4bMQwTJVl2Lu1aoEDf/1FHytft17AgvS1BLoktix+i3+3PLzy19VAVvnX6"
-    b"8SpchPL3Qth1UM8cwQVl+C/McY2cp8k+nRj8s2jgulE9VPF7r2q+uAUcgTCHm94RYA3SgA8LZ/ng"
-    b"nhU37OYJrqW6zN0JrNWLZR5A8ie3o0J7bjxaLyCAddtpcV/8Dut/GGycJED8JLbp47spTwrgTn6v"
-    b"3gBa17J+hbt4kyeGEZSdtWqF6taRMSe6cLNPbpl7nR64ZDV1IwkIFRvQtfzqUbbVSyb5UwvurSOE"
-    b"J52EE6pTK5VQsCdtlIeJ1qCzlBXsJark42F9znHOYT9Hq469EhtSj7apraWpS2q0uMHNUpy3V+01"
-    b"IukKmwW2l4d3y2xN8kpAA1ltOKdJos2XT5ftOZQC+dRd39joR5P1pua/wsN0+GgpJ/wX5VSuRkqu"
-    b"vbmVGrf1qs8tB34eiPO7Sqhrb9DJOcjM1hccA6egnG7dNpGhoRDNg7Gzz917LaBzmaJcwVlJN1WN"
-    b"lmk5G5vORRtt+c6OHUDXMofuSxzQE2sZZbe4H0xhn2M1G0Pxky+FQ+HAnl9lbiOKlyH2sJWz0sh1"
-    b"bca5rwBFcI5MxqFq1tChicVOx9B1SJJaLXqAacSk0h771KjGCLnVN043pS8wV3v859UhxZk+FWKP"
-    b"vq+5OPRCzJCwn5XY2LIACAAA"
-)
-
-
-# NEC stored the kanji ROM in a different order than JIS, but derived
-# from it in a systematic way. These swizzler functions are used to
-# remap to JIS order.
-def swizp(p):
-    return (p % 3) * 8 + (p // 3) % 8 + (p // 24) * 24
-
-
-def swizs(s):
-    return (s % 3) * 32 + (s // 3)
-
-
-def swizr(r):
-    return swizs(r) ^ 16
-
-
-def swizk(k):
-    return swizr(k - 23) + 23 if k >= 23 else k
-
-
-def swizj(j):
-    return swizk(swizp(j) if j < 24 else j)
-
-
-def swizi(i):
-    return (i & 0x1F) | (0x20 * swizj(i // 0x20))
-
-
-def swiz(b):
-    return b"".join([b[swizi(i) * 32 :][:32] for i in range(len(b) // 32)])
+from exkanjilayout import exkanji_to_jis
+from kanjirom6x import jisrom_to_kanjirom
+from romsource import map_rom
 
 
 def exkanji2kanjirom(exkanji_rom, kanjirom6x):
     """Given an input file named by `exkanji_rom` containing Level 1 Kanji font ROM data in PC-8801 series `kanji1.rom` format a.k.a. PC-6007SR Kakuchou Kanji ROM & RAM Cartridge / PC-6601-01 Kakuchou Kakuchou ROM Cartridge `saverkanji` EXKANJI.ROM format, produce a visualization and save it as a PNG in the output file named by `kanjirom6x`."""
-    b = open(exkanji_rom, "rb").read()
-
-    b = bytes(
-        b[(i & 1) * 128 * 32 + (i >> (2 if i & 1 else 1))] for i in range(256 * 32)
-    ) + swiz(b[256 * 16 + 256 * 8 + 96 * 32 :])
-    b = (
-        b[: (256 + 32 * 21) * 32]
-        + b"\x00" * (4 * 32 * 32)
-        + b[(256 + 32 * 21) * 32 : (256 + 32 * 23) * 32]
-        + b[(256 + 32 * 23) * 32 :]
-    )
-    xb = bytes(
-        (
-            (0x00)
-            if ((i & 3) == 3) and (i < 256 * 32)
-            else (
-                0xFF
-                if (i >= (256 + 32 * 21) * 32 and i < ((256 + 32 * 25) * 32))
-                or ((i >= 256 * 32) and (((i - 256 * 32) // 32) % 96) in (0, 95))
-                or (i >= (256 + 1 * 96 + 16) * 32 and i < (256 + 2 * 96) * 32)
-                else 0x00
-            )
-        )
-        for i in range(len(b))
-    )
-
-    def kuten_ch(kuten):
-        return 256 + (kuten[0] - 1 - (6 if kuten[0] >= 16 else 0)) * 96 + kuten[1]
-
-    bc = [b[i : i + 32] for i in range(0, len(b), 32)]
-    kanjirom6x_data = b"".join(
-        bc[kuten_ch(kuten)] for kuten in JIS_TO_KANJIROM6X_KUTEN_DATA
-    )
+    b = exkanji_to_jis(map_rom(exkanji_rom))
+    kanjirom6x_data = jisrom_to_kanjirom(b[256 * 32 : (256 + 96 * 41) * 32])
     # store the left and right halves/bytes of the glyphs separately
     # (probably it corresponds to two separate ROM IC's)
     kanjirom6x_data = kanjirom6x_data[::2] + kanjirom6x_data[1::2]
@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+
+"""
+quick-and-dirty MSX Kanji ROM construction using font data from:
+- PC-6007SR Kakuchou Kanji ROM&RAM cartridge / 拡張漢字ＲＯＭ＆ＲＡＭカートリッジ in `saverkanji` EXKANJI.ROM format
+- PC-6601-01 Kakuchou Kanji ROM cartridge / 拡張漢字ＲＯＭカートリッジ in `saverkanji` EXKANJI.ROM format
+- PC-8801 series level 1 Kanji ROM `kanji1.rom`, and level 2 Kanji ROM `kanji2.rom`
+
+The result is an MSX `KANJI.ROM` in I/O port order (the order `msxbioskanjiviz.py` takes): 128 KiB of Level 1 from `kanji1.rom` alone, or 256 KiB of Level 1 and Level 2 with `kanji2.rom` too. The cells outside JIS X 0208 (ten 0 and 95) and those the PC-8801 ROMs lack (ku 10 to 15, and everything after ku 84) are left blank. This is `kanjiconvert.py --from pc8801 --to msx-io` (or `--from exkanji`), which can also make IC order.
+
+The MSX BIOS only accepts a Kanji ROM whose `＼` (ku 1 ten 32) and ku 83 ten 94 glyphs match the ones MSX fonts have, so a warning is printed when the PC-8801 glyphs do not.
+
+## Usage
+1. run `python exkanji2msxkanji.py kanji1.rom kanji2.rom KANJI.ROM` (or just `EXKANJI.ROM KANJI.ROM` for Level 1)
+2. the created `KANJI.ROM` should work with MSX emulators, or split it into `KANJI1.ROM` and `KANJI2.ROM` halves
+"""
+
+import sys
+
+from kanjiconvert import convert, msxkanji_checks
+from romsource import map_rom
+
+
+def exkanji2msxkanji(exkanji_rom, kanji2_rom, msxkanji_rom):
+    """Given an input file named by `exkanji_rom` containing Level 1 Kanji font ROM data in PC-8801 series `kanji1.rom` format a.k.a. `saverkanji` EXKANJI.ROM format, and optionally one named by `kanji2_rom` containing PC-8801 series Level 2 `kanji2.rom` data, write an MSX Kanji ROM in I/O port order to the output file named by `msxkanji_rom`."""
+    if kanji2_rom is None:
+        k = convert(map_rom(exkanji_rom), "exkanji", "msx-io", 128 * 1024)
+    else:
+        rom = bytes(map_rom(exkanji_rom)) + bytes(map_rom(kanji2_rom))
+        k = convert(rom, "pc8801", "msx-io", 256 * 1024)
+    for check in msxkanji_checks(k):
+        print(f"warning: MSX BIOS {check} Kanji ROM check fails", file=sys.stderr)
+    open(msxkanji_rom, "wb").write(k)
+
+
+def main():
+    try:
+        _, exkanji_rom, msxkanji_rom = sys.argv
+        kanji2_rom = None
+    except ValueError:
+        (  # usage: python exkanji2msxkanji.py EXKANJI.ROM or kanji1.rom [ kanji2.rom ] KANJI.ROM
+            _,
+            exkanji_rom,
+            kanji2_rom,
+            msxkanji_rom,
+        ) = sys.argv
+    exkanji2msxkanji(exkanji_rom, kanji2_rom, msxkanji_rom)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+
+"""
+`saverkanji` EXKANJI.ROM storage order <-> the JIS-ordered layout used by the visualizers
+
+The JIS-ordered layout is 256 half-width glyphs (8x16 on the left, 8x8
+on the right, padded out to 16x16 cells) followed by the Level 1 Kanji
+in 96-cell ku rows, with four empty rows of 32 cells inserted at ku 22.
+A PC-8801 `kanji2.rom` adds the Level 2 Kanji as ku 48...84, right
+after ku 47. It stores ku 48...79 interleaved the same way `kanji1.rom`
+(which is an EXKANJI.ROM) stores ku 16...47, and ku 80...84 after them
+in order.
+
+Both directions are compiled once per ROM size into byte index arrays
+and applied with a single NumPy gather, like `reorder_msx_rom` does.
+Index `len(source)` stands for a zero byte. The scalar `swiz*`
+functions are kept as the definition of the Kanji glyph order.
+
+usage: python3 exkanjilayout.py
+
+(running it checks the index arrays against the scalar definitions)
+"""
+
+import functools
+
+import numpy as np
+
+HALF_WIDTH_SIZE = 256 * 16 + 256 * 8 + 96 * 32  # storage bytes before the Kanji
+LEVEL1_SIZE = (256 + 96 * 41) * 32  # JIS layout bytes up to the end of ku 47
+LEVEL2_SIZE = 128 * 1024  # PC-8801 kanji2.rom
+LEVEL2_ROWS = 84 - 48 + 1
+GAP_START = (256 + 32 * 21) * 32  # JIS layout offset of the inserted empty rows
+GAP_SIZE = 4 * 32 * 32
+
+
+# NEC stored the kanji ROM in a different order than JIS, but derived
+# from it in a systematic way. These swizzler functions are used to
+# remap to JIS order.
+def swizp(p):
+    return (p % 3) * 8 + (p // 3) % 8 + (p // 24) * 24
+
+
+def swizs(s):
+    return (s % 3) * 32 + (s // 3)
+
+
+def swizr(r):
+    return swizs(r) ^ 16
+
+
+def swizk(k):
+    return swizr(k - 23) + 23 if k >= 23 else k
+
+
+def swizj(j):
+    return swizk(swizp(j) if j < 24 else j)
+
+
+def swizi(i):
+    return (i & 0x1F) | (0x20 * swizj(i // 0x20))
+
+
+def swizl2(s):
+    return swizr(s) if s < 96 else s
+
+
+def swiz(b):
+    return b"".join([b[swizi(i) * 32 :][:32] for i in range(len(b) // 32)])
+
+
+@functools.lru_cache(maxsize=None)
+def exkanji_to_jis_indices(rom_size):
+    """
+    return, for each byte of the JIS-ordered layout, the EXKANJI.ROM offset it comes from (`rom_size` for a zero byte)
+    """
+    assert rom_size >= HALF_WIDTH_SIZE
+    i = np.arange(256 * 32)
+    half_width = np.where(i & 1, 128 * 32 + (i >> 2), i >> 1)
+    glyphs = np.array([swizi(g) for g in range((rom_size - HALF_WIDTH_SIZE) // 32)])
+    kanji = (HALF_WIDTH_SIZE + 32 * glyphs[:, None] + np.arange(32)).reshape(-1)
+    indices = np.concatenate([half_width, kanji])
+    indices = np.insert(indices, GAP_START, np.full(GAP_SIZE, rom_size))
+    indices.flags.writeable = False
+    return indices
+
+
+@functools.lru_cache(maxsize=None)
+def jis_to_exkanji_indices(rom_size):
+    """
+    return, for each EXKANJI.ROM byte, the JIS-ordered layout offset it comes from (the layout size for bytes the layout drops)
+
+    The 8x8 half-width bytes appear twice in the layout; the first copy is used.
+    """
+    return _inverse(exkanji_to_jis_indices(rom_size), rom_size)
+
+
+@functools.lru_cache(maxsize=None)
+def level2_to_jis_indices():
+    """
+    return, for each byte of the Level 2 ku rows (48...84) of the JIS-ordered layout, the `kanji2.rom` offset it comes from
+    """
+    groups = np.array([swizl2(s) for s in range(3 * LEVEL2_ROWS)])
+    glyphs = (32 * groups[:, None] + np.arange(32)).reshape(-1)
+    indices = (32 * glyphs[:, None] + np.arange(32)).reshape(-1)
+    indices.flags.writeable = False
+    return indices
+
+
+@functools.lru_cache(maxsize=None)
+def pc8801_to_jis_indices(rom_size=128 * 1024):
+    """
+    return, for each byte of the JIS-ordered layout of both levels, the offset into a `rom_size` byte `kanji1.rom` followed by `kanji2.rom` it comes from (their combined size for a zero byte)
+    """
+    level1 = exkanji_to_jis_indices(rom_size)
+    assert len(level1) <= LEVEL1_SIZE
+    size = rom_size + LEVEL2_SIZE
+    indices = np.concatenate(
+        [
+            np.where(level1 < rom_size, level1, size),
+            np.full(LEVEL1_SIZE - len(level1), size),
+            rom_size + level2_to_jis_indices(),
+        ]
+    )
+    indices.flags.writeable = False
+    return indices
+
+
+@functools.lru_cache(maxsize=None)
+def jis_to_pc8801_indices(rom_size=128 * 1024):
+    """
+    return, for each byte of a `rom_size` byte `kanji1.rom` followed by `kanji2.rom`, the JIS-ordered layout offset it comes from (the layout size for bytes the layout drops)
+    """
+    return _inverse(pc8801_to_jis_indices(rom_size), rom_size + LEVEL2_SIZE)
+
+
+def _inverse(forward, size):
+    # the first layout offset each source byte goes to
+    indices = np.full(size, len(forward))
+    offsets, first = np.unique(forward, return_index=True)
+    kept = offsets < size
+    indices[offsets[kept]] = first[kept]
+    indices.flags.writeable = False
+    return indices
+
+
+def _gather(source, indices):
+    padded = np.zeros(len(source) + 1, dtype=np.uint8)
+    padded[:-1] = np.frombuffer(source, dtype=np.uint8)
+    return padded[indices].tobytes()
+
+
+def exkanji_to_jis(rom):
+    """
+    return the EXKANJI.ROM data `rom` rearranged into the JIS-ordered layout
+    """
+    return _gather(rom, exkanji_to_jis_indices(len(rom)))
+
+
+def jis_to_exkanji(jis, rom_size=128 * 1024):
+    """
+    return the JIS-ordered layout `jis` rearranged back into a `rom_size` byte EXKANJI.ROM; the 96 glyphs the layout drops come back as zeros
+    """
+    indices = jis_to_exkanji_indices(rom_size)
+    assert len(jis) == len(exkanji_to_jis_indices(rom_size))
+    return _gather(jis, indices)
+
+
+def pc8801_to_jis(kanji1, kanji2):
+    """
+    return the PC-8801 `kanji1.rom` data `kanji1` and `kanji2.rom` data `kanji2` rearranged into one JIS-ordered layout, Level 2 following on from ku 47
+    """
+    assert len(kanji2) == LEVEL2_SIZE
+    return _gather(bytes(kanji1) + bytes(kanji2), pc8801_to_jis_indices(len(kanji1)))
+
+
+def jis_to_pc8801(jis, rom_size=128 * 1024):
+    """
+    return `(kanji1, kanji2)`, the JIS-ordered layout of both levels `jis` rearranged back into a `rom_size` byte `kanji1.rom` and a `kanji2.rom`; glyphs the layout drops come back as zeros
+    """
+    assert len(jis) == len(pc8801_to_jis_indices(rom_size))
+    roms = _gather(jis, jis_to_pc8801_indices(rom_size))
+    return roms[:rom_size], roms[rom_size:]
+
+
+def exkanji_mask(size):
+    """
+    return the mask data for a JIS-ordered layout of `size` bytes: 0xFF over the inserted empty rows, the unused ku 0/95 columns and the unassigned end of ku 2, 0x00 elsewhere
+    """
+    i = np.arange(size)
+    cell = (i - 256 * 32) // 32
+    masked = (i >= 256 * 32) & (
+        ((i >= GAP_START) & (i < (256 + 32 * 25) * 32))
+        | np.isin(cell % 96, (0, 95))
+        | ((i >= (256 + 1 * 96 + 16) * 32) & (i < (256 + 2 * 96) * 32))
+    )
+    return np.where(masked, 0xFF, 0x00).astype(np.uint8).tobytes()
+
+
+def smoke_test_exkanji_layout():
+    rom = bytes(np.random.default_rng(6001).integers(0, 256, 128 * 1024, np.uint8))
+    b = rom
+    b = bytes(
+        b[(i & 1) * 128 * 32 + (i >> (2 if i & 1 else 1))] for i in range(256 * 32)
+    ) + swiz(b[HALF_WIDTH_SIZE:])
+    b = b[:GAP_START] + b"\x00" * GAP_SIZE + b[GAP_START:]
+    xb = bytes(
+        (
+            (0x00)
+            if ((i & 3) == 3) and (i < 256 * 32)
+            else (
+                0xFF
+                if (i >= (256 + 32 * 21) * 32 and i < ((256 + 32 * 25) * 32))
+                or ((i >= 256 * 32) and (((i - 256 * 32) // 32) % 96) in (0, 95))
+                or (i >= (256 + 1 * 96 + 16) * 32 and i < (256 + 2 * 96) * 32)
+                else 0x00
+            )
+        )
+        for i in range(len(b))
+    )
+    assert exkanji_to_jis(rom) == b
+    assert exkanji_mask(len(b)) == xb
+    back = jis_to_exkanji(b)
+    kept = jis_to_exkanji_indices(len(rom)) < len(b)
+    assert kept.sum() == len(rom) - 96 * 32
+    assert all(x == y if k else x == 0 for x, y, k in zip(back, rom, kept))
+    assert exkanji_to_jis(back) == b
+    level2 = bytes(np.random.default_rng(8801).integers(0, 256, LEVEL2_SIZE, np.uint8))
+    b2 = pc8801_to_jis(rom, level2)
+    assert b2[: len(b)] == b and len(b2) == LEVEL1_SIZE + LEVEL2_ROWS * 96 * 32
+    assert b2[LEVEL1_SIZE:] == b"".join(
+        level2[swizl2(i // 32) * 32 * 32 + (i % 32) * 32 :][:32]
+        for i in range(LEVEL2_ROWS * 96)
+    )
+    back1, back2 = jis_to_pc8801(b2)
+    assert back1 == back and pc8801_to_jis(back1, back2) == b2
+    assert back2[: LEVEL2_ROWS * 96 * 32] == level2[: LEVEL2_ROWS * 96 * 32]
+    assert not any(back2[LEVEL2_ROWS * 96 * 32 :])
+
+
+if __name__ == "__main__":
+    smoke_test_exkanji_layout()
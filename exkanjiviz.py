@@ -5,14 +5,17 @@ quick-and-dirty visualizer for font data from:
 - PC-6007SR Kakuchou Kanji ROM&RAM cartridge / 拡張漢字ＲＯＭ＆ＲＡＭカートリッジ in `saverkanji` EXKANJI.ROM format
 - PC-6601-01 Kakuchou Kanji ROM cartridge / 拡張漢字ＲＯＭカートリッジ in `saverkanji` EXKANJI.ROM format
 - PC-8801 series level 1 Kanji ROM `kanji1.rom`
+- PC-8801 series level 1 and level 2 Kanji ROMs `kanji1.rom` `kanji2.rom`
 
 Even without a Kanji ROM, there are 18 specific Kanji available in every Japanese PC-6000 series CGROM at small sizes: `月火水木金土日年円時分秒百千万大中小`
 
 ## Usage
 1. prepare your ROM image (either a real one, or a synthesized one) in `saverkanji` EXKANJI.ROM format
-2. run `python exkanjiviz.py EXKANJI.ROM exkanji.png`
+2. run `python exkanjiviz.py EXKANJI.ROM exkanji.png` (add `--indexed` for a smaller 8-bit palette PNG)
 3. the created `exkanji.png` will have a visualization of the ROM contents laid out according to JIS ordering, which is not quite the same as the storage order
 
+For the PC-8801 Level 2 Kanji ROM as well, run `python exkanjiviz.py kanji1.rom kanji2.rom kanji.png` to put both levels on one sheet, or `python exkanjiviz.py --separate kanji1.rom kanji2.rom kanji1.png kanji2.png` for a sheet each.
+
 ## ROM Data Extraction
 If you need to get the data from your actual PC-6007SR cartridge or synthesize it from other font data, see the [おまけ：拡張漢字ROM
  section of the PC-6001mkII/6601用互換BASIC website](http://000.la.coocan.jp/p6/basic66.html#:~:text=%E5%A4%89%E6%8F%9B%E3%81%97%E3%81%9F%E4%BE%8B-,%E3%81%8A%E3%81%BE%E3%81%91%EF%BC%9A%E6%8B%A1%E5%BC%B5%E6%BC%A2%E5%AD%97ROM,-%E3%82%A8%E3%83%9F%E3%83%A5%E3%83%AC%E3%83%BC%E3%82%BF%E3%81%A7%E3%81%AE). That page also links to a utility program that can convert both directions between `ksaver` EXTKANJI.ROM format and `saverkanji` EXKANJI.ROM format. I saved mine from the cartridge using a PC-6001mkII with [ksaver](https://web.archive.org/web/20071223192215/http://www.kisweb.ne.jp/personal/windy/pc6001/p6soft.html#ksaver) in EXTKANJI.ROM format and then converted it to EXKANJI.ROM format using the converter.
@@ -26,127 +29,40 @@ ROM fingerprint information for the version dumped from my cartridge:
 """
 
 
-from PIL import Image, ImageDraw
-
-import codecs
-import gzip
-import sys
-
-
-# The list of kuten codes used to extract the KANJIROM subset from
-# EXKANJIROM is stored as a compressed list of skips.
-
-
-def _decompress_kuten_data(compressed_kuten_data):
-    ku_then_ten_data = gzip.decompress(codecs.decode(compressed_kuten_data, "base64"))
-    ku_data, ten_data = (
-        ku_then_ten_data[: len(ku_then_ten_data) // 2],
-        ku_then_ten_data[len(ku_then_ten_data) // 2 :],
-    )
-    assert len(ku_data) == len(ten_data)
-    kuten_data = []
-    o = (0, None)
-    for i in range(len(ku_data)):
-        o = (
-            (o[0] + ku_data[i], ten_data[i])
-            if ku_data[i]
-            else (o[0], o[1] + ten_data[i] + 1)
-        )
-        kuten_data.append(o)
-    return kuten_data
-
-
-JIS_TO_KANJIROM6X_KUTEN_DATA = _decompress_kuten_data(
-    b"H4sIANj6o2gC/71T7W4bMQwTJVl2Lu1aoEDf/1FHytft17AgvS1BLoktix+i3+3PLzy19VAVvnX6"
-    b"8SpchPL3Qth1UM8cwQVl+C/McY2cp8k+nRj8s2jgulE9VPF7r2q+uAUcgTCHm94RYA3SgA8LZ/ng"
-    b"nhU37OYJrqW6zN0JrNWLZR5A8ie3o0J7bjxaLyCAddtpcV/8Dut/GGycJED8JLbp47spTwrgTn6v"
-    b"3gBa17J+hbt4kyeGEZSdtWqF6taRMSe6cLNPbpl7nR64ZDV1IwkIFRvQtfzqUbbVSyb5UwvurSOE"
-    b"J52EE6pTK5VQsCdtlIeJ1qCzlBXsJark42F9znHOYT9Hq469EhtSj7apraWpS2q0uMHNUpy3V+01"
-    b"IukKmwW2l4d3y2xN8kpAA1ltOKdJos2XT5ftOZQC+dRd39joR5P1pua/wsN0+GgpJ/wX5VSuRkqu"
-    b"vbmVGrf1qs8tB34eiPO7Sqhrb9DJOcjM1hccA6egnG7dNpGhoRDNg7Gzz917LaBzmaJcwVlJN1WN"
-    b"lmk5G5vORRtt+c6OHUDXMofuSxzQE2sZZbe4H0xhn2M1G0Pxky+FQ+HAnl9lbiOKlyH2sJWz0sh1"
-    b"bca5rwBFcI5MxqFq1tChicVOx9B1SJJaLXqAacSk0h771KjGCLnVN043pS8wV3v859UhxZk+FWKP"
-    b"vq+5OPRCzJCwn5XY2LIACAAA"
-)
-
-
-# NEC stored the kanji ROM in a different order than JIS, but derived
-# from it in a systematic way. These swizzler functions are used to
-# remap to JIS order.
-def swizp(p):
-    return (p % 3) * 8 + (p // 3) % 8 + (p // 24) * 24
-
-
-def swizs(s):
-    return (s % 3) * 32 + (s // 3)
-
-
-def swizr(r):
-    return swizs(r) ^ 16
-
-
-def swizk(k):
-    return swizr(k - 23) + 23 if k >= 23 else k
-
-
-def swizj(j):
-    return swizk(swizp(j) if j < 24 else j)
-
-
-def swizi(i):
-    return (i & 0x1F) | (0x20 * swizj(i // 0x20))
-
+import numpy as np
 
-def swiz(b):
-    return b"".join([b[swizi(i) * 32 :][:32] for i in range(len(b) // 32)])
+from exkanjilayout import exkanji_mask, exkanji_to_jis, pc8801_to_jis
+from kanjirom6x import JIS_TO_KANJIROM6X_KUTEN_DATA
+from kanjisheet import GlyphBlitter, glyph_bit_planes, new_sheet, paint_glyphs
+from oldjis import missing_from_old_jis
+from romsource import map_rom
 
+import sys
 
-def exkanjiviz(exkanji_rom, exkanji_png):
-    """Given an input file named by `exkanji_rom` containing Level 1 Kanji font ROM data in PC-8801 series `kanji1.rom` format a.k.a. PC-6007SR Kakuchou Kanji ROM & RAM Cartridge / PC-6601-01 Kakuchou Kakuchou ROM Cartridge `saverkanji` EXKANJI.ROM format, produce a visualization and save it as a PNG in the output file named by `exkanji_png`."""
-    b = open(exkanji_rom, "rb").read()
 
-    b = bytes(
-        b[(i & 1) * 128 * 32 + (i >> (2 if i & 1 else 1))] for i in range(256 * 32)
-    ) + swiz(b[256 * 16 + 256 * 8 + 96 * 32 :])
-    b = (
-        b[: (256 + 32 * 21) * 32]
-        + b"\x00" * (4 * 32 * 32)
-        + b[(256 + 32 * 21) * 32 : (256 + 32 * 23) * 32]
-        + b[(256 + 32 * 23) * 32 :]
-    )
-    xb = bytes(
-        (
-            (0x00)
-            if ((i & 3) == 3) and (i < 256 * 32)
-            else (
-                0xFF
-                if (i >= (256 + 32 * 21) * 32 and i < ((256 + 32 * 25) * 32))
-                or ((i >= 256 * 32) and (((i - 256 * 32) // 32) % 96) in (0, 95))
-                or (i >= (256 + 1 * 96 + 16) * 32 and i < (256 + 2 * 96) * 32)
-                else 0x00
-            )
-        )
-        for i in range(len(b))
-    )
+def exkanjiviz(
+    exkanji_rom, exkanji_png, indexed=False, kanji2_rom=None, levels=(1, 2)
+):
+    """Given an input file named by `exkanji_rom` containing Level 1 Kanji font ROM data in PC-8801 series `kanji1.rom` format a.k.a. PC-6007SR Kakuchou Kanji ROM & RAM Cartridge / PC-6601-01 Kakuchou Kakuchou ROM Cartridge `saverkanji` EXKANJI.ROM format, produce a visualization and save it as a PNG in the output file named by `exkanji_png`. With `indexed`, the PNG is an 8-bit palette image instead of RGBA. With `kanji2_rom` naming a PC-8801 series Level 2 `kanji2.rom`, its Kanji follow on as ku 48...84, and `levels` picks which levels of full-width characters (ku 1...47 are level 1) go on the sheet."""
+    if kanji2_rom is None:
+        b = exkanji_to_jis(map_rom(exkanji_rom))
+        levels = (1,)
+    else:
+        b = pc8801_to_jis(map_rom(exkanji_rom), map_rom(kanji2_rom))
+    xb = exkanji_mask(len(b))
 
     def cvtr(r):
         return 1 + r + 6 * (r > 8)
 
-    def rtok(byts):
-        return (
-            byts.decode("EUC-JP", "ignore")
-            .encode("iso2022_jp_1", "ignore")
-            .decode("iso2022_jp_1", "ignore")
-            .encode("EUC-JP")
-            == byts
-        )
+    def level(row):
+        return 1 if cvtr(row) < 48 else 2
 
     def invc(cc):
         return (
             False
             if (cc < 256)
-            else not rtok(
-                bytes([min(cvtr((cc - 256) // 96), 95) + 0xA0, (cc - 256) % 96 + 0xA0])
+            else missing_from_old_jis(
+                min(cvtr((cc - 256) // 96), 95), (cc - 256) % 96
             )
         )
 
@@ -166,8 +82,8 @@ def exkanjiviz(exkanji_rom, exkanji_png):
     k3 = (0, 255, 0)
     w4 = (0, 127, 0)
 
-    im = Image.new(
-        "RGBA",
+    palette = [k, w, g, h, v, w1, k1, w2, k2, w3, k3, w4]
+    im, inks = new_sheet(
         (
             max((z + 1) * z, 16) * 16,
             (
@@ -176,89 +92,87 @@ def exkanjiviz(exkanji_rom, exkanji_png):
             )
             * 16,
         ),
+        palette,
         g,
+        indexed,
     )
+    k, w, g, h, v, w1, k1, w2, k2, w3, k3, w4 = inks
 
     def kuten_ch(kuten):
         return 256 + (kuten[0] - 1 - (6 if kuten[0] >= 16 else 0)) * 96 + kuten[1]
 
-    def putkuten_at(dr, kuten, coords, color_pair):
-        x, y = coords
-        fg, bg = color_pair
-        for i in range(256):
-            dr.point(
-                (x + i % 16, y + i // 16),
-                (fg if b[kuten_ch(kuten) * 32 + (i // 8)] & (0x80 >> (i % 8)) else bg),
-            )
+    def putkuten_at(text, kuten, coords, color_pair):
+        text.blit((16, b[kuten_ch(kuten) * 32 :][:32], b""), coords, color_pair)
 
-    def putch_at(dr, ch, coords, color_pair):
-        x, y = coords
-        fg, bg = color_pair
-        for i in range(128):
-            dr.point(
-                (x + i % 8, y + i // 8),
-                (
-                    fg
-                    if b[ord(ch) * 32 + 2 * (i // 8) + (1 if ord(ch) < 0x20 else 0)]
-                    & (0x80 >> (i % 8))
-                    else bg
-                ),
-            )
+    def putch_at(text, ch, coords, color_pair):
+        o = ord(ch) * 32 + (1 if ord(ch) < 0x20 else 0)
+        text.blit((8, b[o : o + 32 : 2], b""), coords, color_pair)
 
-    def puts_at(dr, s, coords, color_pair):
+    def puts_at(text, s, coords, color_pair):
         x, y = coords
         for i in range(len(s)):
-            putch_at(dr, s[i : i + 1], (x + 8 * i, y), color_pair)
+            putch_at(text, s[i : i + 1], (x + 8 * i, y), color_pair)
 
-    dr = ImageDraw.Draw(im)
+    text = GlyphBlitter(im)
     puts_at(
-        dr,
-        " NEC PC-6007SR/PC-6601-01 Kakuchou Kanji ROM, PC-8801 Level 1 Kanji ROM ",
+        text,
+        (
+            " NEC PC-6007SR/PC-6601-01 Kakuchou Kanji ROM, PC-8801 Level 1 Kanji ROM "
+            if kanji2_rom is None
+            else " NEC PC-8801 "
+            + " and ".join(f"Level {level}" for level in levels)
+            + " Kanji ROM"
+            + "s" * (len(levels) > 1)
+            + " "
+        ),
         (16 * 16 + 8, 4),
         (w, k),
     )
+    if 1 in levels:  # KANJIROM.6x holds Level 1 glyphs only
+        puts_at(
+            text,
+            " NEC PC-6001mkII/PC-6601 Kanji ROM (subset) ",
+            (16 * 16 + 8, 20),
+            (v, h),
+        )
     puts_at(
-        dr,
-        " NEC PC-6001mkII/PC-6601 Kanji ROM (subset) ",
-        (16 * 16 + 8, 20),
-        (v, h),
-    )
-    puts_at(
-        dr, "\x1d halfwidth character sets (8x16 and 8x8)", (16 * 16 + 4, 40), (k3, k)
+        text, "\x1d halfwidth character sets (8x16 and 8x8)", (16 * 16 + 4, 40), (k3, k)
     )
     puts_at(
-        dr,
+        text,
         "\x1f (row number)",
         ((16 + 1) * 16 + 8, (16 - (96 + z - 1) // z - 1) * 16 - 4),
         (w1, k),
     )
     puts_at(
-        dr,
+        text,
         "\x1f (unallocated code area)",
         ((32 + z + 4) * 16 + 8, (16 - (96 + z - 1) // z - 1) * 16 - 4),
         (w2, k),
     )
     puts_at(
-        dr,
+        text,
         "\x1f (missing from old JIS)",
         ((17 * 7 + 2 + z) * 16 + 8, (16 - (96 + z - 1) // z - 1) * 16 - 4),
         (w1, k),
     )
     puts_at(
-        dr,
-        "fullwidth character set (old JIS with level 1 Kanji)",
+        text,
+        "fullwidth character set (old JIS with "
+        + " and ".join(f"level {level}" for level in levels)
+        + " Kanji)",
         (16 * 16 + 8, (16 - (96 + z - 1) // z - 2) * 16 - 4),
         (w, k),
     )
     for i in range(1, 95):
         puts_at(
-            dr,
+            text,
             "%02d" % i,
             (16 * (i % z + 3 * (z + 1) - z // 2), 24 + 16 * (i // z)),
             ([w1, k][i % 2], [k, w1][i % 2]),
         )
     puts_at(
-        dr,
+        text,
         "\x1d (column number key)",
         (-12 + 16 * (4 * (z + 1) - z // 2), 24 + 12),
         (w1, k),
@@ -283,63 +197,85 @@ def exkanjiviz(exkanji_rom, exkanji_png):
 
     kanjirom_subset_chs = {kuten_ch(kuten) for kuten in JIS_TO_KANJIROM6X_KUTEN_DATA}
 
-    for i in range(8 * len(b)):
-        if not xb[i // 8] or (i // 256 < 256) or (cvtr(((i // 256) - 256) // 96) <= 87):
-            dr.point(
-                (chx(i // 256) * 16 + i % 16, chy(i // 256) * 16 + (i // 16) % 16),
-                (
-                    [
-                        [[k, h][i // 256 in kanjirom_subset_chs], k3][i // 256 < 256],
-                        k1,
-                        k2,
-                        k1,
-                    ]
-                    if (b[i // 8] & (128 >> (i % 8)))
-                    else [
-                        [[w, v][i // 256 in kanjirom_subset_chs], w3][i // 256 < 256],
-                        [w1, w4][i // 256 < 256],
-                        w2,
-                        w1,
-                    ]
-                )[2 * invc(i // 256) + (xb[i // 8] != 0)],
+    # everything per-glyph is worked out once per cell; everything
+    # per-pixel is done with array lookups
+    ccs = range(len(b) // 32)
+    colors = [k, w, h, v, w1, k1, w2, k2, w3, k3, w4]
+    kanji, subset, halfwidth = 0, 1, 2
+    cell_class = np.array(
+        [
+            halfwidth if cc < 256 else subset if cc in kanjirom_subset_chs else kanji
+            for cc in ccs
+        ]
+    )
+    cell_invc = np.array([invc(cc) for cc in ccs])
+    # palette indices by [cell class][pixel set][2 * invc + masked]
+    lut = np.array(
+        [
+            [[colors.index(color) for color in colors_by_flags] for colors_by_flags in cls]
+            for cls in (
+                ([w, w1, w2, w1], [k, k1, k2, k1]),
+                ([v, w1, w2, w1], [h, k1, k2, k1]),
+                ([w3, w4, w2, w1], [k3, k1, k2, k1]),
             )
-    for i in range(1, 48 - 6):
+        ]
+    )
+    bits, masked = glyph_bit_planes(b, xb)
+    paint_glyphs(
+        im,
+        colors,
+        lut[cell_class[:, None, None], 1 * bits, 2 * cell_invc[:, None, None] + masked],
+        [chx(cc) for cc in ccs],
+        [chy(cc) for cc in ccs],
+        drawn=(
+            ~masked
+            | np.array([cc < 256 or cvtr((cc - 256) // 96) <= 87 for cc in ccs])[
+                :, None, None
+            ]
+        )
+        & np.array([cc < 256 or level((cc - 256) // 96) in levels for cc in ccs])[
+            :, None, None
+        ],
+    )
+    for row in range((len(b) // 32 - 256) // 96):
+        if level(row) not in levels:
+            continue
         puts_at(
-            dr,
-            f"{i + (6 if i >= 10 else 0):02d}",
-            (16 * chx(256 + 96 * (i - 1)), 16 * chy(256 + 96 * (i - 1))),
+            text,
+            f"{cvtr(row):02d}",
+            (16 * chx(256 + 96 * row), 16 * chy(256 + 96 * row)),
             (k, w1),
         )
         puts_at(
-            dr,
-            f"{i + (6 if i >= 10 else 0):02d}",
-            (16 * chx(256 + 96 * (i - 1) + 95), 16 * chy(256 + 96 * (i - 1) + 95)),
+            text,
+            f"{cvtr(row):02d}",
+            (16 * chx(256 + 96 * row + 95), 16 * chy(256 + 96 * row + 95)),
             (k, w1),
         )
     for i, ch in enumerate("拡張漢字ＲＯＭ＆ＲＡＭカートリッジ"):
         putkuten_at(
-            dr,
+            text,
             [byt - 0xA0 for byt in ch.encode("EUC-JP")],
             ((18 + i) * 16 + 4, 56),
             (w, k),
         )
     for i, ch in enumerate("拡張漢字ＲＯＭカートリッジ"):
         putkuten_at(
-            dr,
+            text,
             [byt - 0xA0 for byt in ch.encode("EUC-JP")],
             ((18 + i) * 16 + 4, 72),
             (w, k),
         )
     for i, ch in enumerate("ＰＣ−８８０１"):
         putkuten_at(
-            dr,
+            text,
             [byt - 0xA0 for byt in ch.encode("EUC-JP")],
             ((18 + i) * 16 + 4, 88),
             (w, k),
         )
     for i, ch in enumerate("ＰＣ−６００１ｍｋＩＩとＰＣ−６６０１漢字ＲＯＭ"):
         putkuten_at(
-            dr,
+            text,
             [byt - 0xA0 for byt in ch.encode("EUC-JP")],
             ((18 + i) * 16 + 4, 104),
             (v, h),
@@ -348,8 +284,31 @@ def exkanjiviz(exkanji_rom, exkanji_png):
 
 
 def main():
-    _, exkanji_rom, exkanji_png = sys.argv
-    exkanjiviz(exkanji_rom, exkanji_png)
+    indexed = "--indexed" in sys.argv
+    separate = "--separate" in sys.argv
+    argv = [arg for arg in sys.argv if arg not in ("--indexed", "--separate")]
+    if separate:
+        (  # usage: python exkanjiviz.py [ --indexed ] --separate kanji1.rom kanji2.rom LEVEL1_OUTPUT LEVEL2_OUTPUT
+            _,
+            exkanji_rom,
+            kanji2_rom,
+            level1_png,
+            level2_png,
+        ) = argv
+        exkanjiviz(exkanji_rom, level1_png, indexed, kanji2_rom, levels=(1,))
+        exkanjiviz(exkanji_rom, level2_png, indexed, kanji2_rom, levels=(2,))
+        return
+    try:
+        _, exkanji_rom, exkanji_png = argv
+        kanji2_rom = None
+    except ValueError:
+        (  # usage: python exkanjiviz.py [ --indexed ] EXKANJI.ROM or kanji1.rom [ kanji2.rom ] OUTPUT
+            _,
+            exkanji_rom,
+            kanji2_rom,
+            exkanji_png,
+        ) = argv
+    exkanjiviz(exkanji_rom, exkanji_png, indexed, kanji2_rom)
 
 
 if __name__ == "__main__":
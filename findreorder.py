@@ -0,0 +1,325 @@
+#!/usr/bin/env python3
+
+"""
+work out the address-line (and data-line) permutation of a ROM dump
+
+usage: python3 findreorder.py [ --data ] DUMP REFERENCE
+   or: python3 findreorder.py [ --data ] [ --cell WIDTHxHEIGHT; default 16x16 ] DUMP
+
+Either way it prints a spec for `reorder_msx_rom.py --spec` that turns
+DUMP into the layout wanted, and with `--data` the data lines are
+searched as well as the address lines.
+
+Given a REFERENCE image with the same contents in the order wanted, the
+permutation is found exactly. Counting the set bits in each data bit
+plane, and in the half (or quarter) of the image where each address
+bit (or pair of address bits) is set, gives statistics that the
+permutation only moves around, so matching them up leaves very few
+candidates to try, and those are checked with a single gather each.
+
+Without a REFERENCE the dump is assumed to hold a font, and the
+address bits are chosen to make glyph cells of WIDTHxHEIGHT pixels
+(stored a row at a time, most significant bit leftmost) as smooth as
+possible: the row bits one at a time so that adjacent rows look most
+alike, then the bits that pick the bytes within a row so that the
+pixels either side of each byte boundary do. The remaining address
+bits number the glyphs, and are kept in their original order since
+nothing in the glyphs themselves says how they should be ordered. The
+data bits are chained up the same way, by how alike adjacent pixels
+look.
+"""
+
+import argparse
+import itertools
+import sys
+
+import numpy as np
+
+from reorder_msx_rom import Reorder, gather_index
+
+_POPCOUNT = np.unpackbits(np.arange(256, dtype=np.uint8)[:, None], axis=1).sum(1)
+
+
+def _address_bits(size):
+    n = size.bit_length() - 1
+    assert size == 1 << n, f"the image size ({size}) is not a power of two"
+    return n
+
+
+def _backtrack(candidates, compatible, accept, limit):
+    """
+    yield up to `limit` accepted assignments of one candidate per position, no two sharing a source bit
+
+    `candidates[j]` lists the `(source bit, inverted)` choices for output bit j, `compatible(j, c, k, d)` says whether choice c for bit j can go with choice d for bit k, and `accept(assignment)` checks a complete one.
+    """
+    order = sorted(range(len(candidates)), key=lambda j: len(candidates[j]))
+    assignment = [None] * len(candidates)
+    leaves = 0
+
+    def extend(depth):
+        nonlocal leaves
+        if depth == len(order):
+            leaves += 1
+            if accept(tuple(assignment)):
+                yield tuple(assignment)
+            return
+        j = order[depth]
+        used = {assignment[k][0] for k in order[:depth]}
+        for c in candidates[j]:
+            if c[0] in used:
+                continue
+            if all(compatible(j, c, k, assignment[k]) for k in order[:depth]):
+                assignment[j] = c
+                yield from extend(depth + 1)
+                if leaves >= limit:
+                    return
+        assignment[j] = None
+
+    yield from extend(0)
+
+
+def _counts(single, pair, total, c, d):
+    # the count for a pair of bits once either or both of them are inverted
+    (a, x), (b, y) = c, d
+    if x and y:
+        return total - single[a] - single[b] + pair[a][b]
+    if x:
+        return single[b] - pair[a][b]
+    if y:
+        return single[a] - pair[a][b]
+    return pair[a][b]
+
+
+def _match(src_single, src_pair, dst_single, dst_pair, total, accept, limit):
+    candidates = [
+        [
+            (a, x)
+            for a in range(len(src_single))
+            for x in (0, 1)
+            if np.array_equal(total - src_single[a] if x else src_single[a], single)
+        ]
+        for single in dst_single
+    ]
+
+    def compatible(j, c, k, d):
+        counts = _counts(src_single, src_pair, total, c, d)
+        return np.array_equal(counts, dst_pair[j][k])
+
+    return _backtrack(candidates, compatible, accept, limit)
+
+
+def _data_statistics(image):
+    planes = np.unpackbits(image[:, None], axis=1, bitorder="little").astype(np.int64)
+    return planes.sum(0), planes.T @ planes
+
+
+def _address_statistics(image, n):
+    # per address bit (and pair of bits): the number of set bits in each
+    # data bit plane where the address bit (or both) is 1, as float
+    # matrix products (exact well beyond any ROM size)
+    planes = np.unpackbits(image[:, None], axis=1, bitorder="little").astype(float)
+    bits = (np.arange(len(image))[:, None] >> np.arange(n)) & 1
+    bits = bits.astype(float)
+    single = (bits.T @ planes).astype(np.int64)
+    pair = np.stack(
+        [(bits * planes[:, d, None]).T @ bits for d in range(8)], axis=-1
+    ).astype(np.int64)
+    return single, pair
+
+
+def solve(dump, reference, data=False, limit=100000):
+    """
+    return a `Reorder` that turns the image `dump` into the image `reference`, or None if there is none; the data lines are only permuted if `data` is set
+    """
+    dump = np.frombuffer(dump, dtype=np.uint8)
+    reference = np.frombuffer(reference, dtype=np.uint8)
+    assert len(dump) == len(reference)
+    n = _address_bits(len(dump))
+    dst_single, dst_pair = _address_statistics(reference, n)
+    data_options = [None]
+    if data:
+        src_planes, src_pairs = _data_statistics(dump)
+        dst_planes, dst_pairs = _data_statistics(reference)
+        data_options = _match(
+            src_planes, src_pairs, dst_planes, dst_pairs, len(dump), bool, limit
+        )
+    for data_bits in data_options:
+        table = Reorder((), data_bits).apply(bytes(range(256)))
+        image = np.frombuffer(table, dtype=np.uint8)[dump]
+        src_single, src_pair = _address_statistics(image, n)
+        total = np.unpackbits(image[:, None], axis=1, bitorder="little").sum(0)
+
+        def accept(address):
+            index = gather_index(address, cached=False)
+            return np.array_equal(image[index], reference)
+
+        for address in _match(
+            src_single, src_pair, dst_single, dst_pair, total, accept, limit
+        ):
+            return Reorder(address, data_bits)
+    return None
+
+
+def _jaccard(a, b):
+    # how unlike two arrays of pixel bytes are: differing pixels over set pixels
+    either = _POPCOUNT[a | b].sum()
+    return _POPCOUNT[a ^ b].sum() / either if either else 1.0
+
+
+def _cells(blocks, n, bits):
+    # arrange the image so the last axes are the address bits `bits`
+    # (most significant first), each as (source bit, inverted)
+    axes = [n - 1 - a for a, _ in bits]
+    cells = np.moveaxis(blocks, axes, range(n - len(bits), n))
+    for i, (_, inverted) in enumerate(bits):
+        if inverted:
+            cells = np.flip(cells, n - len(bits) + i)
+    return cells.reshape(-1, 1 << len(bits))
+
+
+def _vertical_cost(blocks, n, row_bits, col_bits=()):
+    cells = _cells(blocks, n, row_bits + col_bits)
+    rows = cells.reshape(len(cells), 1 << len(row_bits), -1)
+    return _jaccard(rows[:, :-1], rows[:, 1:])
+
+
+def _horizontal_cost(blocks, n, row_bits, col_bits):
+    cells = _cells(blocks, n, row_bits + col_bits)
+    rows = cells.reshape(-1, 1 << len(col_bits))
+    return _jaccard(rows[:, :-1] & 1, rows[:, 1:] >> 7)
+
+
+def _polarities(k):
+    # every choice of inverted bits, fewest first
+    return sorted(itertools.product((0, 1), repeat=k), key=sum)
+
+
+def _smoothest_address(image, n, width, height):
+    blocks = image.reshape((2,) * n)
+    row_count, col_count = height.bit_length() - 1, (width // 8).bit_length() - 1
+    rows = ()  # most significant first
+    for k in range(row_count):
+        best = None
+        for a in range(n):
+            if a in {b for b, _ in rows}:
+                continue
+            for polarity in _polarities(k + 1):
+                bits = tuple(zip((a,) + tuple(b for b, _ in rows), polarity))
+                cost = _vertical_cost(blocks, n, bits)
+                if best is None or cost < best[0]:
+                    best = cost, bits
+        rows = best[1]
+    cols = ()
+    for k in range(col_count):
+        best = None
+        for a in range(n):
+            if a in {b for b, _ in rows + cols}:
+                continue
+            for polarity in _polarities(k + 1):
+                bits = tuple(zip((a,) + tuple(b for b, _ in cols), polarity))
+                cost = _horizontal_cost(blocks, n, rows, bits)
+                if best is None or cost < best[0]:
+                    best = cost, bits
+        cols = best[1]
+    used = {a for a, _ in rows + cols}
+    glyph_bits = [(a, 0) for a in range(n) if a not in used]
+    address = (rows + cols)[::-1] + tuple(glyph_bits)
+    cost = _horizontal_cost(blocks, n, rows, cols) if cols else 0.0
+    return address, cost
+
+
+def _smoothest_data(image):
+    # invert mostly-set bit planes, then chain the planes up so that
+    # neighbouring ones look most alike
+    planes = np.unpackbits(image[:, None], axis=1, bitorder="little")
+    inverted = planes.mean(0) > 0.5
+    planes ^= inverted.astype(np.uint8)
+    either = (planes[:, :, None] | planes[:, None, :]).sum(0)
+    differ = (planes[:, :, None] ^ planes[:, None, :]).sum(0)
+    unlike = differ / np.maximum(either, 1)
+    paths = np.array(list(itertools.permutations(range(8))))
+    costs = unlike[paths[:, :-1], paths[:, 1:]].sum(1)
+    path = paths[np.argmin(costs)]  # leftmost pixel first
+    return [
+        tuple((int(bit), int(inverted[bit])) for bit in order[::-1])
+        for order in (path, path[::-1])
+    ]
+
+
+def solve_glyphs(dump, width=16, height=16, data=False):
+    """
+    return a `Reorder` that turns the font image `dump` into the smoothest looking `width` x `height` glyph cells; the data lines are only permuted if `data` is set
+    """
+    image = np.frombuffer(dump, dtype=np.uint8)
+    n = _address_bits(len(image))
+    assert width % 8 == 0 and width * height // 8 <= len(image)
+    best = None
+    for data_bits in _smoothest_data(image) if data else [None]:
+        table = Reorder((), data_bits).apply(bytes(range(256)))
+        permuted = np.frombuffer(table, dtype=np.uint8)[image]
+        address, cost = _smoothest_address(permuted, n, width, height)
+        if best is None or cost < best[0]:
+            best = cost, Reorder(address, data_bits)
+    return best[1]
+
+
+def _rectangle_font(count, seed=6001):
+    # glyphs made of a few filled rectangles each: not a real font, but
+    # smooth in the same way
+    rng = np.random.default_rng(seed)
+    glyphs = np.zeros((count, 16, 16), dtype=bool)
+    for glyph in glyphs:
+        for _ in range(3):
+            top, left = rng.integers(0, 12, 2)
+            bottom, right = top + rng.integers(2, 5), left + rng.integers(2, 16)
+            glyph[top:bottom, left:right] = True
+    return np.packbits(glyphs).tobytes()
+
+
+def smoke_test_findreorder():
+    image = np.random.default_rng(6001).integers(0, 256, 1 << 12, np.uint8).tobytes()
+    for spec in ("~4-3 11-5 2-0", "0 11-1 / 0-3 ~7-4"):
+        reorder = Reorder.parse(spec)
+        found = solve(reorder.apply(image), image, data=True)
+        assert found is not None and found.apply(reorder.apply(image)) == image
+    assert solve(image, image) == Reorder.parse("11-0")
+    assert solve(image, image[::-1]) == Reorder.parse("~11-0")
+    font = _rectangle_font(256)
+    for spec in ("4-3 12-5 2-0", "0 12-1", "12-5 ~4 3-1 0", "4-3 12-5 2-0 / 0-7"):
+        reorder = Reorder.parse(spec)
+        found = solve_glyphs(reorder.inverse().apply(font), data="/" in spec)
+        # the glyphs themselves come out right, if not in the right order
+        assert found.address[:5] == reorder.address[:5], (spec, str(found))
+        assert found.data == reorder.data, (spec, str(found))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Find the address/data-line permutation of a ROM dump."
+    )
+    parser.add_argument("dump", metavar="DUMP")
+    parser.add_argument("reference", metavar="REFERENCE", nargs="?")
+    parser.add_argument(
+        "--data", action="store_true", help="permute the data lines too"
+    )
+    parser.add_argument(
+        "--cell",
+        metavar="WIDTHxHEIGHT",
+        default="16x16",
+        help="glyph cell size when there is no REFERENCE (default 16x16)",
+    )
+    args = parser.parse_args()
+    smoke_test_findreorder()
+    dump = open(args.dump, "rb").read()
+    if args.reference:
+        reorder = solve(dump, open(args.reference, "rb").read(), args.data)
+    else:
+        width, height = map(int, args.cell.split("x"))
+        reorder = solve_glyphs(dump, width, height, args.data)
+    if reorder is None:
+        sys.exit("no permutation found")
+    print(reorder)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+
+"""
+random-access glyph lookup for every ROM format the visualizers understand
+
+A `GlyphFont` wraps the same 16x16 cell layout (`b`, `xb`) the
+visualizers build, plus the half-width font, without copying them:
+lookups by kuten, JIS, Shift-JIS, EUC-JP or Unicode are a little
+arithmetic and return `memoryview` slices of the layout, 32 bytes for
+a full-width glyph (16 rows of 2 bytes) and one byte per row for a
+half-width one.
+
+usage: python3 glyphfont.py
+
+(running it performs a quick self-test)
+"""
+
+import functools
+
+from romsource import halves, map_rom
+
+
+def _ku_rows(ku_of_row, rows):
+    ku_rows = [None] * 96
+    for row in range(rows):
+        if ku_of_row(row) < 96:
+            ku_rows[ku_of_row(row)] = row
+    return tuple(ku_rows)
+
+
+def _level1_ku(row):
+    return 1 + row + 6 * (row > 8)
+
+
+@functools.cache
+def _kuten_of_char():
+    kuten_of_char = {}
+    for ku in range(1, 95):
+        for ten in range(1, 95):
+            try:
+                ch = bytes([0xA0 + ku, 0xA0 + ten]).decode("EUC-JP")
+            except UnicodeDecodeError:
+                continue
+            kuten_of_char.setdefault(ch, (ku, ten))
+    return kuten_of_char
+
+
+class GlyphFont:
+    """
+    a glyph store over a 16x16 cell layout
+
+    `data` and `mask` are the glyph and mask data (32 bytes per cell), the Kanji for ku `ku` start at cell `kanji_base + 96 * ku_rows[ku]`, and a cell whose mask is all 0xFF holds no glyph. `halfwidth_pages` lists one `(offsets, stride, rows)` per half-width character set: the offset into `halfwidth_data` of each of the 256 codes (or None), the distance between rows, and the number of rows.
+    """
+
+    __slots__ = (
+        "data",
+        "mask",
+        "kanji_base",
+        "ku_rows",
+        "halfwidth_data",
+        "halfwidth_pages",
+    )
+
+    def __init__(
+        self, data, mask, kanji_base, ku_rows, halfwidth_data=b"", halfwidth_pages=()
+    ):
+        self.data = memoryview(data).toreadonly()
+        self.mask = memoryview(mask).toreadonly()
+        assert len(self.data) == len(self.mask)
+        self.kanji_base = kanji_base
+        self.ku_rows = ku_rows
+        self.halfwidth_data = memoryview(halfwidth_data).toreadonly()
+        self.halfwidth_pages = halfwidth_pages
+
+    def kanji(self, ku, ten):
+        """
+        return the 32-byte glyph at `ku`, `ten` (each 1...94), or None if there is none
+        """
+        if not (1 <= ku <= 94 and 1 <= ten <= 94) or self.ku_rows[ku] is None:
+            return None
+        o = 32 * (self.kanji_base + 96 * self.ku_rows[ku] + ten)
+        if o + 32 > len(self.data) or self.mask[o : o + 32] == b"\xff" * 32:
+            return None
+        return self.data[o : o + 32]
+
+    def jis(self, code):
+        """
+        return the glyph for the JIS X 0208 code `code` (0x2121...0x7E7E), or None
+        """
+        return self.kanji((code >> 8) - 0x20, (code & 0xFF) - 0x20)
+
+    def euc(self, code):
+        """
+        return the glyph for the two-byte EUC-JP code `code` (0xA1A1...0xFEFE), or None
+        """
+        return self.kanji((code >> 8) - 0xA0, (code & 0xFF) - 0xA0)
+
+    def sjis(self, code):
+        """
+        return the glyph for the two-byte Shift-JIS code `code` (0x8140...0xEFFC), or None
+        """
+        lead, trail = code >> 8, code & 0xFF
+        lead -= 0x40 if lead >= 0xE0 else 0
+        if not (0x81 <= lead <= 0xAF and 0x40 <= trail <= 0xFC and trail != 0x7F):
+            return None
+        if trail >= 0x9F:
+            return self.kanji(2 * (lead - 0x81) + 2, trail - 0x9E)
+        return self.kanji(2 * (lead - 0x81) + 1, trail - 0x3F - (trail > 0x7F))
+
+    def unicode(self, ch):
+        """
+        return the full-width glyph for the character (or code point) `ch`, or None if it is not in JIS X 0208 or not in this font
+        """
+        if isinstance(ch, int):
+            ch = chr(ch)
+        kuten = _kuten_of_char().get(ch)
+        return kuten and self.kanji(*kuten)
+
+    def halfwidth(self, code, page=0):
+        """
+        return the half-width glyph for the 8-bit `code` in character set `page`, one byte per row, or None
+        """
+        if page >= len(self.halfwidth_pages):
+            return None
+        offsets, stride, rows = self.halfwidth_pages[page]
+        o = offsets[code]
+        if o is None:
+            return None
+        return self.halfwidth_data[o : o + stride * rows : stride]
+
+    @classmethod
+    def from_exkanji(cls, exkanji_rom, kanji2_rom=None):
+        """
+        a font from a `saverkanji` EXKANJI.ROM / PC-8801 `kanji1.rom` image (and PC-8801 `kanji2.rom`, if any), with the 8x16 and 8x8 half-width sets as pages 0 and 1
+        """
+        from exkanjilayout import exkanji_mask, exkanji_to_jis, pc8801_to_jis
+
+        if kanji2_rom is None:
+            b = exkanji_to_jis(map_rom(exkanji_rom))
+        else:
+            b = pc8801_to_jis(map_rom(exkanji_rom), map_rom(kanji2_rom))
+        xb = exkanji_mask(len(b))
+        pages = (
+            ([32 * c for c in range(256)], 2, 16),
+            # every 8x8 row is stored twice
+            ([32 * c + 1 for c in range(256)], 4, 8),
+        )
+        ku_rows = _ku_rows(_level1_ku, (len(b) // 32 - 256) // 96)
+        return cls(b, xb, 256, ku_rows, b, pages)
+
+    @classmethod
+    def from_kanjirom(cls, kanji_roms):
+        """
+        a font from a PC-6001mkII / PC-6601 KANJIROM.62 / KANJIROM.66 image, either one file or two deinterleaved halves
+        """
+        from kanjirom6x import kanjirom_to_jisrom
+        from romsource import Layout
+
+        pages = [map_rom(kanji_rom) for kanji_rom in kanji_roms]
+        if len(pages) == 1:
+            pages = halves(pages[0])
+        k = Layout(32 * 1024)
+        k.interleave(pages)
+        b = kanjirom_to_jisrom(k.view())
+        xb = kanjirom_to_jisrom(bytes(32 * 1024))
+        return cls(b, xb, 0, _ku_rows(_level1_ku, len(b) // 32 // 96))
+
+    @classmethod
+    def from_cgrom(cls, cgrom, cgrom_m=None, kanji_roms=()):
+        """
+        a font from PC-6001 series CGROM images (and Kanji ROM, if any), with CGROM, CGROMm and their second halves as pages 0...3
+        """
+        from cgromkanjiviz import cgromkanji_layout
+
+        b, xb = cgromkanji_layout(cgrom, cgrom_m, kanji_roms)
+        pages = tuple(
+            ([32 * (c + 256 * (page >> 1)) + (page & 1) for c in range(256)], 2, 16)
+            for page in range(4)
+        )
+        ku_rows = _ku_rows(_level1_ku, (len(b) // 32 - 512) // 96)
+        return cls(b, xb, 512, ku_rows, b, pages)
+
+    @classmethod
+    def from_nwp(cls, cgrom60_62, cgrom60m_62, kanjirom_62, nwpkanji_dsk):
+        """
+        a font from the PC-6001mkII / PC-6601 Nihongo Word Processor ROMs and disk, with the two CGROMm character sets as pages 0 and 1
+        """
+        from nwpkanjiviz import nwpkanji_layout
+
+        b, xb = nwpkanji_layout(cgrom60_62, cgrom60m_62, kanjirom_62, nwpkanji_dsk)
+        pages = tuple(([32 * c + page for c in range(256)], 2, 16) for page in range(2))
+        ku_rows = _ku_rows(_level1_ku, (len(b) // 32 - 256) // 96)
+        return cls(b, xb, 256, ku_rows, b, pages)
+
+    @classmethod
+    def from_msx(cls, bios, kanji_roms=()):
+        """
+        a font from an MSX BIOS+BASIC image and Kanji ROM(s) in I/O readout order, with the 8x8 BIOS font as page 0
+        """
+        from msxbioskanjiviz import msxbioskanji_layout
+
+        bios = map_rom(bios)
+        b, xb = msxbioskanji_layout(bios, kanji_roms, 512)
+        cgtabl = int.from_bytes(bios[4:6], "little")
+        pages = (([cgtabl + 8 * c for c in range(256)], 1, 8),)
+        ku_rows = _ku_rows(
+            lambda row: row + 5 * (row >= 11), (len(b) // 32 - 512) // 96
+        )
+        return cls(b, xb, 512, ku_rows, bios, pages)
+
+    @classmethod
+    def from_skw(cls, kanji_roms):
+        """
+        a font from Yamaha SKW-01 Kanji ROM image(s), with the half-width set (Shift-JIS single-byte codes) as page 0
+        """
+        from skwkanjiviz import skwkanji_layout
+
+        b, xb = skwkanji_layout(kanji_roms)
+        offsets = [
+            8 * 96 * 32 + 32 * (c - 0x20 * (2 if c & 0x80 else 1))
+            if 0x20 <= c < 0x80 or 0xA0 <= c < 0xE0
+            else None
+            for c in range(256)
+        ]
+        ku_rows = _ku_rows(lambda row: row + 3 * (row >= 13), len(b) // 32 // 96)
+        return cls(b, xb, 0, ku_rows, b, ((offsets, 2, 16),))
+
+
+def smoke_test_glyphfont():
+    b = bytearray(32 * 96 * 96)
+    for cell in range(96 * 96):
+        b[32 * cell : 32 * cell + 2] = cell.to_bytes(2, "big")
+    xb = bytearray(len(b))
+    xb[32 * (96 * 3 + 5) : 32 * (96 * 3 + 6)] = b"\xff" * 32
+    pages = (([32 * c + 1 for c in range(256)], 2, 16),)
+    font = GlyphFont(b, xb, 0, _ku_rows(lambda row: row, 96), b, pages)
+    for ku in range(1, 95):
+        for ten in range(1, 95):
+            euc = bytes([0xA0 + ku, 0xA0 + ten])
+            glyph = font.kanji(ku, ten)
+            assert font.euc(int.from_bytes(euc, "big")) == glyph
+            assert font.jis(int.from_bytes(euc, "big") & 0x7F7F) == glyph
+            try:
+                ch = euc.decode("EUC-JP")
+                sjis = ch.encode("SJIS")
+            except UnicodeError:
+                continue
+            assert font.sjis(int.from_bytes(sjis, "big")) == glyph
+            assert font.unicode(ch) == glyph or _kuten_of_char()[ch] != (ku, ten)
+    assert font.kanji(16, 1)[:2] == (96 * 16 + 1).to_bytes(2, "big")
+    assert font.unicode("亜") == font.kanji(16, 1) == font.unicode(ord("亜"))
+    assert font.kanji(3, 5) is None and font.kanji(0, 1) is None
+    assert font.unicode("A") is None
+    assert font.halfwidth(0x41) == b"\x41" + bytes(15)
+    assert font.halfwidth(0x41, 1) is None
+    # EXKANJI.ROM's 8x8 set at 0x1000 is page 1, every row different
+    import os, tempfile
+
+    rom = bytearray(128 * 1024)
+    rom[0x1000:0x1800] = bytes(range(256)) * 8
+    with tempfile.TemporaryDirectory() as tmp:
+        filename = os.path.join(tmp, "EXKANJI.ROM")
+        with open(filename, "wb") as f:
+            f.write(rom)
+        font = GlyphFont.from_exkanji(filename)
+    assert font.halfwidth(0x41, 1) == rom[0x1000 + 8 * 0x41 : 0x1000 + 8 * 0x42]
+    assert font.halfwidth(0xFF, 1) == bytes(range(0xF8, 0x100))
+
+
+if __name__ == "__main__":
+    smoke_test_glyphfont()
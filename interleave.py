@@ -1,38 +1,197 @@
 #!/usr/bin/env python3
 
 """
-produce interleaved output from deinterleaved inputs
+produce interleaved output from deinterleaved inputs, or the reverse
 
-usage: python3 interleave.py [ -o OUTPUT; default /dev/fd/1 ] [ INPUT1 [INPUT2 ... INPUTn]; default /dev/fd/0 ]
+usage: python3 interleave.py [ -d | --split ] [ -n PAGES; default 2 ] [ -w WIDTH; default 1 ] [ -o OUTPUT; default /dev/fd/1 ] [ INPUT1 [INPUT2 ... INPUTn]; default /dev/fd/0 ]
 
-if only a single file is specified (or when /dev/fd/0 is read by default), it is assumed to be two concatenated INPUTs
+if only a single file is specified (or when /dev/fd/0 is read by default), it is assumed to be PAGES concatenated INPUTs
+
+with -d the single INPUT is deinterleaved into PAGES pages which are written to OUTPUT concatenated; with --split each page is written to its own file instead, named after OUTPUT with the page number (1...PAGES) added before the extension
+
+WIDTH is the size of the interleaved words in bytes, e.g. 2 for pairs of 8-bit ROMs on a 32-bit bus
+
+the data is processed in chunks of a fixed size, so inputs of any size can be piped through; only interleaving a single piped input or deinterleaving to a single output needs temporary files
 """
 
-import sys
+import argparse
+import contextlib
+import os
+import shutil
+import tempfile
+from pathlib import Path
+
+import numpy as np
+
+CHUNK_SIZE = 64 * 1024
 
-def interleave(*, pages):
+
+def interleave(*, pages, width=1):
     """
-    return the bytes of each page concatenated in an interleaved fashion
+    return the bytes of each page concatenated in an interleaved fashion, `width` bytes at a time
     """
     assert len(pages) > 1
     assert len({len(page) for page in pages}) == 1
-    return bytes(pages[i%len(pages)][i//len(pages)] for i in range(len(pages) * len(pages[0])))
+    assert len(pages[0]) % width == 0
+    words = [np.frombuffer(page, dtype=np.uint8).reshape(-1, width) for page in pages]
+    return np.stack(words, axis=1).tobytes()
 
-def smoketest():
-    assert interleave(pages=(b'\0\2', b'\1\3')) == b'\0\1\2\3'
-    assert interleave(pages=(b'\0\3', b'\1\4', b'\2\5')) == b'\0\1\2\3\4\5'
 
-if __name__ == "__main__":
-    _, *pagefiles = sys.argv
-    outfile = "/dev/fd/1"
-    if "-o" in pagefiles:
-        wherearg = pagefiles.index('-o')
-        outfile = pagefiles[1 + wherearg]
-        pagefiles = pagefiles[:wherearg] + pagefiles[2 + wherearg:]
-    pagefiles = pagefiles or ['/dev/fd/0']
-    pages=[open(pagefile, "rb").read() for pagefile in pagefiles]
-    if len(pages) == 1:
-        assert len(pages[0]) % 2 == 0
-        pages = [pages[0][:len(pages[0])//2], pages[0][len(pages[0])//2:]]
-    open(outfile,"wb").write(interleave(pages=pages))
+def deinterleave(data, *, n=2, width=1):
+    """
+    return the `n` pages that were interleaved `width` bytes at a time to make `data`
+    """
+    assert n > 1
+    assert len(data) % (n * width) == 0
+    words = np.frombuffer(data, dtype=np.uint8).reshape(-1, n, width)
+    return [words[:, i].tobytes() for i in range(n)]
+
+
+def _seekable(f):
+    # pipes are spooled to a temporary file first
+    try:
+        os.lseek(f.fileno(), 0, os.SEEK_CUR)
+        return f
+    except OSError:
+        spool = tempfile.TemporaryFile()
+        shutil.copyfileobj(f, spool, CHUNK_SIZE)
+        spool.flush()
+        return spool
+
+
+def _page_readers(infiles, n):
+    if len(infiles) > 1:
+        return [f.read for f in infiles]
+    f = _seekable(infiles[0])
+    size = os.fstat(f.fileno()).st_size
+    assert size % n == 0
+    offsets = [i * size // n for i in range(n)]
+
+    def reader(i):
+        stop = (i + 1) * size // n
+
+        def read(count):
+            data = os.pread(f.fileno(), min(count, stop - offsets[i]), offsets[i])
+            offsets[i] += len(data)
+            return data
+
+        return read
+
+    return [reader(i) for i in range(n)]
+
 
+def interleave_stream(infiles, outfile, *, n=2, width=1, chunk_size=CHUNK_SIZE):
+    """
+    write the pages read from the binary files `infiles` (or the `n` pages concatenated in `infiles[0]`) to `outfile` interleaved `width` bytes at a time, one chunk of each page at a time
+    """
+    readers = _page_readers(infiles, n)
+    chunk_size -= chunk_size % width
+    while True:
+        pages = [read(chunk_size) for read in readers]
+        if not any(pages):
+            break
+        outfile.write(interleave(pages=pages, width=width))
+
+
+def deinterleave_stream(infile, outfiles, *, width=1, chunk_size=CHUNK_SIZE):
+    """
+    write each of the pages interleaved `width` bytes at a time in the binary file `infile` to the matching one of `outfiles`, one chunk at a time
+    """
+    chunk_size -= chunk_size % (len(outfiles) * width)
+    while chunk := infile.read(chunk_size):
+        pages = deinterleave(chunk, n=len(outfiles), width=width)
+        for outfile, page in zip(outfiles, pages):
+            outfile.write(page)
+
+
+def split_names(path, n):
+    """
+    return the file names for the `n` pages of `path`, e.g. EXTKANJI1.ROM and EXTKANJI2.ROM for EXTKANJI.ROM
+    """
+    path = Path(path)
+    return [path.with_name(f"{path.stem}{i}{path.suffix}") for i in range(1, n + 1)]
+
+
+def smoke_test_interleave():
+    assert interleave(pages=(b"\0\2", b"\1\3")) == b"\0\1\2\3"
+    assert interleave(pages=(b"\0\3", b"\1\4", b"\2\5")) == b"\0\1\2\3\4\5"
+    assert interleave(pages=(b"\0\1\4\5", b"\2\3\6\7"), width=2) == bytes(range(8))
+    assert deinterleave(bytes(range(6)), n=3) == [b"\0\3", b"\1\4", b"\2\5"]
+    assert deinterleave(bytes(range(8)), width=2) == [b"\0\1\4\5", b"\2\3\6\7"]
+    assert [p.name for p in split_names("a/EXTKANJI.ROM", 2)] == [
+        "EXTKANJI1.ROM",
+        "EXTKANJI2.ROM",
+    ]
+    data = np.random.default_rng(6001).integers(0, 256, 3 * 4 * 1000, np.uint8)
+    with tempfile.TemporaryFile() as f, tempfile.TemporaryFile() as g:
+        f.write(data.tobytes())
+        f.seek(0)
+        interleave_stream([f], g, n=3, width=4, chunk_size=100)
+        g.seek(0)
+        pages = [tempfile.TemporaryFile() for _ in range(3)]
+        deinterleave_stream(g, pages, width=4, chunk_size=100)
+        for page, expected in zip(pages, np.split(data, 3)):
+            page.seek(0)
+            assert page.read() == expected.tobytes()
+            page.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Interleave or deinterleave ROM pages."
+    )
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument(
+        "-d",
+        "--deinterleave",
+        action="store_true",
+        help="deinterleave INPUT into concatenated pages",
+    )
+    mode.add_argument(
+        "--split",
+        action="store_true",
+        help="deinterleave INPUT into a separate file per page",
+    )
+    parser.add_argument(
+        "-n", "--pages", type=int, default=2, help="number of pages (default 2)"
+    )
+    parser.add_argument(
+        "-w", "--width", type=int, default=1, help="word width in bytes (default 1)"
+    )
+    parser.add_argument("-o", "--output", metavar="OUTPUT")
+    parser.add_argument("inputs", metavar="INPUT", nargs="*", default=["/dev/fd/0"])
+    args = parser.parse_args()
+    smoke_test_interleave()
+    if args.split and not args.output:
+        parser.error("--split needs -o to name the pages after")
+    args.output = args.output or "/dev/fd/1"
+    if not (args.deinterleave or args.split):
+        with contextlib.ExitStack() as stack:
+            infiles = [stack.enter_context(open(name, "rb")) for name in args.inputs]
+            outfile = stack.enter_context(open(args.output, "wb"))
+            interleave_stream(infiles, outfile, n=args.pages, width=args.width)
+        return
+    if len(args.inputs) != 1:
+        parser.error("deinterleaving takes a single INPUT")
+    with open(args.inputs[0], "rb") as infile:
+        if args.split:
+            names = split_names(args.output, args.pages)
+            with contextlib.ExitStack() as stack:
+                outfiles = [stack.enter_context(open(name, "wb")) for name in names]
+                deinterleave_stream(infile, outfiles, width=args.width)
+            return
+        # the first page goes straight to the output, the rest are
+        # spooled until it is complete
+        with open(args.output, "wb") as outfile, contextlib.ExitStack() as stack:
+            spools = [
+                stack.enter_context(tempfile.TemporaryFile())
+                for _ in range(args.pages - 1)
+            ]
+            deinterleave_stream(infile, [outfile, *spools], width=args.width)
+            for spool in spools:
+                spool.seek(0)
+                shutil.copyfileobj(spool, outfile, CHUNK_SIZE)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,350 @@
+#!/usr/bin/env python3
+
+"""
+convert 16x16 Kanji ROM images between any two of the formats the visualizers understand
+
+usage: python3 kanjiconvert.py --from FORMAT --to FORMAT [ --size BYTES ] [ --fill POLICY ] [ --base BASE.ROM ] -o OUTPUT INPUT [ INPUT ... ]
+
+Every format is compiled once per ROM size into an index array giving,
+for each ROM byte, the byte of the JIS X 0208 glyph (ku and ten 1...94,
+32 bytes each, two per row) it holds. Composing the target's array with
+the inverse of the source's gives a gather index straight from source
+bytes to target bytes, so a conversion is a single NumPy gather with no
+per-glyph Python code. The formats are:
+
+- `exkanji`: `saverkanji` EXKANJI.ROM / PC-8801 `kanji1.rom` (see `exkanjilayout`)
+- `pc8801`: PC-8801 `kanji1.rom` followed by `kanji2.rom`
+- `kanjirom`: PC-6001mkII / PC-6601 KANJIROM.62 / KANJIROM.66, two ICs concatenated (see `kanjirom6x`)
+- `msx-io` and `msx-ic`: MSX Kanji ROM in I/O port order and IC order (see `reorder_msx_rom`), 128 KiB for Level 1 or 256 KiB with Level 2
+- `skw`: Yamaha SKW-01 Kanji ROM (see `skwkanjiviz`)
+
+Target glyphs the source lacks are filled by `--fill` policy: `zero`
+(blank), `ones` (solid), `box` (a hollow square, so they stand out), or
+`base`, which copies them from the `--base` image (an existing ROM in
+the target format). The rest of the target (half-width fonts, cells
+outside JIS X 0208) comes from the `--base` image too, or is zero.
+The output is the size of the `--base` image if there is one, and
+otherwise `--size` or the smallest that holds every input glyph.
+Several INPUTs are concatenated, e.g. `kanji1.rom kanji2.rom`.
+"""
+
+import argparse
+import functools
+import sys
+
+import numpy as np
+
+GLYPHS = 96 * 96  # glyph slots, 96 per ku, of which ku and ten 1...94 are used
+NONE = 32 * GLYPHS  # index for a byte that holds no JIS X 0208 glyph
+
+BOX = bytes.fromhex("ffff" + "8001" * 14 + "ffff")
+FILLS = {"zero": bytes(32), "ones": b"\xff" * 32, "box": BOX, "base": None}
+
+
+def msxkanji_kuten(glyph):
+    """
+    return `(ku, ten)` for MSX Kanji ROM glyph number `glyph` (ku 0...10 are 96 glyphs apart, with ku 10 cut short at ten 64, then ku 16 on)
+    """
+    cell = glyph + 32 * (glyph >= 1024)
+    row, ten = divmod(cell, 96)
+    return row + 5 * (row >= 11), ten
+
+
+def msxkanji_checks(k):
+    """
+    return the names of the MSX BIOS validity checks the I/O port order Kanji ROM data `k` fails
+    """
+    failed = []
+    if k[0x80 * 32 : 8 + 0x80 * 32] != bytes([(0x80 >> i) & 0x7F for i in range(8)]):
+        failed.append("Level 1")
+    if len(k) > 128 * 1024 and sum(k[0x1D7E * 32 : 8 + 0x1D7E * 32]) & 0xFF != 0x95:
+        failed.append("Level 2")
+    return failed
+
+
+def _jis_bytes(ku, ten, byte):
+    # broadcasts; NONE outside JIS X 0208
+    jis = (ku >= 1) & (ku <= 94) & (ten >= 1) & (ten <= 94)
+    return np.where(jis, 32 * (96 * ku + ten) + byte, NONE)
+
+
+def _glyph_bytes(kuten, order):
+    # the JIS glyph byte of each byte of glyphs at `kuten` stored in
+    # `order` (the JIS glyph byte of each stored glyph byte)
+    ku, ten = np.asarray(kuten).reshape(-1, 2).T
+    return _jis_bytes(ku[:, None], ten[:, None], np.asarray(order)).reshape(-1)
+
+
+def _from_layout(layout_indices, size, ku_of_row, first_cell):
+    # invert a JIS-ordered layout's gather index (layout byte -> ROM
+    # byte, `size` for none) whose ku rows start at `first_cell`
+    o = np.arange(32 * first_cell, len(layout_indices))
+    row, ten = np.divmod(o // 32 - first_cell, 96)
+    jis = _jis_bytes(ku_of_row(row), ten, o % 32)
+    indices = np.full(size, NONE)
+    source = layout_indices[32 * first_cell :]
+    kept = source < size
+    indices[source[kept]] = jis[kept]
+    return indices
+
+
+def _level1_ku(row):
+    return 1 + row + 6 * (row > 8)
+
+
+def _exkanji(size):
+    from exkanjilayout import exkanji_to_jis_indices
+
+    return _from_layout(exkanji_to_jis_indices(size), size, _level1_ku, 256)
+
+
+def _pc8801(size):
+    from exkanjilayout import LEVEL2_SIZE, pc8801_to_jis_indices
+
+    return _from_layout(
+        pc8801_to_jis_indices(size - LEVEL2_SIZE), size, _level1_ku, 256
+    )
+
+
+def _kanjirom(size):
+    from kanjirom6x import JIS_LEVEL1_KU, KANJIROM6X_CELLS
+    from reorder_msx_rom import Reorder, gather_index
+
+    ku = np.array(JIS_LEVEL1_KU)[KANJIROM6X_CELLS // 96]
+    words = _glyph_bytes(np.stack([ku, KANJIROM6X_CELLS % 96], 1), np.arange(32))
+    # the left and right bytes of each row are in separate ICs
+    return words[gather_index(Reorder.parse("kanjirom-ics").address)]
+
+
+def _msx_io(size):
+    from msxbioskanjiviz import GLYPH_ORDER
+
+    kuten = [msxkanji_kuten(glyph) for glyph in range(size // 32)]
+    return _glyph_bytes(kuten, np.argsort(GLYPH_ORDER))
+
+
+def _msx_ic(size):
+    from reorder_msx_rom import Reorder, gather_index
+
+    address = Reorder.parse("msx-ic").address
+    blocks = _msx_io(size).reshape(-1, 1 << len(address))
+    return blocks[:, gather_index(address)].reshape(-1)
+
+
+def _skw(size):
+    from skwkanjiviz import GLYPH_ORDER, expand_kanji
+
+    # run glyph numbers through the visualizer's own layout to find
+    # where each glyph goes
+    tags = np.zeros((size // 32, 32), dtype=np.uint8)
+    tags[:, :2] = (np.arange(1, 1 + size // 32)[:, None] >> [8, 0]) & 0xFF
+    layout, _ = expand_kanji(tags.tobytes(), bytes(size))
+    cells = np.frombuffer(layout, dtype=np.uint8).reshape(-1, 32)
+    cells = 256 * cells[:, 0].astype(int) + cells[:, 1]
+    where = np.flatnonzero(cells)
+    row, ten = np.divmod(where, 96)
+    kuten = np.zeros((size // 32, 2), dtype=int)
+    kuten[cells[where] - 1] = np.stack([row + 3 * (row >= 13), ten], 1)
+    return _glyph_bytes(kuten, np.argsort(GLYPH_ORDER))
+
+
+# name: (ROM sizes, function returning the JIS glyph byte of each ROM byte)
+FORMATS = {
+    "exkanji": ((128 * 1024,), _exkanji),
+    "pc8801": ((256 * 1024,), _pc8801),
+    "kanjirom": ((32 * 1024,), _kanjirom),
+    "msx-io": ((128 * 1024, 256 * 1024), _msx_io),
+    "msx-ic": ((128 * 1024, 256 * 1024), _msx_ic),
+    "skw": ((128 * 1024,), _skw),
+}
+
+
+@functools.lru_cache(maxsize=None)
+def to_jis_indices(fmt, size):
+    """
+    return, for each byte of a `size` byte ROM in format `fmt`, the JIS glyph byte (`32 * (96 * ku + ten)` on) it holds, or `NONE`
+    """
+    sizes, f = FORMATS[fmt]
+    if size not in sizes:
+        raise ValueError(
+            f"{fmt} ROMs are {' or '.join(map(str, sizes))} bytes, not {size}"
+        )
+    indices = f(size)
+    assert len(indices) == size
+    indices.flags.writeable = False
+    return indices
+
+
+@functools.lru_cache(maxsize=None)
+def from_jis_indices(fmt, size):
+    """
+    return, for each JIS glyph byte, the offset of the first byte holding it in a `size` byte ROM in format `fmt`, or `size` if there is none
+    """
+    forward = to_jis_indices(fmt, size)
+    indices = np.full(NONE + 1, size)
+    kept = np.flatnonzero(forward < NONE)[::-1]
+    indices[forward[kept]] = kept
+    indices = indices[:NONE]
+    indices.flags.writeable = False
+    return indices
+
+
+@functools.lru_cache(maxsize=None)
+def conversion_indices(source_fmt, source_size, target_fmt, target_size, fill="zero"):
+    """
+    return the gather index into a `source_size` byte ROM in `source_fmt` followed by a 32-byte fill glyph and a `target_size` byte base image that makes a `target_size` byte ROM in `target_fmt`
+    """
+    target = to_jis_indices(target_fmt, target_size)
+    source = np.append(from_jis_indices(source_fmt, source_size), source_size)
+    indices = source[target]
+    missing = (indices == source_size) & (target < NONE)
+    if fill == "base":
+        filled = source_size + 32 + np.arange(target_size)
+    else:
+        filled = source_size + target % 32
+    indices = np.where(missing, filled, indices)
+    rest = target == NONE
+    indices = np.where(rest, source_size + 32 + np.arange(target_size), indices)
+    indices.flags.writeable = False
+    return indices
+
+
+def convert(rom, source_fmt, target_fmt, target_size=None, fill="zero", base=None):
+    """
+    return the ROM image `rom` in format `source_fmt` converted to `target_fmt`
+
+    `target_size` defaults to the size of `base`, or without one to the smallest size that has room for every glyph of `rom`. Glyphs `rom` lacks are filled according to `fill` (a key of `FILLS`), and the bytes of the target that hold no JIS X 0208 glyph come from `base` (an image in `target_fmt`) or are zero.
+    """
+    if base is not None:
+        sizes = FORMATS[target_fmt][0]
+        if len(base) not in sizes:
+            raise ValueError(
+                f"{target_fmt} ROMs are {' or '.join(map(str, sizes))} bytes,"
+                f" but the base image is {len(base)}"
+            )
+        if target_size is None:
+            target_size = len(base)
+        elif target_size != len(base):
+            raise ValueError(f"the base image is {len(base)} bytes, not {target_size}")
+    if target_size is None:
+        sizes = FORMATS[target_fmt][0]
+        held = from_jis_indices(source_fmt, len(rom)) < len(rom)
+        target_size = next(
+            (
+                size
+                for size in sizes
+                if not (held & (from_jis_indices(target_fmt, size) == size)).any()
+            ),
+            sizes[-1],
+        )
+    if base is None:
+        if fill == "base":
+            raise ValueError("the base fill policy needs a base image")
+        base = bytes(target_size)
+    indices = conversion_indices(source_fmt, len(rom), target_fmt, target_size, fill)
+    padded = np.frombuffer(
+        bytes(rom) + (FILLS[fill] or bytes(32)) + bytes(base), dtype=np.uint8
+    )
+    return padded[indices].tobytes()
+
+
+def smoke_test_kanjiconvert():
+    from exkanjilayout import exkanji_to_jis, pc8801_to_jis
+    from kanjirom6x import jisrom_to_kanjirom
+    from msxbioskanjiviz import shuffle_kanji
+    from reorder_msx_rom import reorder_bits_to_ic
+
+    rng = np.random.default_rng(25)
+    kanji1 = bytes(rng.integers(0, 256, 128 * 1024, np.uint8))
+    kanji2 = bytes(rng.integers(0, 256, 128 * 1024, np.uint8))
+
+    # the same as exkanji2kanjirom
+    jis = exkanji_to_jis(kanji1)
+    kanjirom = jisrom_to_kanjirom(jis[256 * 32 : (256 + 96 * 41) * 32])
+    kanjirom = kanjirom[::2] + kanjirom[1::2]
+    assert convert(kanji1, "exkanji", "kanjirom") == kanjirom
+
+    # MSX glyphs land at the same kuten as in the PC-8801 layout
+    msx = convert(kanji1 + kanji2, "pc8801", "msx-io")
+    assert len(msx) == 256 * 1024
+    assert len(convert(kanji1, "exkanji", "msx-io")) == 128 * 1024
+    jis, cells = pc8801_to_jis(kanji1, kanji2), shuffle_kanji(msx)
+    for glyph in (96, 97, 0x80, 96 + 95, 9 * 96 + 40, 1025, 4096, 4096 + 97, 0x1D7E):
+        ku, ten = msxkanji_kuten(glyph)
+        cell = 256 + 96 * (ku - 1 - 6 * (ku >= 16)) + ten
+        expected = jis[32 * cell : 32 * cell + 32] if 1 <= ten <= 94 else bytes(32)
+        assert cells[32 * glyph : 32 * glyph + 32] == expected, glyph
+    assert convert(kanji1 + kanji2, "pc8801", "msx-ic") == reorder_bits_to_ic(msx)
+    assert convert(reorder_bits_to_ic(msx), "msx-ic", "msx-io") == msx
+
+    # round trips keep every glyph both formats have
+    back = convert(msx, "msx-io", "pc8801", base=kanji1 + kanji2)
+    assert back == kanji1 + kanji2
+    skw = convert(msx, "msx-io", "skw")
+    assert convert(skw, "skw", "msx-io", 256 * 1024, "base", msx) == msx
+    skw = convert(kanjirom, "kanjirom", "skw", fill="box")
+    assert convert(skw, "skw", "kanjirom") == kanjirom
+    boxed = shuffle_kanji(convert(kanjirom, "kanjirom", "msx-io", fill="box"))
+    held = (from_jis_indices("msx-io", 128 * 1024) < 128 * 1024).sum() // 32
+    assert boxed.count(BOX) == held - 1024
+    # the size of a base image is the size of the output
+    based = convert(kanji1, "exkanji", "msx-io", fill="base", base=msx)
+    assert len(based) == 256 * 1024 and based[128 * 1024 :] == msx[128 * 1024 :]
+    for target, size, base in (
+        ("exkanji", None, None),
+        ("exkanji", None, msx),
+        ("msx-io", 128 * 1024, msx),
+    ):
+        try:
+            convert(kanjirom, "kanjirom", target, size, "base", base)
+            assert False, (target, size)
+        except ValueError:
+            pass
+    assert msxkanji_checks(bytes(256 * 1024)) == ["Level 1", "Level 2"]
+    assert msxkanji_checks(bytes(128 * 1024)) == ["Level 1"]
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Convert Kanji ROM images between formats."
+    )
+    parser.add_argument("--from", dest="source", choices=FORMATS, required=True)
+    parser.add_argument("--to", dest="target", choices=FORMATS, required=True)
+    parser.add_argument(
+        "--size",
+        type=lambda s: int(s, 0),
+        help="output size (default: that of BASE.ROM, or as needed)",
+    )
+    parser.add_argument(
+        "--fill",
+        choices=FILLS,
+        default="zero",
+        help="what to put in place of glyphs the input lacks",
+    )
+    parser.add_argument(
+        "--base", metavar="BASE.ROM", help="image in the output format to fill from"
+    )
+    parser.add_argument("-o", "--output", metavar="OUTPUT", required=True)
+    parser.add_argument("inputs", metavar="INPUT", nargs="+")
+    args = parser.parse_args()
+    smoke_test_kanjiconvert()
+    rom = b"".join(open(filename, "rb").read() for filename in args.inputs)
+    base = args.base and open(args.base, "rb").read()
+    try:
+        converted = convert(rom, args.source, args.target, args.size, args.fill, base)
+    except ValueError as e:
+        parser.error(str(e))
+    if args.target.startswith("msx"):
+        io = converted
+        if args.target == "msx-ic":
+            from reorder_msx_rom import reorder_bits_to_io
+
+            io = reorder_bits_to_io(converted)
+        for check in msxkanji_checks(io):
+            print(f"warning: MSX BIOS {check} Kanji ROM check fails", file=sys.stderr)
+    with open(args.output, "wb") as f:
+        f.write(converted)
+
+
+if __name__ == "__main__":
+    main()
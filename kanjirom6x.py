@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+
+"""
+the PC-6001mkII / PC-6601 KANJIROM subset of JIS level 1
+
+KANJIROM.62 / KANJIROM.66 hold 1024 of the JIS level 1 Kanji, in JIS
+order with the others left out. The subset is kept as a 96x96
+membership bitmap, plus the rank of each member (its glyph number in
+the KANJIROM), so membership is one lookup and converting between the
+subset and a full JIS level 1 layout (ku 1-9 and 16-47, 96 cells per
+ku, 32 bytes per cell) is a single NumPy gather either way.
+
+usage: python3 kanjirom6x.py
+
+(running it checks the tables against the kuten list)
+"""
+
+import codecs
+import gzip
+
+import numpy as np
+
+# The list of kuten codes used to extract the KANJIROM subset from
+# EXKANJIROM is stored as a compressed list of skips.
+
+
+def _decompress_kuten_data(compressed_kuten_data):
+    ku_then_ten_data = gzip.decompress(codecs.decode(compressed_kuten_data, "base64"))
+    ku_data, ten_data = (
+        ku_then_ten_data[: len(ku_then_ten_data) // 2],
+        ku_then_ten_data[len(ku_then_ten_data) // 2 :],
+    )
+    assert len(ku_data) == len(ten_data)
+    kuten_data = []
+    o = (0, None)
+    for i in range(len(ku_data)):
+        o = (
+            (o[0] + ku_data[i], ten_data[i])
+            if ku_data[i]
+            else (o[0], o[1] + ten_data[i] + 1)
+        )
+        kuten_data.append(o)
+    return kuten_data
+
+
+JIS_TO_KANJIROM6X_KUTEN_DATA = _decompress_kuten_data(
+    b"H4sIANj6o2gC/71T7W4bMQwTJVl2Lu1aoEDf/1FHytft17AgvS1BLoktix+i3+3PLzy19VAVvnX6"
+    b"8SpchPL3Qth1UM8cwQVl+C/McY2cp8k+nRj8s2jgulE9VPF7r2q+uAUcgTCHm94RYA3SgA8LZ/ng"
+    b"nhU37OYJrqW6zN0JrNWLZR5A8ie3o0J7bjxaLyCAddtpcV/8Dut/GGycJED8JLbp47spTwrgTn6v"
+    b"3gBa17J+hbt4kyeGEZSdtWqF6taRMSe6cLNPbpl7nR64ZDV1IwkIFRvQtfzqUbbVSyb5UwvurSOE"
+    b"J52EE6pTK5VQsCdtlIeJ1qCzlBXsJark42F9znHOYT9Hq469EhtSj7apraWpS2q0uMHNUpy3V+01"
+    b"IukKmwW2l4d3y2xN8kpAA1ltOKdJos2XT5ftOZQC+dRd39joR5P1pua/wsN0+GgpJ/wX5VSuRkqu"
+    b"vbmVGrf1qs8tB34eiPO7Sqhrb9DJOcjM1hccA6egnG7dNpGhoRDNg7Gzz917LaBzmaJcwVlJN1WN"
+    b"lmk5G5vORRtt+c6OHUDXMofuSxzQE2sZZbe4H0xhn2M1G0Pxky+FQ+HAnl9lbiOKlyH2sJWz0sh1"
+    b"bca5rwBFcI5MxqFq1tChicVOx9B1SJJaLXqAacSk0h771KjGCLnVN043pS8wV3v859UhxZk+FWKP"
+    b"vq+5OPRCzJCwn5XY2LIACAAA"
+)
+
+
+# the ku rows of a JIS level 1 layout
+JIS_LEVEL1_KU = [ku for ku in range(1, 48) if not 10 <= ku < 16]
+
+KANJIROM6X_BITMAP = np.zeros((96, 96), dtype=bool)
+KANJIROM6X_BITMAP[tuple(np.array(JIS_TO_KANJIROM6X_KUTEN_DATA).T)] = True
+KANJIROM6X_BITMAP.flags.writeable = False
+
+# glyph number within the KANJIROM of each JIS level 1 layout cell, or
+# 1024 (one past the last glyph) for cells not in the subset
+_members = KANJIROM6X_BITMAP[JIS_LEVEL1_KU].reshape(-1)
+KANJIROM6X_RANK = np.where(
+    _members, np.cumsum(_members) - 1, len(JIS_TO_KANJIROM6X_KUTEN_DATA)
+)
+KANJIROM6X_RANK.flags.writeable = False
+KANJIROM6X_CELLS = np.flatnonzero(_members)
+KANJIROM6X_CELLS.flags.writeable = False
+del _members
+
+
+def in_kanjirom6x(ku, ten):
+    """
+    return True if the cell at `ku`, `ten` is in the KANJIROM subset
+    """
+    return bool(KANJIROM6X_BITMAP[ku, ten])
+
+
+def kanjirom_to_jisrom(kanjirom):
+    """
+    expand KANJIROM subset into JIS level 1
+    """
+    assert len(kanjirom) == 32 * len(JIS_TO_KANJIROM6X_KUTEN_DATA)
+    glyphs = np.full((len(JIS_TO_KANJIROM6X_KUTEN_DATA) + 1, 32), 0xFF, dtype=np.uint8)
+    glyphs[:-1] = np.frombuffer(kanjirom, dtype=np.uint8).reshape(-1, 32)
+    return glyphs[KANJIROM6X_RANK].tobytes()
+
+
+def jisrom_to_kanjirom(jisrom):
+    """
+    extract the KANJIROM subset from JIS level 1
+    """
+    assert len(jisrom) == 32 * len(KANJIROM6X_RANK)
+    glyphs = np.frombuffer(jisrom, dtype=np.uint8).reshape(-1, 32)
+    return glyphs[KANJIROM6X_CELLS].tobytes()
+
+
+def smoke_test_kanjirom6x():
+    assert JIS_TO_KANJIROM6X_KUTEN_DATA == sorted(JIS_TO_KANJIROM6X_KUTEN_DATA)
+    assert [
+        (ku, ten) for ku in range(96) for ten in range(96) if in_kanjirom6x(ku, ten)
+    ] == JIS_TO_KANJIROM6X_KUTEN_DATA
+    kanjirom = bytes(np.random.default_rng(6001).integers(0, 256, 32 * 1024, np.uint8))
+    jisrom = b""
+    rest = kanjirom
+    for ku in JIS_LEVEL1_KU:
+        for ten in range(96):
+            if (ku, ten) in JIS_TO_KANJIROM6X_KUTEN_DATA:
+                jisrom += rest[:32]
+                rest = rest[32:]
+            else:
+                jisrom += b"\xff" * 32
+    assert kanjirom_to_jisrom(kanjirom) == jisrom
+    assert jisrom_to_kanjirom(jisrom) == kanjirom
+
+
+if __name__ == "__main__":
+    smoke_test_kanjirom6x()
@@ -19,7 +19,11 @@ The code provided in this file is entirely public domain, meaning you are legall
 
 """
 
-import math, os, struct, sys, wave
+import argparse, inspect, math, os, wave
+
+import numpy as np
+
+from fsktape import PhaseModulator, frame_bits
 
 CAS_HEADER_MARKER = b"\x1f\xa6\xde\xba\xcc\x13\x7d\x74"
 SAMPLE_RATE = 22050
@@ -28,90 +32,214 @@ FIRST_LEADER_DURATION = 4.0
 NORMAL_LEADER_DURATION = 2.0
 FINAL_SILENCE_DURATION = 2.0
 BAUD_RATE = 1200
+BLOCK_SIZE = 4096  # CAS bytes synthesized and written at a time
+
+# the 11-bit frame of each byte value: a start bit, the 8 data bits
+# least significant first, and two stop bits
+FRAME_BITS = frame_bits(2)
 
 
-def generate_cycle(freq):
-    samples_in_cycle = int(SAMPLE_RATE / freq)
+def generate_cycle(freq, sample_rate=SAMPLE_RATE, peak_amplitude=PEAK_AMPLITUDE):
+    samples_in_cycle = int(sample_rate / freq)
     cycle = []
     for i in range(samples_in_cycle):
-        value = PEAK_AMPLITUDE * math.sin(2 * math.pi * (i / samples_in_cycle))
+        value = peak_amplitude * math.sin(2 * math.pi * (i / samples_in_cycle))
         cycle.append(int(value * 32767.0))
-    return cycle
-
-
-def generate_silence(duration):
-    samples_in_silence = int(SAMPLE_RATE * duration)
-    return [0] * samples_in_silence
-
-
-def encode_bit(bit_value):
-    samples = []
-    if bit_value == 0:
-        samples.extend(generate_cycle(BAUD_RATE))
-    else:
-        samples.extend(generate_cycle(2 * BAUD_RATE))
-        samples.extend(generate_cycle(2 * BAUD_RATE))
-    return samples
-
-
-def encode_byte(byte_val):
-    samples = []
-    samples.extend(encode_bit(0))
-    for i in range(8):
-        bit = (byte_val >> i) & 1
-        samples.extend(encode_bit(bit))
-    samples.extend(encode_bit(1))
-    samples.extend(encode_bit(1))
-    return samples
-
-
-def generate_pilot_leader(duration_seconds):
-    samples = []
-    cycles_needed = int(2 * BAUD_RATE * duration_seconds)
-    for _ in range(cycles_needed):
-        samples.extend(generate_cycle(2 * BAUD_RATE))
-    return samples
-
-
-def cas_to_wav(cas_filename, wav_filename):
+    return np.array(cycle, dtype="<i2")
+
+
+def _gather(waveforms, indices):
+    # concatenate waveforms[i] for each i in `indices`, which may differ in length
+    lengths = np.array([len(waveform) for waveform in waveforms])
+    starts = np.cumsum(lengths) - lengths
+    table = np.concatenate(waveforms)
+    lengths, starts = lengths[indices], starts[indices]
+    ends = np.cumsum(lengths)
+    offsets = np.repeat(starts - (ends - lengths), lengths)
+    return table[offsets + np.arange(ends[-1] if len(ends) else 0)]
+
+
+class Synthesizer:
+    """
+    the samples of one tape format, a block at a time
+
+    By default every cycle is a whole number of samples, `int(sample_rate / freq)`, as the tapes made so far have been. With `phase_continuous` the samples come from an `fsktape.PhaseModulator` instead, so the bit cells are exactly `sample_rate / baud_rate` samples long on average and rates such as 44100/2400 do not drift.
+    """
+
+    __slots__ = (
+        "sample_rate",
+        "baud_rate",
+        "first_leader_duration",
+        "normal_leader_duration",
+        "final_silence_duration",
+        "channels",
+        "phase_continuous",
+        "_bits",
+        "_leader_cycle",
+        "_modulator",
+    )
+
+    def __init__(
+        self,
+        sample_rate=SAMPLE_RATE,
+        baud_rate=BAUD_RATE,
+        first_leader_duration=FIRST_LEADER_DURATION,
+        normal_leader_duration=NORMAL_LEADER_DURATION,
+        final_silence_duration=FINAL_SILENCE_DURATION,
+        peak_amplitude=PEAK_AMPLITUDE,
+        channels=1,
+        phase_continuous=False,
+    ):
+        self.sample_rate = sample_rate
+        self.baud_rate = baud_rate
+        self.first_leader_duration = first_leader_duration
+        self.normal_leader_duration = normal_leader_duration
+        self.final_silence_duration = final_silence_duration
+        self.channels = channels
+        self.phase_continuous = phase_continuous
+        if not phase_continuous:
+            # the 0-bit, 1-bit and leader waveforms, computed once
+            cycle = generate_cycle(2 * baud_rate, sample_rate, peak_amplitude)
+            self._leader_cycle = cycle
+            self._bits = [
+                generate_cycle(baud_rate, sample_rate, peak_amplitude),
+                np.concatenate([self._leader_cycle, self._leader_cycle]),
+            ]
+            return
+        # the tape is one continuous run, leaders included
+        self._modulator = PhaseModulator(sample_rate, baud_rate, peak_amplitude * 32767.0)
+
+    def _frames(self, samples):
+        return np.repeat(samples, self.channels) if self.channels > 1 else samples
+
+    def leader(self, is_first_header):
+        if is_first_header:
+            duration = self.first_leader_duration
+        else:
+            duration = self.normal_leader_duration
+        cycles_needed = int(2 * self.baud_rate * duration)
+        if self.phase_continuous:
+            return self._frames(self._modulator.leader(cycles_needed))
+        return self._frames(np.tile(self._leader_cycle, cycles_needed))
+
+    def data(self, bits):
+        """
+        return the samples for the frame bits `bits`, e.g. `FRAME_BITS[byte values]`
+        """
+        bits = bits.reshape(-1)
+        if self.phase_continuous:
+            return self._frames(self._modulator.bits(bits))
+        return self._frames(_gather(self._bits, bits))
+
+    def silence(self):
+        samples_in_silence = int(self.sample_rate * self.final_silence_duration)
+        return np.zeros(samples_in_silence * self.channels, dtype="<i2")
+
+
+def parse_cas(cas_data):
+    # yield the structure of the tape: a leader for each header marker
+    # (True for the first one) and the frame bits of the bytes between
+    # them a block at a time
+    idx = 0
+    total_bytes = len(cas_data)
+    is_first_header = True
+    while idx < total_bytes:
+        marker = cas_data.find(CAS_HEADER_MARKER, idx)
+        stop = total_bytes if marker < 0 else marker
+        for block in range(idx, stop, BLOCK_SIZE):
+            byts = cas_data[block : min(block + BLOCK_SIZE, stop)]
+            yield "data", FRAME_BITS[np.frombuffer(byts, dtype=np.uint8)]
+        if marker < 0:
+            break
+        yield "leader", is_first_header
+        is_first_header = False
+        idx = marker + 8
+
+
+def cas_to_wavs(cas_filename, variants):
+    """
+    write the tape in `cas_filename` to each of the WAV files named by the keys of `variants`, whose values are dicts of `Synthesizer` arguments, in a single pass over the CAS data
+    """
     # this is a general purpose data converter. the extension
     # validation by assertion is reasonable, but dictating other
     # aspects of the input and output paths would not be, so we
     # suppress sonarqube validation/taint analysis
     assert os.path.splitext(cas_filename)[-1].lower() == ".cas"
-    assert os.path.splitext(wav_filename)[-1].lower() == ".wav"
+    for wav_filename in variants:
+        assert os.path.splitext(wav_filename)[-1].lower() == ".wav"
     with open(cas_filename, "rb") as f:  # NOSONAR
         cas_data = f.read()
-    pcm_frames = []
-    idx = 0
-    total_bytes = len(cas_data)
-    is_first_header = True
-    while idx < total_bytes:
-        if cas_data[idx : idx + 8] == CAS_HEADER_MARKER:
-            leader_duration = (
-                FIRST_LEADER_DURATION if is_first_header else NORMAL_LEADER_DURATION
-            )
-            pcm_frames.extend(generate_pilot_leader(leader_duration))
-            is_first_header = False
-            idx += 8
+    outputs = []
+    try:
+        for wav_filename, tape_format in variants.items():
+            synthesizer = Synthesizer(**tape_format)
+            wav_file = wave.open(wav_filename, "wb")  # NOSONAR
+            outputs.append((synthesizer, wav_file))
+            wav_file.setnchannels(synthesizer.channels)
+            wav_file.setsampwidth(2)
+            wav_file.setframerate(synthesizer.sample_rate)
+        for kind, value in parse_cas(cas_data):
+            for synthesizer, wav_file in outputs:
+                samples = getattr(synthesizer, kind)(value)
+                wav_file.writeframes(samples.tobytes())
+        for synthesizer, wav_file in outputs:
+            wav_file.writeframes(synthesizer.silence().tobytes())
+    finally:
+        for _, wav_file in outputs:
+            wav_file.close()
+
+
+def cas_to_wav(cas_filename, wav_filename, **tape_format):
+    cas_to_wavs(cas_filename, {wav_filename: tape_format})
+
+
+def _tape_format(settings):
+    # "name=value" strings to Synthesizer arguments, typed like their defaults
+    defaults = {
+        name: parameter.default
+        for name, parameter in inspect.signature(Synthesizer).parameters.items()
+    }
+    tape_format = {}
+    for setting in settings:
+        name, _, value = setting.partition("=")
+        if name not in defaults:
+            raise ValueError(f"unknown setting {name!r}")
+        default = defaults[name]
+        if isinstance(default, bool):
+            tape_format[name] = value.lower() in ("1", "true", "yes", "on")
         else:
-            pcm_frames.extend(encode_byte(cas_data[idx]))
-            idx += 1
-    pcm_frames.extend(generate_silence(FINAL_SILENCE_DURATION))
-    with wave.open(wav_filename, "wb") as wav_file:  # NOSONAR
-        wav_file.setnchannels(1)
-        wav_file.setsampwidth(2)
-        wav_file.setframerate(SAMPLE_RATE)
-        packed_data = struct.pack(f"{len(pcm_frames)}h", *pcm_frames)
-        wav_file.writeframes(packed_data)
+            tape_format[name] = type(default)(value)
+    return tape_format
 
 
 if __name__ == "__main__":
-    if (
-        len(sys.argv) != 3
-        or os.path.splitext(sys.argv[1])[-1].lower() != ".cas"
-        or os.path.splitext(sys.argv[2])[-1].lower() != ".wav"
+    parser = argparse.ArgumentParser(
+        description="Convert an MSX .CAS file to one or more .WAV files."
+    )
+    parser.add_argument("cas", metavar="input.cas")
+    parser.add_argument("wav", metavar="output.wav")
+    parser.add_argument(
+        "setting",
+        metavar="NAME=VALUE",
+        nargs="*",
+        help="tape format settings for output.wav: "
+        + ", ".join(inspect.signature(Synthesizer).parameters),
+    )
+    parser.add_argument(
+        "--also",
+        metavar=("output.wav", "NAME=VALUE"),
+        nargs="+",
+        action="append",
+        default=[],
+        help="another WAV file to write in the same pass, with its own settings",
+    )
+    args = parser.parse_args()
+    variants = {args.wav: _tape_format(args.setting)}
+    for wav, *settings in args.also:
+        variants[wav] = _tape_format(settings)
+    if os.path.splitext(args.cas)[-1].lower() != ".cas" or any(
+        os.path.splitext(wav)[-1].lower() != ".wav" for wav in variants
     ):
         print("Usage: python cas2wav.py <input.cas> <output.wav>")
     else:
-        cas_to_wav(sys.argv[1], sys.argv[2])
+        cas_to_wavs(args.cas, variants)
@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+
+"""
+MSX .CAS file builder, for the tapes rebuild.sh makes
+
+usage: python3 casfile.py [ --sub PATTERN REPLACEMENT ... ] -o output.cas { --ascii | --basic | --binary } NAME input [ { --ascii | --basic | --binary } NAME input ... ]
+
+Each file is written as a header block (`CAS_HEADER_MARKER`, ten bytes
+giving the file type and the NAME padded to 6 characters) and its data:
+
+- ASCII files (e.g. `SAVE"CAS:NAME",A` listings) are split into blocks
+  of 256 bytes, each after a marker, the last one padded with 0x1A.
+  The header and the last block are followed by `ASCII_FILLER`, as in
+  the .CAS files rebuild.sh has always made (an empty file is just a
+  marker and the filler).
+- BASIC files (tokenized, as `CSAVE` writes them) and binary files
+  (`BSAVE`, with their start, end and execution addresses first) are a
+  single block after a marker. The 0xFF or 0xFE byte starting MSX-DOS
+  copies of them is dropped, and the blocks are padded with zeros to
+  a multiple of 8 bytes, as emulators expect.
+
+Each `--sub` is a Python regular expression substitution applied (in
+order) to every block written, e.g. to point the LOAD statements of
+listings at the tape instead of the disk; matches do not span blocks.
+The input files are read and the output written a block at a time.
+"""
+
+import argparse, re
+
+from cas2wav import CAS_HEADER_MARKER
+
+BLOCK_SIZE = 256  # bytes per ASCII block
+ASCII_FILLER = b"\xfe" + bytes(7)
+FILE_TYPES = {"ascii": b"\xea" * 10, "basic": b"\xd3" * 10, "binary": b"\xd0" * 10}
+DISK_PREFIXES = {"basic": b"\xff", "binary": b"\xfe"}
+
+
+class CasWriter:
+    """
+    writes files to the .CAS file object `f`, applying the regular expression substitutions `subs` to each block
+    """
+
+    def __init__(self, f, subs=()):
+        self.f = f
+        self.subs = [(re.compile(pattern), replacement) for pattern, replacement in subs]
+
+    def _write(self, *pieces):
+        block = b"".join(pieces)
+        for pattern, replacement in self.subs:
+            block = pattern.sub(replacement, block)
+        self.f.write(block)
+
+    def header(self, kind, name):
+        """
+        write the header block of a file of type `kind` ("ascii", "basic" or "binary") named `name`
+        """
+        name = name.encode("ascii") if isinstance(name, str) else name
+        if len(name) > 6:
+            raise ValueError(f"{name!r} is longer than 6 characters")
+        filler = ASCII_FILLER if kind == "ascii" else b""
+        self._write(CAS_HEADER_MARKER, FILE_TYPES[kind], name.ljust(6), filler)
+
+    def ascii(self, name, infile):
+        """
+        write the ASCII file read from the binary file object `infile` a block at a time
+        """
+        self.header("ascii", name)
+        block = infile.read(BLOCK_SIZE)
+        while True:
+            following = infile.read(BLOCK_SIZE)
+            if not following:
+                # an empty file has a marker and filler but no block
+                padding = b"\x1a" * (BLOCK_SIZE - len(block)) if block else b""
+                self._write(CAS_HEADER_MARKER, block, padding, ASCII_FILLER)
+                return
+            self._write(CAS_HEADER_MARKER, block)
+            block = following
+
+    def _single_block(self, kind, name, data):
+        self.header(kind, name)
+        data = data.removeprefix(DISK_PREFIXES[kind])
+        self._write(CAS_HEADER_MARKER, data, bytes(-len(data) % 8))
+
+    def basic(self, name, infile):
+        """
+        write the tokenized BASIC program read from the binary file object `infile`
+        """
+        self._single_block("basic", name, infile.read())
+
+    def binary(self, name, infile):
+        """
+        write the binary file (start, end and execution addresses, then the bytes from start to end) read from `infile`
+        """
+        self._single_block("binary", name, infile.read())
+
+
+def write_cas(cas_filename, files, subs=()):
+    """
+    write the .CAS file `cas_filename` holding `files`, each `(kind, name, filename)`
+    """
+    with open(cas_filename, "wb") as f:
+        writer = CasWriter(f, subs)
+        for kind, name, filename in files:
+            with open(filename, "rb") as infile:
+                getattr(writer, kind)(name, infile)
+
+
+def smoke_test_casfile():
+    import io
+
+    f = io.BytesIO()
+    writer = CasWriter(f, [(rb"(?i)load", b"LOAD"), (rb"X", b"")])
+    writer.ascii("ABC", io.BytesIO(b"10 load X\r\n" + b"A" * 600))
+    writer.ascii("EMPTY", io.BytesIO())
+    writer.basic("PROG", io.BytesIO(b"\xff\x01\x02\x03"))
+    writer.binary("CODE", io.BytesIO(b"\xfe" + bytes(6) + b"\xc9"))
+    cas = f.getvalue()
+    assert cas.startswith(CAS_HEADER_MARKER + b"\xea" * 10 + b"ABC   " + ASCII_FILLER)
+    assert cas.count(CAS_HEADER_MARKER) == 10
+    assert CAS_HEADER_MARKER + b"10 LOAD \r\nAAA" in cas
+    assert b"A" * 99 + b"\x1a" * 157 + ASCII_FILLER in cas
+    empty = CAS_HEADER_MARKER + ASCII_FILLER
+    assert b"EMPTY " + ASCII_FILLER + empty + CAS_HEADER_MARKER in cas
+    assert CAS_HEADER_MARKER + b"\x01\x02\x03" + bytes(5) in cas
+    assert cas.endswith(CAS_HEADER_MARKER + bytes(6) + b"\xc9" + bytes(1))
+    # BASIC and binary files: a header, then one block padded so that
+    # every marker is 8-byte aligned, as in .CAS files made from tapes
+    f = io.BytesIO()
+    writer = CasWriter(f)
+    program = b"\xff\x0a\x80\x0a\x00\x91\x22A\x22\x00\x00\x00"  # 10 PRINT"A"
+    writer.basic("PROG", io.BytesIO(program))
+    writer.binary("CODE", io.BytesIO(b"\xfe\x00\xc0\x00\xc0\x00\xc0\xc9"))
+    cas = f.getvalue()
+    assert cas == b"".join(
+        [
+            CAS_HEADER_MARKER + b"\xd3" * 10 + b"PROG  ",
+            CAS_HEADER_MARKER + program[1:] + bytes(5),
+            CAS_HEADER_MARKER + b"\xd0" * 10 + b"CODE  ",
+            CAS_HEADER_MARKER + b"\x00\xc0\x00\xc0\x00\xc0\xc9" + bytes(1),
+        ]
+    )
+    markers = [m.start() for m in re.finditer(re.escape(CAS_HEADER_MARKER), cas)]
+    assert len(markers) == 4 and all(offset % 8 == 0 for offset in markers)
+
+
+class _AddFile(argparse.Action):
+    def __call__(self, parser, namespace, values, option_string=None):
+        name, filename = values
+        namespace.files.append((self.dest, name, filename))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build an MSX .CAS file.")
+    parser.add_argument("-o", "--output", metavar="output.cas", required=True)
+    parser.set_defaults(files=[])
+    for kind in FILE_TYPES:
+        parser.add_argument(
+            f"--{kind}",
+            nargs=2,
+            metavar=("NAME", "input"),
+            action=_AddFile,
+            help=f"add the {kind} file `input` as NAME",
+        )
+    parser.add_argument(
+        "--sub",
+        nargs=2,
+        metavar=("PATTERN", "REPLACEMENT"),
+        action="append",
+        default=[],
+        help="regular expression substitution for every block, may be repeated",
+    )
+    args = parser.parse_args()
+    smoke_test_casfile()
+    if not args.files:
+        parser.error("no input files")
+    subs = [(pattern.encode(), replacement.encode()) for pattern, replacement in args.sub]
+    write_cas(args.output, args.files, subs)
@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+
+"""
+MSX-DOS 720K (2DD) FAT12 .DSK image builder, lister and extractor
+
+usage: python3 dskfile.py -o output.dsk input [ input ... ]
+   or: python3 dskfile.py --list input.dsk
+   or: python3 dskfile.py --extract DIRECTORY input.dsk
+
+The image is laid out like one made by `_FORMAT` on a 2DD drive: a
+boot sector with the BIOS parameter block (media 0xF9, 9 sectors per
+track, 2 sides, 2 sectors per cluster), two copies of a 3-sector FAT,
+a 7-sector root directory with room for 112 entries, then 713 clusters
+of data. The files are stored one after another in the order given,
+each in a contiguous run of clusters, under their names in upper case
+(which must fit in 8.3), with every timestamp zero, so the same files
+always make the same image. As after `_FORMAT`, the boot sector is the
+standard MSX-DOS 1 one and free sectors are filled with 0x40; the end
+of each file's last sector is zeros. There is no MSXDOS.SYS on the
+image, so MSX machines boot it into Disk BASIC (and AUTOEXEC.BAS).
+
+Listing and extraction follow the FAT cluster chains, so they work on
+images written by MSX-DOS itself too (root directory only).
+"""
+
+import argparse, os, struct
+
+SECTOR_SIZE = 512
+SECTORS = 1440
+CLUSTER_SECTORS = 2
+RESERVED_SECTORS = 1
+FATS = 2
+FAT_SECTORS = 3
+ROOT_ENTRIES = 112
+MEDIA = 0xF9
+TRACK_SECTORS = 9
+SIDES = 2
+
+ROOT_START = (RESERVED_SECTORS + FATS * FAT_SECTORS) * SECTOR_SIZE
+DATA_START = ROOT_START + ROOT_ENTRIES * 32
+CLUSTER_SIZE = CLUSTER_SECTORS * SECTOR_SIZE
+CLUSTERS = (SECTORS * SECTOR_SIZE - DATA_START) // CLUSTER_SIZE
+END_OF_CHAIN = 0xFFF
+
+# jump, OEM name, BIOS parameter block, then the MSX-DOS 1 boot code
+# `_FORMAT` writes: it returns when called with carry clear, and
+# otherwise loads MSXDOS.SYS, or starts Disk BASIC if there is none
+BOOT_SECTOR = (
+    struct.pack(
+        "<3s8sHBHBHHBHHHH",
+        b"\xeb\xfe\x90",
+        b"MSX_04  ",
+        SECTOR_SIZE,
+        CLUSTER_SECTORS,
+        RESERVED_SECTORS,
+        FATS,
+        ROOT_ENTRIES,
+        SECTORS,
+        MEDIA,
+        FAT_SECTORS,
+        TRACK_SECTORS,
+        SIDES,
+        0,
+    )
+    + bytes.fromhex(
+        "d0 ed 53 59 c0 32 c4 c0 36 56 23 36 c0 31 1f f5 11 9f c0 0e 0f cd 7d f3"
+        "3c ca 63 c0 11 00 01 0e 1a cd 7d f3 21 01 00 22 ad c0 21 00 3f 11 9f c0"
+        "0e 27 cd 7d f3 c3 00 01 58 c0 cd 00 00 79 e6 fe fe 02 c2 6a c0 3a c4 c0"
+        "a7 ca 22 40 11 79 c0 0e 09 cd 7d f3 0e 07 cd 7d f3 18 b2"
+    )
+    + b"Boot error\r\nPress any key for retry\r\n$"
+    + b"\0MSXDOS  SYS"
+).ljust(SECTOR_SIZE, b"\0")
+
+# what `_FORMAT` leaves in the sectors of the data area
+FREE_FILLER = 0x40
+
+_ENTRY = struct.Struct("<11sB14xHI")
+
+
+def dos_name(filename):
+    """
+    return the 11-byte directory entry name for `filename`, e.g. b"KTST31  ASC" for "ktst31.asc"
+    """
+    stem, dot, extension = os.path.basename(filename).upper().rpartition(".")
+    if not dot:
+        stem, extension = extension, ""
+    name = stem.encode("ascii"), extension.encode("ascii")
+    if not 0 < len(name[0]) <= 8 or len(name[1]) > 3 or b" " in b"".join(name):
+        raise ValueError(f"{filename!r} is not an 8.3 file name")
+    return name[0].ljust(8) + name[1].ljust(3)
+
+
+def _pack_fat(entries):
+    # two 12-bit entries to every three bytes, least significant first
+    entries = list(entries) + [0] * (len(entries) % 2)
+    fat = bytearray()
+    for a, b in zip(entries[::2], entries[1::2]):
+        fat += bytes([a & 0xFF, a >> 8 | (b & 0xF) << 4, b >> 4])
+    return bytes(fat)
+
+
+def build_dsk(files):
+    """
+    return the image holding `files`, each `(filename, bytes)`
+    """
+    if len(files) > ROOT_ENTRIES:
+        raise ValueError(f"{len(files)} files, but room for only {ROOT_ENTRIES}")
+    image = bytearray(DATA_START)
+    image += bytes([FREE_FILLER]) * (SECTORS * SECTOR_SIZE - DATA_START)
+    image[:SECTOR_SIZE] = BOOT_SECTOR
+    fat = [0xF00 | MEDIA, END_OF_CHAIN] + [0] * CLUSTERS
+    root = bytearray()
+    names = set()
+    cluster = 2
+    for filename, data in files:
+        name = dos_name(filename)
+        if name in names:
+            raise ValueError(f"{filename!r} is on the disk already")
+        names.add(name)
+        count = -(-len(data) // CLUSTER_SIZE)
+        if cluster + count > CLUSTERS + 2:
+            raise ValueError(f"no room for {filename!r} ({len(data)} bytes)")
+        first = cluster if count else 0
+        root += _ENTRY.pack(name, 0, first, len(data))
+        if count:
+            fat[cluster : cluster + count - 1] = range(cluster + 1, cluster + count)
+            fat[cluster + count - 1] = END_OF_CHAIN
+            start = DATA_START + (cluster - 2) * CLUSTER_SIZE
+            size = -(-len(data) // SECTOR_SIZE) * SECTOR_SIZE
+            image[start : start + size] = data.ljust(size, b"\0")
+            cluster += count
+    fat_bytes = _pack_fat(fat)
+    for i in range(FATS):
+        start = (RESERVED_SECTORS + i * FAT_SECTORS) * SECTOR_SIZE
+        image[start : start + len(fat_bytes)] = fat_bytes
+    image[ROOT_START : ROOT_START + len(root)] = root
+    return bytes(image)
+
+
+def write_dsk(dsk_filename, filenames):
+    """
+    write the image `dsk_filename` holding the files `filenames`
+    """
+    files = []
+    for filename in filenames:
+        with open(filename, "rb") as f:
+            files.append((filename, f.read()))
+    with open(dsk_filename, "wb") as f:
+        f.write(build_dsk(files))
+
+
+def _unpack_fat(image):
+    start = RESERVED_SECTORS * SECTOR_SIZE
+    fat = image[start : start + FAT_SECTORS * SECTOR_SIZE]
+    entries = []
+    for i in range(0, len(fat) - 2, 3):
+        a, b, c = fat[i : i + 3]
+        entries += [a | (b & 0xF) << 8, b >> 4 | c << 4]
+    return entries
+
+
+def list_dsk(image):
+    """
+    return `(filename, size, first cluster, attributes)` for each file in the root directory of `image`
+    """
+    entries = []
+    for i in range(ROOT_START, DATA_START, 32):
+        name, attributes, cluster, size = _ENTRY.unpack_from(image, i)
+        if name[0] == 0:
+            break
+        if name[0] == 0xE5 or attributes & 0x18:  # deleted, volume label or directory
+            continue
+        stem, extension = name[:8].rstrip(), name[8:].rstrip()
+        filename = (stem + b"." + extension if extension else stem).decode("latin-1")
+        entries.append((filename, size, cluster, attributes))
+    return entries
+
+
+def read_file(image, size, cluster, fat=None):
+    """
+    return the `size` bytes of the file starting at `cluster` in `image`, following its FAT chain
+    """
+    fat = fat or _unpack_fat(image)
+    pieces, remaining = [], size
+    while remaining > 0:
+        if not 2 <= cluster < CLUSTERS + 2:
+            raise ValueError(f"bad cluster {cluster} with {remaining} bytes to go")
+        # runs of consecutive clusters are read at once
+        run = 1
+        while run * CLUSTER_SIZE < remaining and fat[cluster + run - 1] == cluster + run:
+            run += 1
+        start = DATA_START + (cluster - 2) * CLUSTER_SIZE
+        piece = image[start : start + min(run * CLUSTER_SIZE, remaining)]
+        pieces.append(piece)
+        remaining -= len(piece)
+        cluster = fat[cluster + run - 1]
+    return b"".join(pieces)
+
+
+def extract_dsk(image, directory):
+    """
+    write each file in the root directory of `image` into `directory`; return their names
+    """
+    os.makedirs(directory, exist_ok=True)
+    fat = _unpack_fat(image)
+    names = []
+    for filename, size, cluster, _ in list_dsk(image):
+        with open(os.path.join(directory, filename), "wb") as f:
+            f.write(read_file(image, size, cluster, fat))
+        names.append(filename)
+    return names
+
+
+def smoke_test_dskfile():
+    import random
+
+    rng = random.Random(720)
+    files = [
+        ("autoexec.bas", b'10 RUN"A.ASC"\r\n'),
+        ("a.asc", rng.randbytes(CLUSTER_SIZE)),
+        ("EMPTY", b""),
+        ("big.bin", rng.randbytes(5000)),
+    ]
+    image = build_dsk(files)
+    assert len(image) == 737280 and image[:3] == b"\xeb\xfe\x90"
+    # the boot code reads its messages and FCB where the MSX loads it, at 0xC000
+    assert image[0x79:0x83] == b"Boot error" and image[0x9F:0xAB] == b"\0MSXDOS  SYS"
+    assert image[DATA_START + 15 : DATA_START + SECTOR_SIZE] == bytes(SECTOR_SIZE - 15)
+    assert image[DATA_START + SECTOR_SIZE : DATA_START + CLUSTER_SIZE] == (
+        bytes([FREE_FILLER]) * SECTOR_SIZE
+    )
+    assert image[-1] == FREE_FILLER
+    assert image[SECTOR_SIZE : SECTOR_SIZE + 3] == bytes([MEDIA, 0xFF, 0xFF])
+    assert image[SECTOR_SIZE : ROOT_START - FAT_SECTORS * SECTOR_SIZE] == (
+        image[ROOT_START - FAT_SECTORS * SECTOR_SIZE : ROOT_START]
+    )
+    listing = list_dsk(image)
+    assert [(name, size, cluster) for name, size, cluster, _ in listing] == [
+        ("AUTOEXEC.BAS", 15, 2),
+        ("A.ASC", 1024, 3),
+        ("EMPTY", 0, 0),
+        ("BIG.BIN", 5000, 4),
+    ]
+    fat = _unpack_fat(image)
+    assert fat[:10] == [0xFF9, END_OF_CHAIN, END_OF_CHAIN, END_OF_CHAIN, 5, 6, 7, 8, 0xFFF, 0]
+    for (_, data), (_, size, cluster, _) in zip(files, listing):
+        assert read_file(image, size, cluster) == data
+    # a fragmented chain, as MSX-DOS leaves them
+    fragmented = bytearray(image)
+    fat[4:9] = [8, 6, 7, END_OF_CHAIN, 5]
+    fat_bytes = _pack_fat(fat)
+    fragmented[SECTOR_SIZE : SECTOR_SIZE + len(fat_bytes)] = fat_bytes
+    big = files[3][1]
+    expected = big[:1024] + big[4096:] + bytes(120) + big[1024:4096]
+    assert read_file(bytes(fragmented), 5000, 4) == expected[:5000]
+    for bad in ("toolongname.asc", "a.long", "two words"):
+        try:
+            build_dsk([(bad, b"")])
+            assert False, bad
+        except ValueError:
+            pass
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Build, list or extract MSX-DOS 720K .DSK images."
+    )
+    parser.add_argument("-o", "--output", metavar="output.dsk")
+    parser.add_argument("--list", action="store_true", help="list the files in input.dsk")
+    parser.add_argument(
+        "--extract", metavar="DIRECTORY", help="copy the files in input.dsk into DIRECTORY"
+    )
+    parser.add_argument("inputs", metavar="input", nargs="+")
+    args = parser.parse_args()
+    smoke_test_dskfile()
+    if args.list or args.extract:
+        if len(args.inputs) != 1 or args.output:
+            parser.error("--list and --extract take a single input.dsk")
+        with open(args.inputs[0], "rb") as f:
+            image = f.read()
+        if args.extract:
+            extract_dsk(image, args.extract)
+        for filename, size, cluster, attributes in list_dsk(image):
+            print(f"{filename:12} {size:8} bytes, cluster {cluster}")
+    elif args.output:
+        write_dsk(args.output, args.inputs)
+    else:
+        parser.error("-o, --list or --extract is needed")
@@ -0,0 +1,365 @@
+#!/usr/bin/env python3
+
+"""
+FSK cassette tape modulation and demodulation shared by the MSX
+(cas2wav.py, wav2cas.py) and PC-6001 (p6tape.py) tape tools
+
+usage: python3 fsktape.py
+
+(running it performs a quick self-test)
+
+Both machines record a 0 bit as one cycle at the baud rate and a 1 bit
+as two cycles at twice that, each byte as a frame of a 0 start bit, 8
+data bits least significant first and some 1 stop bits (two on MSX,
+three on the PC-6001), and each block after a leader (pilot tone) of
+1s.
+
+`PhaseModulator` synthesizes runs of bits with each sample looked up by
+its phase, so bit cells are exactly `sample_rate / baud` samples long
+on average and rates such as 44100/2400 do not drift.
+
+`decode_wav` reads a recording a block at a time. Its zero crossings
+are found with linear interpolation between samples, with hysteresis
+relative to the level of the signal over the whole recording (so hiss
+in gaps and silence does not make half-cycles, whatever the block size),
+each half-cycle is classified as short, long or a gap, runs of them
+become runs of bits (four short half-cycles for a 1, two long ones for
+a 0), long runs of 1s are leaders, and the bits between them are
+checked as frames, all vectorized with numpy. Frames that do not look
+right are reported as framing errors, and decoding resumes at the next
+0 bit; 1s between frames are an idle line.
+"""
+
+import math, wave
+
+import numpy as np
+
+BAUD = 1200
+BLOCK_FRAMES = 1 << 20  # WAV frames read at a time
+LEADER_BITS = 100  # shorter runs of 1s are data
+HYSTERESIS = 0.3  # relative to the signal level
+LEVEL_QUANTILE = 0.99  # of the sample magnitudes, taken as the signal level
+LEVEL_FLOOR = 0.01  # the lowest signal level, relative to full scale
+
+# the half-bit units of a 0 bit (the first and second halves of its
+# cycle) and a 1 bit (two whole cycles at twice the frequency)
+_UNIT_KINDS = np.array([[1, 2], [0, 0]], dtype=np.uint8)
+
+
+def frame_bits(stop_bits):
+    """
+    return the frame of each byte value: a start bit, the 8 data bits least significant first, and `stop_bits` stop bits
+    """
+    return np.array(
+        [
+            [0, *((byte >> i) & 1 for i in range(8)), *[1] * stop_bits]
+            for byte in range(256)
+        ],
+        dtype=np.uint8,
+    )
+
+
+class PhaseModulator:
+    """
+    the samples of one continuous run of bits at `baud`, a piece at a time
+
+    The run is counted in half-bit units, unit n starting at `n * sample_rate / (2 * baud)` samples, and sample t falls at the phase `t * 2 * baud % sample_rate` of its unit, which is a multiple of the gcd of the two rates, so the samples are looked up in one table per kind of unit: a whole cycle at twice `baud` (half a 1 bit, or a leader cycle), or the first or second half of a 0 bit. A negative `amplitude` inverts the wave.
+    """
+
+    __slots__ = ("sample_rate", "baud", "units", "_step", "_table")
+
+    def __init__(self, sample_rate, baud, amplitude):
+        self.sample_rate = sample_rate
+        self.baud = baud
+        self.units = 0
+        self._step = math.gcd(sample_rate, 2 * baud)
+        fraction = np.arange(0, sample_rate, self._step) / sample_rate
+        phases = np.stack([2 * fraction, fraction, 1 + fraction]) * math.pi
+        self._table = (amplitude * np.sin(phases)).astype("<i2")
+
+    def _samples(self, kinds):
+        # the samples from the start of the next unit to the end of `kinds`
+        units_per_second = 2 * self.baud
+        first = -(-self.units * self.sample_rate // units_per_second)
+        self.units += len(kinds)
+        stop = -(-self.units * self.sample_rate // units_per_second)
+        position = np.arange(first, stop, dtype=np.int64) * units_per_second
+        unit = position // self.sample_rate - (self.units - len(kinds))
+        return self._table[kinds[unit], position % self.sample_rate // self._step]
+
+    def leader(self, cycles):
+        """
+        return the samples for `cycles` leader cycles (half a 1 bit each)
+        """
+        return self._samples(np.zeros(cycles, dtype=np.uint8))
+
+    def bits(self, bits):
+        """
+        return the samples for the bit array `bits`, e.g. `frame_bits(...)[byte values]`
+        """
+        return self._samples(_UNIT_KINDS[bits.reshape(-1)].reshape(-1))
+
+    def ends_on_sample(self):
+        """
+        return whether the run so far ends exactly on a sample (which then belongs to whatever follows)
+        """
+        return self.units * self.sample_rate % (2 * self.baud) == 0
+
+
+def read_samples(wav_filename, block_frames=BLOCK_FRAMES):
+    """
+    yield the sample rate of the WAV file `wav_filename`, then its samples (the channels mixed) as float arrays a block at a time
+    """
+    with wave.open(str(wav_filename), "rb") as wav_file:
+        channels, width = wav_file.getnchannels(), wav_file.getsampwidth()
+        yield wav_file.getframerate()
+        while frames := wav_file.readframes(block_frames):
+            if width == 1:
+                samples = np.frombuffer(frames, dtype=np.uint8).astype(np.int32) - 128
+            elif width == 3:
+                raw = np.frombuffer(frames, dtype=np.uint8).reshape(-1, 3)
+                samples = (raw.astype(np.int32) << [8, 16, 24]).sum(1) >> 8
+            else:
+                samples = np.frombuffer(frames, dtype=f"<i{width}")
+            yield samples.reshape(-1, channels).astype(float).sum(1)
+
+
+def signal_level(wav_filename, quantile=LEVEL_QUANTILE, floor=LEVEL_FLOOR):
+    """
+    return the level of the signal in the WAV file `wav_filename`, in the units of `read_samples`: the `quantile` of the magnitudes of all its samples (each block less its DC offset), but at least `floor` times full scale
+    """
+    with wave.open(str(wav_filename), "rb") as wav_file:
+        full_scale = wav_file.getnchannels() << 8 * wav_file.getsampwidth() - 1
+    # a histogram of the magnitudes, so the whole recording is never held
+    edges = np.linspace(0, full_scale, 4097)
+    counts = np.zeros(len(edges) - 1, dtype=np.int64)
+    blocks = read_samples(wav_filename)
+    next(blocks)
+    for block in blocks:
+        counts += np.histogram(np.abs(block - block.mean()), edges)[0]
+    if not counts.sum():
+        return floor * full_scale
+    level = edges[1 + np.searchsorted(np.cumsum(counts), quantile * counts.sum())]
+    return max(float(level), floor * full_scale)
+
+
+def zero_crossings(blocks, threshold):
+    """
+    return the (fractional) sample offsets where the signal in the sample arrays `blocks` changes sign
+
+    Only crossings after which the signal (in each block less its DC offset) gets beyond `threshold` on the other side count, so noise around zero does not make extra half-cycles.
+    """
+    crossings, offset, state, carry = [], 0, 0, np.zeros(0)
+    for block in blocks:
+        block = block - block.mean()
+        # carry the samples since the last sign change over, so crossings
+        # between blocks are found
+        samples = np.concatenate([carry, block])
+        base = offset - len(carry)
+        offset += len(block)
+        marks = (samples > threshold).astype(np.int8) - (samples < -threshold)
+        marks[: len(carry) and 1] = 0  # the last sample before the sign change
+        beyond = np.flatnonzero(marks)
+        positive = samples >= 0
+        changes = np.flatnonzero(positive[1:] != positive[:-1])
+        carry = samples[changes[-1] :] if len(changes) else samples[-1:]
+        if len(carry) > len(block):
+            carry = samples[-1:]
+        if not len(beyond):
+            continue
+        states = marks[beyond]
+        flips = beyond[np.diff(states, prepend=state or states[0]) != 0]
+        state = states[-1]
+        # each crossing is the last sign change before the threshold was reached
+        k = changes[np.maximum(np.searchsorted(changes, flips) - 1, 0)]
+        k = np.where(k < flips, k, flips - 1)
+        a, b = samples[k], samples[k + 1]
+        fraction = np.divide(a, a - b, out=np.zeros_like(a), where=a != b)
+        crossings.append(base + k + fraction)
+    return np.concatenate(crossings) if crossings else np.zeros(0)
+
+
+def short_half_cycle(halves):
+    """
+    return the length of the short (1-bit and leader) half-cycles among the half-cycle lengths `halves`
+    """
+    m = np.median(halves)
+    # the median is a short half-cycle unless 0s dominate the recording
+    shorter = halves[(halves > 0.35 * m) & (halves < 0.65 * m)]
+    if len(shorter) > 0.05 * len(halves):
+        return float(np.median(shorter))
+    return float(np.median(halves[(halves > 0.7 * m) & (halves < 1.3 * m)]))
+
+
+def demodulate(crossings, short):
+    """
+    return the bits between the zero crossings `crossings` whose short half-cycles are `short` samples long, and the crossing where each bit starts; gaps are returned as bit value 2
+    """
+    halves = np.diff(crossings)
+    # 0: short, 1: long, 2: gap
+    kinds = (halves > 1.5 * short).astype(np.int8) + (halves > 6 * short)
+    if not len(kinds):
+        return np.zeros(0, dtype=np.int8), np.zeros(0, dtype=np.int64)
+    starts = np.flatnonzero(np.diff(kinds, prepend=-1))
+    lengths = np.diff(starts, append=len(kinds))
+    run_kinds = kinds[starts]
+    # four short half-cycles make a 1, two long ones a 0
+    halves_per_bit = np.array([4, 2, 1])[run_kinds]
+    counts = np.maximum(np.rint(lengths / halves_per_bit).astype(np.int64), 1)
+    counts[run_kinds == 2] = 1
+    bits = np.repeat(np.array([1, 0, 2], dtype=np.int8)[run_kinds], counts)
+    within = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    bit_starts = np.repeat(starts, counts) + within * np.repeat(halves_per_bit, counts)
+    return bits, bit_starts
+
+
+def split_blocks(bits, stop_bits, leader_bits=LEADER_BITS):
+    """
+    yield `(has leader, first bit, end bit)` for each block of the bit array `bits` of frames with `stop_bits` stop bits: the bits after a leader (or the start of the tape) up to the next leader or gap
+    """
+    ones = np.concatenate([[0], (bits == 1).view(np.int8), [0]])
+    runs = np.flatnonzero(np.diff(ones)).reshape(-1, 2)
+    leaders = runs[runs[:, 1] - runs[:, 0] >= leader_bits]
+    # block boundaries: leaders (up to the data and stop bits of the
+    # frame before may be the first 1s of one) and gaps
+    boundaries = [(start, stop, True) for start, stop in leaders]
+    boundaries += [(i, i + 1, False) for i in np.flatnonzero(bits == 2)]
+    boundaries.sort()
+    first, has_leader = 0, False
+    for start, stop, leader in boundaries:
+        end = min(start + 8 + stop_bits, stop) if leader else start
+        if end > first or has_leader:
+            yield has_leader, first, end
+        first, has_leader = stop, leader
+    if len(bits) > first or has_leader:
+        yield has_leader, first, len(bits)
+
+
+def decode_frames(bits, first, end, stop_bits):
+    """
+    return the bytes of the frames with `stop_bits` stop bits in `bits[first:end]`, and the bit offsets of framing errors
+    """
+    size = 9 + stop_bits
+    decoded, errors = [], []
+    weights = 1 << np.arange(8)
+    p = first
+    while p < end:
+        # skip idle 1s to the next start bit
+        zeros = np.flatnonzero(bits[p:end] == 0)
+        if not len(zeros):
+            break
+        p += zeros[0]
+        n = (end - p) // size
+        if not n:
+            # a start bit with no room for the rest of its frame
+            errors.append(p)
+            break
+        frames = bits[p : p + size * n].reshape(n, size)
+        valid = (frames[:, 0] == 0) & (frames[:, 9:] == 1).all(1)
+        valid &= (frames[:, 1:9] < 2).all(1)
+        good = n if valid.all() else int(np.argmin(valid))
+        decoded.append((frames[:good, 1:9] @ weights).astype(np.uint8).tobytes())
+        p += size * good
+        if good < n and bits[p] != 1:
+            errors.append(p)
+            p += 1
+        # otherwise the line went idle between frames
+    return b"".join(decoded), errors
+
+
+def decode_wav(wav_filename, stop_bits, baud=None, leader_bits=LEADER_BITS):
+    """
+    decode the recording `wav_filename` of frames with `stop_bits` stop bits at `baud` (by default worked out from the recording); return the baud rate and `(has leader, bytes, sample offsets of framing errors)` for each block, a block with no leader that holds anything counting as an error at its start
+    """
+    threshold = HYSTERESIS * signal_level(wav_filename)
+    blocks = read_samples(wav_filename)
+    sample_rate = next(blocks)
+    crossings = zero_crossings(blocks, threshold)
+    halves = np.diff(crossings)
+    if baud:
+        short = sample_rate / baud / 4
+    elif len(halves):
+        short = short_half_cycle(halves)
+        baud = round(sample_rate / short / 4 / 600) * 600 or BAUD
+    else:
+        short = sample_rate / BAUD / 4
+        baud = BAUD
+    bits, bit_starts = demodulate(crossings, short)
+    decoded = []
+    for has_leader, first, end in split_blocks(bits, stop_bits, leader_bits):
+        data, framing_errors = decode_frames(bits, first, end, stop_bits)
+        errors = [int(crossings[bit_starts[p]]) for p in framing_errors]
+        if not has_leader and (data or framing_errors):
+            errors.insert(0, int(crossings[bit_starts[first]]))
+        decoded.append((has_leader, data, errors))
+    return baud, decoded
+
+
+def smoke_test_fsktape():
+    import os, random, tempfile
+
+    # idle 1s between frames are not framing errors, a broken stop bit is
+    for stop_bits in (2, 3):
+        frames = frame_bits(stop_bits)[np.frombuffer(b"HELLO", dtype=np.uint8)]
+        bits = np.concatenate([frames, np.ones((5, 1), dtype=np.uint8)], 1).ravel()
+        assert decode_frames(bits, 0, len(bits), stop_bits) == (b"HELLO", [])
+        bits[1 + 10 + stop_bits + 9] = 0
+        assert decode_frames(bits, 0, len(bits), stop_bits)[1][0] == 10 + stop_bits
+    # a 0 bit is one cycle, a 1 bit two, and runs continue across pieces
+    modulator = PhaseModulator(16, 2, 100)
+    samples = np.concatenate([modulator.bits(np.array([0, 1])), modulator.leader(1)])
+    assert samples.tolist() == [0, 70, 100, 70, 0, -70, -100, -70] + [0, 100, 0, -100] * 3
+    assert modulator.ends_on_sample()
+    modulator = PhaseModulator(3, 1, 100)
+    assert len(modulator.leader(1)) == 2 and not modulator.ends_on_sample()
+    data = random.Random(1200).randbytes(300)
+    for sample_rate, baud, stop_bits in ((22050, 1200, 2), (44100, 2400, 3)):
+        modulator = PhaseModulator(sample_rate, baud, -32767)
+        pieces = [np.zeros(1000, dtype="<i2"), modulator.leader(2 * 500)]
+        pieces += [modulator.bits(frame_bits(stop_bits)[list(data[:16])])]
+        pieces += [modulator.bits(np.ones(2, dtype=np.uint8)), modulator.leader(400)]
+        pieces += [modulator.bits(frame_bits(stop_bits)[list(data[16:])])]
+        pieces += [modulator.leader(2), np.zeros(1000, dtype="<i2")]
+        with tempfile.TemporaryDirectory() as tmp:
+            wav_filename = os.path.join(tmp, "t.wav")
+            with wave.open(wav_filename, "wb") as wav_file:
+                wav_file.setnchannels(1)
+                wav_file.setsampwidth(2)
+                wav_file.setframerate(sample_rate)
+                wav_file.writeframes(np.concatenate(pieces).tobytes())
+            found, blocks = decode_wav(wav_filename, stop_bits)
+        # the leading silence is an empty block, with no leader
+        assert found == baud and blocks[0] == (False, b"", [])
+        assert blocks[1:] == [(True, data[:16], []), (True, data[16:], [])]
+    # hiss about 27 dB down, filling long gaps, makes no half-cycles of
+    # its own, whatever the block size
+    rng = np.random.default_rng(1200)
+    modulator = PhaseModulator(22050, 1200, 22936)
+    pieces = [np.zeros(5 * 22050), modulator.leader(2400)]
+    pieces += [modulator.bits(frame_bits(2)[list(data)]), np.zeros(10 * 22050)]
+    pieces += [modulator.leader(2400), modulator.bits(frame_bits(2)[list(data)])]
+    pieces += [np.zeros(10 * 22050)]
+    samples = np.concatenate(pieces)
+    samples = np.rint(samples + rng.normal(0, 1000, len(samples))).astype("<i2")
+    with tempfile.TemporaryDirectory() as tmp:
+        wav_filename = os.path.join(tmp, "t.wav")
+        with wave.open(wav_filename, "wb") as wav_file:
+            wav_file.setnchannels(1)
+            wav_file.setsampwidth(2)
+            wav_file.setframerate(22050)
+            wav_file.writeframes(samples.tobytes())
+        _, blocks = decode_wav(wav_filename, 2)
+        assert [block for block in blocks if block[1] or block[2]] == [
+            (True, data, []),
+            (True, data, []),
+        ]
+        threshold = HYSTERESIS * signal_level(wav_filename)
+        found = [
+            zero_crossings(list(read_samples(wav_filename, size))[1:], threshold)
+            for size in (1 << 16, 1 << 20)
+        ]
+        assert len(found[0]) == len(found[1])
+
+
+if __name__ == "__main__":
+    smoke_test_fsktape()
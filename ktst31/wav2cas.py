@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+
+"""
+MSX tape recording (.WAV) to .CAS decoder, the reverse of cas2wav.py
+
+usage: python3 wav2cas.py [ --baud BAUD; default from the recording ] [ --align ] input.wav output.cas
+
+The recording may be mono or stereo (the channels are mixed), 8, 16,
+24 or 32 bits per sample, at any sample rate, and is read a block at a
+time and demodulated by fsktape.py: each leader starts a block in the
+.CAS output with `CAS_HEADER_MARKER`, and the bits in between are split
+into 11-bit frames (a 0 start bit, 8 data bits least significant first
+and two 1 stop bits).
+
+Frames that do not look like that are reported as framing errors with
+the sample offset where they start, and decoding resumes at the next 0
+bit. With `--align` each block is padded with zeros to a multiple of 8
+bytes, as emulators expect of .CAS files made from real tapes; tapes
+made by cas2wav.py decode byte-exact without it.
+"""
+
+import argparse, sys
+
+from cas2wav import CAS_HEADER_MARKER
+from fsktape import decode_wav
+
+STOP_BITS = 2
+
+
+def wav_to_cas(wav_filename, cas_filename, baud=None, align=False):
+    """
+    decode the MSX tape recording `wav_filename` to `cas_filename`; return the sample offsets of framing errors
+    """
+    _, blocks = decode_wav(wav_filename, STOP_BITS, baud)
+    cas, errors = [], []
+    for has_leader, data, block_errors in blocks:
+        if has_leader:
+            cas.append(CAS_HEADER_MARKER)
+        cas.append(data)
+        if align and len(data) % 8:
+            cas.append(bytes(8 - len(data) % 8))
+        errors += block_errors
+    errors = sorted(set(errors))
+    with open(cas_filename, "wb") as f:
+        f.write(b"".join(cas))
+    return errors
+
+
+def smoke_test_wav2cas():
+    import os, random, tempfile
+
+    import cas2wav
+
+    data = bytes([0, 1, 0xFF, 0x80, 0x7F]) + random.Random(1200).randbytes(300)
+    cas_data = CAS_HEADER_MARKER + data[:16] + CAS_HEADER_MARKER + data[16:]
+    variants = {
+        "a.wav": {},
+        "b.wav": {"sample_rate": 44100, "baud_rate": 2400, "channels": 2},
+        "c.wav": {"sample_rate": 44100, "baud_rate": 2400, "phase_continuous": True},
+        "d.wav": {"sample_rate": 8000, "peak_amplitude": 0.1, "phase_continuous": True},
+    }
+    with tempfile.TemporaryDirectory() as tmp:
+        cas_filename = os.path.join(tmp, "t.cas")
+        with open(cas_filename, "wb") as f:
+            f.write(cas_data)
+        wavs = {os.path.join(tmp, name): v for name, v in variants.items()}
+        cas2wav.cas_to_wavs(cas_filename, wavs)
+        for wav_filename in wavs:
+            out = os.path.join(tmp, "out.cas")
+            assert wav_to_cas(wav_filename, out) == [], wav_filename
+            with open(out, "rb") as f:
+                assert f.read() == cas_data, wav_filename
+        assert wav_to_cas(os.path.join(tmp, "a.wav"), out, align=True) == []
+        with open(out, "rb") as f:
+            assert f.read() == cas_data + bytes(8 - len(data[16:]) % 8)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert an MSX tape .WAV to .CAS.")
+    parser.add_argument("wav", metavar="input.wav")
+    parser.add_argument("cas", metavar="output.cas")
+    parser.add_argument(
+        "--baud", type=int, help="1200 or 2400 (default: worked out from the recording)"
+    )
+    parser.add_argument(
+        "--align", action="store_true", help="pad blocks to multiples of 8 bytes"
+    )
+    args = parser.parse_args()
+    smoke_test_wav2cas()
+    errors = wav_to_cas(args.wav, args.cas, args.baud, args.align)
+    for offset in errors:
+        print(f"{args.wav}: framing error at sample {offset}", file=sys.stderr)
+    if errors:
+        sys.exit(1)
@@ -8,150 +8,31 @@ quick-and-dirty visualizer for font data from:
 
 Note: the visualizer expects MSX Kanji ROM data in I/O port order. You can reorder betweeen I/O port order and IC order using `reorder_msx_rom.py`.
 
+With a 256 KiB Level 2 ROM (`KANJI.ROM`, or `KANJI1.ROM` and `KANJI2.ROM`), Level 2 (ku 48 to 84) is laid out in the same JIS grid as Level 1, and the vendor extensions filling the rest of the ROM after 84-06 (up to ku 90 ten 63) are highlighted in green.
+
 Even without a Kanji ROM, there are 18 specific Kanji available in every Japanese MSX BIOS at 8x8 and (truncated) 6x8 sizes: `月火水木金土日年円時分秒百千万大中小`
 """
 
 
-from PIL import Image, ImageDraw
+import numpy as np
+
+from charsets import (
+    ASCII_CONTROLS,
+    MINIMAL_CONTROLS,
+    MSXJP_8BIT_ALTCHARSET,
+    MSXJP_8BIT_CHARSET,
+    NO_CONTROLS,
+    decode_msxjp_8bit_charset,
+    encode_msxjp_8bit_charset,
+)
+from kanjisheet import GlyphBlitter, glyph_bit_planes, new_sheet, paint_glyphs
+from oldjis import missing_from_old_jis
+from romsource import Layout, map_rom
 
-import codecs
-import gzip
 import sys
 import unicodedata
 
 
-# 8-bit/single-byte character encoding scheme
-
-NO_CONTROLS = b""
-MINIMAL_CONTROLS = b"\0\r\n\x1a\x7f"
-ASCII_CONTROLS = bytes(range(0x20)) + b"\x7f"
-
-# i am sure this is not the best way to solve this. this mapping
-# should work OK for a Japanese MSX. it does not handle the alternate
-# character set shift sequences well. it also does not handle
-# fullwidth Kanji! the hiragana and kanji here should all be
-# half-width ones, but Unicode is missing those so we live with
-# fullwidth instead. the arrows and control pictures shown here in the
-# first row are actually control characters and are not graphically
-# displayable on an MSX.
-MSXJP_8BIT_CHARSET = (
-    "␀␁␂␃␄␅␆␇␈␉␊␋␌␍␎␏␐␑␒␓␔␕␖␗␘␙␚␛￫￩￪￬"
-    " !\"#$%&'()*+,-./0123456789:;<=>?"
-    "@ABCDEFGHIJKLMNOPQRSTUVWXYZ[¥]^_"
-    "`abcdefghijklmnopqrstuvwxyz{¦}~␡"
-    "♠♥♦♣￮•をぁぃぅぇぉゃゅょっ\uf8f4あいうえおかきくけこさしすせそ"
-    "\uf8f0｡｢｣､･ｦｧｨｩｪｫｬｭｮｯｰｱｲｳｴｵｶｷｸｹｺｻｼｽｾｿ"
-    "ﾀﾁﾂﾃﾄﾅﾆﾇﾈﾉﾊﾋﾌﾍﾎﾏﾐﾑﾒﾓﾔﾕﾖﾗﾘﾙﾚﾛﾜﾝﾞﾟ"
-    "たちつてとなにぬねのはひふへほまみむめもやゆよらりるれろわん\uf8f2\uf8f3"
-)
-assert len(MSXJP_8BIT_CHARSET) == 256
-MSXJP_8BIT_ALTCHARSET = "\uf8f1月火水木金土日年円時分秒百千万" "π┴┬┤├┼│─┌┐└┘╳大中小"
-assert len(MSXJP_8BIT_ALTCHARSET) == 32
-MSXJP_8BIT_CHARMAP = {MSXJP_8BIT_CHARSET[i]: bytes([i]) for i in range(256)} | {
-    MSXJP_8BIT_ALTCHARSET[i]: bytes([0x01, i + 0x40]) for i in range(32)
-}
-MSXJP_8BIT_CHARMAP_COMPAT = {
-    unicodedata.normalize("NFKD", key): value
-    for key, value in MSXJP_8BIT_CHARMAP.items()
-    if unicodedata.normalize("NFKD", key) != key
-} | {
-    "\N{KATAKANA-HIRAGANA VOICED SOUND MARK}": MSXJP_8BIT_CHARMAP[
-        "\N{HALFWIDTH KATAKANA VOICED SOUND MARK}"
-    ],
-    "\N{KATAKANA-HIRAGANA SEMI-VOICED SOUND MARK}": MSXJP_8BIT_CHARMAP[
-        "\N{HALFWIDTH KATAKANA SEMI-VOICED SOUND MARK}"
-    ],
-    "\N{KATAKANA-HIRAGANA PROLONGED SOUND MARK}": MSXJP_8BIT_CHARMAP[
-        "\N{HALFWIDTH KATAKANA-HIRAGANA PROLONGED SOUND MARK}"
-    ],
-}
-
-
-def encode_msxjp_8bit_charset(s, try_harder=True):
-    s = "".join(
-        [
-            (
-                unicodedata.normalize("NFKD", s[i : i + 1])
-                if (
-                    unicodedata.name(s[i : i + 1], "?")
-                    .lower()
-                    .startswith("hiragana letter")
-                    or unicodedata.name(s[i : i + 1], "?")
-                    .lower()
-                    .startswith("katakana letter")
-                )
-                else (
-                    "~"
-                    if s[i : i + 1] == "\N{WAVE DASH}"
-                    else "-" if s[i : i + 1] == "\N{HYPHEN}" else s[i : i + 1]
-                )
-            )
-            for i in range(len(s))
-        ]
-    )
-    byts, chars_consumed, num_chars = b"", 0, len(s)
-    while chars_consumed < num_chars:
-        ch = s[chars_consumed]
-        byt = MSXJP_8BIT_CHARMAP.get(ch, MSXJP_8BIT_CHARMAP_COMPAT.get(ch)) or (
-            bytes([ord(ch)]) if ord(ch) <= 0x7F else None
-        )
-        if byt is None and try_harder:
-            cch = unicodedata.normalize("NFKD", ch)
-            byt = MSXJP_8BIT_CHARMAP.get(cch, MSXJP_8BIT_CHARMAP_COMPAT.get(cch)) or (
-                bytes([ord(cch)]) if len(cch) == 1 and ord(cch) <= 0x7F else None
-            )
-        if byt is None and try_harder:
-            cch = unicodedata.normalize("NFC", ch)
-            byt = MSXJP_8BIT_CHARMAP.get(cch, MSXJP_8BIT_CHARMAP_COMPAT.get(cch)) or (
-                bytes([ord(cch)]) if len(cch) == 1 and ord(cch) <= 0x7F else None
-            )
-        if byt is None:
-            raise UnicodeEncodeError(
-                "msxjp-8bit",
-                s,
-                chars_consumed,
-                chars_consumed + 1,
-                f"no mapping for U+{ord(ch):04X} {unicodedata.name(ch, repr(ch))}",
-            )
-        byts += byt
-        chars_consumed += 1
-    return byts
-
-
-def decode_msxjp_8bit_charset(byts, preserve=MINIMAL_CONTROLS):
-    s, bytes_consumed, num_bytes = "", 0, len(byts)
-    while bytes_consumed < num_bytes:
-        byt = byts[bytes_consumed]
-        if (
-            bytes_consumed > 0
-            and byts[bytes_consumed - 1] == 0x01
-            and byt >= 0x40
-            and byt <= 0x5F
-        ):
-            s = s[: -len(MSXJP_8BIT_CHARSET[0x01])] + MSXJP_8BIT_ALTCHARSET[byt - 0x40]
-        elif byt in preserve:
-            s += chr(byt)
-        else:
-            s += MSXJP_8BIT_CHARSET[byt]
-        if (
-            len(s) > 1
-            and s[-1:]
-            in "\N{HALFWIDTH KATAKANA VOICED SOUND MARK}\N{HALFWIDTH KATAKANA SEMI-VOICED SOUND MARK}"
-            and unicodedata.name(s[-2:-1], "?").lower().startswith("hiragana letter")
-        ):
-            s = s[:-2] + unicodedata.normalize("NFKC", s[-2:])
-        bytes_consumed += 1
-    round_trip_byts = encode_msxjp_8bit_charset(s)
-    assert byts == round_trip_byts, UnicodeDecodeError(
-        "msxjp-8bit",
-        byts,
-        0,
-        num_bytes,
-        f"round-trip failure for {repr(s)} with preserve={repr(preserve)}; result:\n {repr(byts)}, got:\n {repr(round_trip_byts)}",
-    )
-    return s
-
-
 def smoke_test_msxjp_8bit_charset():
     assert decode_msxjp_8bit_charset(b"") == ""
     assert encode_msxjp_8bit_charset("") == b""
@@ -358,12 +239,22 @@ def smoke_test_msxjp_8bit_charset():
 smoke_test_msxjp_8bit_charset()
 
 
+# byte o of a 16x16 cell (two bytes per row) is byte GLYPH_ORDER[o] of
+# the glyph, which is stored as 8x8 quadrants in the order
+# top left, top right, bottom left, bottom right
+GLYPH_ORDER = np.array(
+    [q + i + half for q in (0, 16) for i in range(8) for half in (0, 8)]
+)
+
+
+# the last character of JIS X 0208 (90JIS); 256 KiB Level 2 ROMs carry
+# on with vendor extensions from the next cell up to ku 90 ten 63
+LEVEL2_LAST_KUTEN = (84, 6)
+
+
 def shuffle_glyph(glyph):
     assert len(glyph) == 32
-    return b"".join(
-        [glyph[i : 1 + i] + glyph[8 + i : 9 + i] for i in range(8)]
-        + [glyph[16 + i : 17 + i] + glyph[24 + i : 25 + i] for i in range(8)]
-    )
+    return np.frombuffer(glyph, dtype=np.uint8)[GLYPH_ORDER].tobytes()
 
 
 def shuffle_bios(b):
@@ -384,34 +275,31 @@ def shuffle_bios(b):
     )
 
 
-def shuffle_kanji_cc(ch):
+def shuffle_kanji_cc(count):
+    """return the glyph index in the ROM for each of `count` glyphs"""
     # TODO: possibly add mappings from more recent SJIS to equivalent
     # MSX extensions to 78JIS?
-    return ch
+    return np.arange(count)
 
 
-def shuffle_kanji(k):
+def shuffle_kanji(k, cc=None):
+    """the glyphs in `k` as 16x16 cells, in the order of the glyph index array `cc` (default `shuffle_kanji_cc`)"""
     assert len(k) % 32 == 0
-    return b"".join(
-        shuffle_glyph(
-            b"".join(bytes([k[32 * shuffle_kanji_cc(ch) + o]]) for o in range(32))
-        )
-        for ch in range(len(k) // 32)
-    )
-
-
-def msxbioskanjiviz(bios, kanji_roms, bioskanji_png):
-    """Given an input file named by `bios` containing MSX BIOS+BASIC and one or two named by `kanji_roms` containing Kanji font ROM data in I/O readout order, produce a visualization and save it as a PNG in the output file named by `bioskanji_png`."""
-    b = open(bios, "rb").read()
-    b = shuffle_bios(b)
-    xb = b"\0" * len(b)
-    discontinuity = 512
-    b += b"\0" * (discontinuity * 32 - len(b))
-    xb += b"\xff" * (len(b) - len(xb))
-    assert len(b) == discontinuity * 32
+    glyphs = np.frombuffer(k, dtype=np.uint8).reshape(-1, 32)
+    if cc is None:
+        cc = shuffle_kanji_cc(len(glyphs))
+    return glyphs[np.asarray(cc)[:, None], GLYPH_ORDER].tobytes()
+
+
+def msxbioskanji_layout(bios, kanji_roms, discontinuity=512):
+    """Given an input file named by `bios` (or its already loaded data) containing MSX BIOS+BASIC and zero, one or two named by `kanji_roms` containing Kanji font ROM data in I/O readout order, return `(b, xb)`: the glyph data laid out as 16x16 cells, the shuffled BIOS font first and the Kanji ROM in JIS order from cell `discontinuity` (with Level 2, if present, following on from ku 48), and the matching mask data."""
+    if not isinstance(bios, (bytes, bytearray, memoryview)):
+        bios = map_rom(bios)
+    bios_font = shuffle_bios(bios)
+    assert len(bios_font) <= 256 * 32
     k = b""
     if kanji_roms:
-        k = b"".join([open(kanji_rom, "rb").read() for kanji_rom in kanji_roms])
+        k = b"".join([map_rom(kanji_rom) for kanji_rom in kanji_roms])
         assert len(k) in {128 * 1024, 256 * 1024}
         # See https://x.com/bugnaga/status/1698203551204524062 for info on how MSX BIOS decides whether a kanji ROM works
         assert k[0x80 * 32 : 8 + 0x80 * 32] == bytes(
@@ -422,44 +310,40 @@ def msxbioskanjiviz(bios, kanji_roms, bioskanji_png):
                 sum(i for i in k[0x1D7E * 32 : 8 + 0x1D7E * 32]) & 0xFF == 0x95
             )  # MSX Level 2 kanji validity check
         k = shuffle_kanji(k)
-        b = (
-            b[: 256 * 32]
-            + b"\0" * 32 * 32
-            + k[: 96 * 32]
-            + b"\0" * 32 * 32
-            + k[9 * 96 * 32 : 10 * 96 * 32]
-            + b[512 * 32 :]
-        )
-        xb = (
-            xb[: 256 * 32]
-            + b"\xff" * 32 * 32
-            + (b"\0\xff" * 4 + b"\0" * 24) * 96
-            + b"\xff" * 32 * 32
-            + (b"\0\xff" * 4 + b"\0" * 24) * 80
+    # the kanji follow the discontinuity, with 32 masked cells inserted before ku 11
+    kanji_size = max(len(k), 32 * discontinuity)
+    gap = discontinuity * 32 + min((11 * 96 - 32) * 32, kanji_size)
+    b = Layout(max(discontinuity * 32 + kanji_size + 32 * 32, 128 * discontinuity))
+    xb = Layout(len(b), 0xFF)
+    b.write(bios_font)
+    xb.fill(0x00, 0, len(bios_font))
+    if kanji_roms:
+        b.write(k[: 96 * 32], (256 + 32) * 32)
+        b.write(k[9 * 96 * 32 : 10 * 96 * 32], (256 + 32 + 96 + 32) * 32)
+        xb.write((b"\0\xff" * 4 + b"\0" * 24) * 96, (256 + 32) * 32)
+        xb.write(
+            (b"\0\xff" * 4 + b"\0" * 24) * 80
             + (b"\0" * 32) * 10
-            + (b"\0\xff" * 4 + b"\0" * 24) * 6
-            + xb[512 * 32 :]
+            + (b"\0\xff" * 4 + b"\0" * 24) * 6,
+            (256 + 32 + 96 + 32) * 32,
         )
-    xk = b"\0" * len(k)
-    k += b"\0" * (32 * discontinuity - len(k))
-    xk += b"\xff" * (len(k) - len(xk))
-    b += k[: (11 * 96 - 32) * 32] + b"\xff" * 32 * 32 + k[(11 * 96 - 32) * 32 :]
-    xb += xk[: (11 * 96 - 32) * 32] + b"\xff" * 32 * 32 + xk[(11 * 96 - 32) * 32 :]
-    b += b"\0" * (128 * discontinuity - len(b))
-    xb += b"\xff" * (len(b) - len(xb))
+    b.write(k[: gap - discontinuity * 32], discontinuity * 32)
+    b.fill(0xFF, gap, gap + 32 * 32)
+    b.write(k[gap - discontinuity * 32 :], gap + 32 * 32)
+    xb.fill(0x00, discontinuity * 32, min(gap, discontinuity * 32 + len(k)))
+    xb.fill(0x00, gap + 32 * 32, discontinuity * 32 + len(k) + 32 * 32)
+    b, xb = b.view(), xb.view()
+    return b, xb
+
+
+def msxbioskanjiviz(bios, kanji_roms, bioskanji_png, indexed=False):
+    """Given an input file named by `bios` containing MSX BIOS+BASIC and one or two named by `kanji_roms` containing Kanji font ROM data in I/O readout order, produce a visualization and save it as a PNG in the output file named by `bioskanji_png`. With `indexed`, the PNG is an 8-bit palette image instead of RGBA."""
+    discontinuity = 512
+    b, xb = msxbioskanji_layout(bios, kanji_roms, discontinuity)
 
     def cvtr(r):
         return 0 * 1 + r + 5 * (r >= 11)
 
-    def rtok(byts):
-        return (
-            byts.decode("EUC-JP", "ignore")
-            .encode("iso2022_jp_1", "ignore")
-            .decode("iso2022_jp_1", "ignore")
-            .encode("EUC-JP")
-            == byts
-        )
-
     def invc(cc):
         if (cc - discontinuity) // 96 == 2 and (cc - discontinuity) % 96 not in range(
             1, 14 + 1
@@ -472,13 +356,8 @@ def msxbioskanjiviz(bios, kanji_roms, bioskanji_png):
         return (
             False
             if (cc < discontinuity)
-            else not rtok(
-                bytes(
-                    [
-                        min(cvtr((cc - discontinuity) // 96), 95) + 0xA0,
-                        (cc - discontinuity) % 96 + 0xA0,
-                    ]
-                )
+            else missing_from_old_jis(
+                min(cvtr((cc - discontinuity) // 96), 95), (cc - discontinuity) % 96
             )
         )
 
@@ -497,9 +376,11 @@ def msxbioskanjiviz(bios, kanji_roms, bioskanji_png):
     w3 = (0, 0, 255)
     k3 = (255, 255, 255)
     w4 = (0, 255, 255)
+    w5 = (0, 255, 127)
+    k5 = (0, 63, 31)
 
-    im = Image.new(
-        "RGBA",
+    palette = [k, w, g, h, v, w1, k1, w2, k2, w3, k3, w4, w5, k5]
+    im, inks = new_sheet(
         (
             max((z + 1) * z, 16) * 16,
             (
@@ -509,8 +390,11 @@ def msxbioskanjiviz(bios, kanji_roms, bioskanji_png):
             * 16
             + 8,
         ),
+        palette,
         g,
+        indexed,
     )
+    k, w, g, h, v, w1, k1, w2, k2, w3, k3, w4, w5, k5 = inks
 
     def kuten_ch(kuten):
         return (
@@ -519,62 +403,38 @@ def msxbioskanjiviz(bios, kanji_roms, bioskanji_png):
             + kuten[1]
         )
 
-    def putkuten_at(dr, kuten, coords, color_pair):
-        x, y = coords
-        fg, bg = color_pair
-        for i in range(256):
-            dr.point(
-                (x + i % 16, y + i // 16),
-                (fg if b[kuten_ch(kuten) * 32 + (i // 8)] & (0x80 >> (i % 8)) else bg),
-            )
+    # a 256 KiB Level 2 ROM runs on past the end of JIS X 0208 into
+    # vendor extensions, which are highlighted
+    vendor_start = kuten_ch(LEVEL2_LAST_KUTEN) + 1
+    level2 = len(xb) > 32 * vendor_start and not xb[32 * vendor_start]
 
-    def putch_at(dr, ch, coords, color_pair, font, scale=1):
+    def putkuten_at(text, kuten, coords, color_pair):
+        text.blit((16, b[kuten_ch(kuten) * 32 :][:32], b""), coords, color_pair)
+
+    def putch_at(text, ch, coords, color_pair, font, scale=1):
         x, y = coords
-        fg, bg = color_pair
         if font in (2, 3):
             byt = ord(ch.encode("SJIS"))
-            for i in range(128):
-                if font == 3 and byt not in range(0xF0, 1 + 0xF9) and i < 4 * 8:
-                    continue
-                dr.point(
-                    (x + i % 8, y + i // 8 - 2 * (font == 3)),
-                    (
-                        fg
-                        if b[256 * 32 + (font & 1) + 32 * byt + 2 * (i // 8)]
-                        & (0x80 >> (i % 8))
-                        else bg
-                    ),
-                )
+            o = 256 * 32 + (font & 1) + 32 * byt
+            skip = b""
+            if font == 3 and byt not in range(0xF0, 1 + 0xF9):
+                skip = b"\xff" * 4 + b"\0" * 12
+            text.blit(
+                (8, b[o : o + 32 : 2], skip), (x, y - 2 * (font == 3)), color_pair
+            )
             return
         ch = encode_msxjp_8bit_charset(ch)
         if len(ch) == 2 and ch[0] == 0x01:
             ch = bytes([ch[1] - 0x40])
-        for i in range(64):
-            if font == 1 and (i % 8) >= 6:
-                continue
-            # The 8x8 character sets are shuffled for display as 16x16 tiles, so undo that
-            rcc = (ord(ch) & 0xE0) | ((ord(ch) & 0x0F) << 1) | ((ord(ch) & 0x10) >> 4)
-            if xb[rcc * 16 + (font & 1) + 256 * 16 * (font >> 1) + 2 * (i // 8)] & (
-                0x80 >> (i % 8)
-            ):
-                continue
-            for yo in range(scale):
-                dr.point(
-                    (x + i % 8, y + scale * (i // 8) + yo),
-                    (
-                        fg
-                        if b[
-                            rcc * 16
-                            + (font & 1)
-                            + 256 * 16 * (font >> 1)
-                            + 2 * (i // 8)
-                        ]
-                        & (0x80 >> (i % 8))
-                        else bg
-                    ),
-                )
-
-    def puts_at(dr, s, coords, color_pair, font=0, scale=1):
+        # The 8x8 character sets are shuffled for display as 16x16 tiles, so undo that
+        rcc = (ord(ch) & 0xE0) | ((ord(ch) & 0x0F) << 1) | ((ord(ch) & 0x10) >> 4)
+        o = rcc * 16 + (font & 1) + 256 * 16 * (font >> 1)
+        skip = xb[o : o + 16 : 2]
+        if font == 1:
+            skip = bytes(byt | 0x03 for byt in skip)
+        text.blit((8, b[o : o + 16 : 2], skip), coords, color_pair, scale)
+
+    def puts_at(text, s, coords, color_pair, font=0, scale=1):
         x, y = coords
         if font != 2:
             s = unicodedata.normalize("NFD", s)
@@ -589,7 +449,7 @@ def msxbioskanjiviz(bios, kanji_roms, bioskanji_png):
                 ):
                     kuten = [byt - 0xA0 for byt in ch.encode("EUC-JP")]
                     putkuten_at(
-                        dr,
+                        text,
                         kuten,
                         (x + 8 * scale * i, y),
                         color_pair,
@@ -605,7 +465,7 @@ def msxbioskanjiviz(bios, kanji_roms, bioskanji_png):
             elif ch == "\N{UPWARDS ARROW}":
                 ch = "^"
             putch_at(
-                dr,
+                text,
                 ch,
                 (x + (6 if font == 1 else 8) * scale * i, y),
                 color_pair,
@@ -613,36 +473,36 @@ def msxbioskanjiviz(bios, kanji_roms, bioskanji_png):
                 scale,
             )
 
-    dr = ImageDraw.Draw(im)
+    text = GlyphBlitter(im)
     if kanji_roms:
         puts_at(
-            dr,
+            text,
             " MSX Kanji ROM ",
             (16 * 16 + 8, 0),
             (v, h),
             font=2,
         )
     puts_at(
-        dr,
+        text,
         "\N{LEFTWARDS ARROW} 8-bit Roman and Kana (ｶﾀｶﾅ and ひらがな) set (8x8)",
         (16 * 16 + 4, 16),
         (k3, w3),
     )
     puts_at(
-        dr,
+        text,
         "  Includes 8x8 Kanji: 月火水木金土日年円時分秒百千万大中小",
         (16 * 16 + 4, 24),
         (k3, w3),
     )
     puts_at(
-        dr,
+        text,
         "\N{LEFTWARDS ARROW} SCREEN 0 Roman and Kana (ｶﾀｶﾅ and ひらがな) set (6x8)",
         (16 * 16 + 4, 32),
         (k3, k),
         font=1,
     )
     puts_at(
-        dr,
+        text,
         "  Includes 6x8 Kanji: 月火水木金土日年円時分秒百千万大中小",
         (16 * 16 + 4, 40),
         (k3, k),
@@ -650,60 +510,67 @@ def msxbioskanjiviz(bios, kanji_roms, bioskanji_png):
     )
     if kanji_roms:
         puts_at(
-            dr,
+            text,
             "  Halfwidth Roman and Katakana (ｶﾀｶﾅ) set (8x16)",
             (16 * 16 + 4, 52),
             (k3, w3),
             font=2,
         )
         puts_at(
-            dr,
+            text,
             "  Halfwidth Roman and Katakana (ｶﾀｶﾅ) set (8x12)",
             (16 * 16 + 4, 68),
             (w, k),
             font=3,
         )
         puts_at(
-            dr,
+            text,
             "  Halfwidth Roman and Katakana (ｶﾀｶﾅ) set (8x16) \N{RIGHTWARDS ARROW}",
             (16 * 16 * 14 + 4, 52),
             (k3, w3),
             font=2,
         )
         puts_at(
-            dr,
+            text,
             "  Halfwidth Roman and Katakana (ｶﾀｶﾅ) set (8x12) \N{RIGHTWARDS ARROW}",
             (16 * 16 * 14 + 4, 68),
             (w, k),
             font=3,
         )
         puts_at(
-            dr,
+            text,
             "\N{DOWNWARDS ARROW} (row number)",
             ((16 + 1) * 16 + 8, (16 - (96 + z - 1) // z - 1) * 16 - 4),
             (w1, k),
         )
         puts_at(
-            dr,
+            text,
             "\N{DOWNWARDS ARROW} (unallocated in 78JIS)",
             ((32 + z + 4) * 16 + 8, (16 - (96 + z - 1) // z - 1) * 16 - 4),
             (w2, k),
         )
+        if level2:
+            puts_at(
+                text,
+                "\N{DOWNWARDS ARROW} (vendor extension, after 84-06)",
+                ((64 + z + 4) * 16 + 8, (16 - (96 + z - 1) // z - 1) * 16 - 4),
+                (w5, k),
+            )
         puts_at(
-            dr,
+            text,
             "fullwidth character set (extended 78JIS)",
             (16 * 16 + 8, (16 - (96 + z - 1) // z - 2) * 16 - 4),
             (w, k),
         )
         for i in range(96):
             puts_at(
-                dr,
+                text,
                 "%02d" % i,
                 (16 * (i % z + 3 * (z + 1) - z // 2), 24 + 16 * (i // z)),
                 ([w1, k][i % 2], [k, w1][i % 2]),
             )
         puts_at(
-            dr,
+            text,
             "\N{LEFTWARDS ARROW} (column number key)",
             (-12 + 16 * (4 * (z + 1) - z // 2), 24 + 12),
             (w1, k),
@@ -729,43 +596,57 @@ def msxbioskanjiviz(bios, kanji_roms, bioskanji_png):
             + 16
         )
 
-    for i in range(8 * len(b)):
-        if (
-            not xb[i // 8]
-            or kanji_roms
-            and (i // 256 >= discontinuity)
-            # and (cvtr(((i // 256) - discontinuity) // 96) <= 87)
-        ):
-            if (i // 256 < 256) and i % 16 >= 14:
-                continue
-            dr.point(
-                (chx(i // 256) * 16 + i % 16, chy(i // 256) * 16 + (i // 16) % 16),
-                (
-                    [
-                        [
-                            k,
-                            [k3, w][1 if i & 8 else 0],
-                        ][i // 256 < discontinuity],
-                        k1,
-                        k2,
-                        k1,
-                    ]
-                    if (b[i // 8] & (128 >> (i % 8)))
-                    else [
-                        [
-                            w,
-                            [w3, k][1 if i & 8 else 0],
-                        ][i // 256 < discontinuity],
-                        [w1, [w4, g][1 if i & 8 else 0]][i // 256 < discontinuity],
-                        w2,
-                        w1,
-                    ]
-                )[2 * invc(i // 256) + (xb[i // 8] != 0)],
+    # everything per-glyph is worked out once per cell; everything
+    # per-pixel is done with array lookups
+    ccs = range(len(b) // 32)
+    colors = [k, w, g, k1, w1, k2, w2, k3, w3, w4, k5, w5]
+    kanji, bios_left, bios_right, vendor = 0, 1, 2, 3
+    cell_class = np.array(
+        [
+            (
+                bios_left
+                if cc < discontinuity
+                else (
+                    vendor
+                    if cc >= vendor_start and (cc - discontinuity) % 96 in range(1, 94 + 1)
+                    else kanji
+                )
+            )
+            for cc in ccs
+        ]
+    )[:, None, None]
+    # the BIOS font cells use different inks in their right halves
+    cell_class = cell_class + (cell_class == bios_left) * (np.arange(16) >= 8)
+    cell_invc = np.array([invc(cc) for cc in ccs])[:, None, None]
+    # palette indices by [cell class][pixel set][2 * invc + masked]
+    lut = np.array(
+        [
+            [[colors.index(color) for color in colors_by_flags] for colors_by_flags in cls]
+            for cls in (
+                ([w, w1, w2, w1], [k, k1, k2, k1]),
+                ([w3, w4, w2, w1], [k3, k1, k2, k1]),
+                ([k, g, w2, w1], [w, k1, k2, k1]),
+                ([w5, w1, w5, w1], [k5, k1, k5, k1]),
             )
+        ]
+    )
+    bits, masked = glyph_bit_planes(b, xb)
+    is_kanji = np.array([cc >= discontinuity for cc in ccs])[:, None, None]
+    # the last two columns of the 8x8 BIOS font cells are left blank
+    is_bios_font = np.array([cc < 256 for cc in ccs])[:, None, None]
+    paint_glyphs(
+        im,
+        colors,
+        lut[cell_class, 1 * bits, 2 * cell_invc + masked],
+        [chx(cc) for cc in ccs],
+        [chy(cc) for cc in ccs],
+        drawn=(~masked | bool(kanji_roms) & is_kanji)
+        & ~(is_bios_font & (np.arange(16) >= 14)),
+    )
     if kanji_roms:
         for i in range(96 - 5):
             puts_at(
-                dr,
+                text,
                 f"{i + (5 if i >= 11 else 0):02d}",
                 (
                     16 * chx(discontinuity + 96 * i),
@@ -774,7 +655,7 @@ def msxbioskanjiviz(bios, kanji_roms, bioskanji_png):
                 (k, w1),
             )
             puts_at(
-                dr,
+                text,
                 f"{i + (5 if i >= 11 else 0):02d}",
                 (
                     16 * chx(discontinuity + 96 * i + 95),
@@ -783,14 +664,14 @@ def msxbioskanjiviz(bios, kanji_roms, bioskanji_png):
                 (k, w1),
             )
         puts_at(
-            dr,
+            text,
             "漢字、ひらがな、カタカナ、Ｒｏｍａｊｉ、ｶﾀｶﾅ､Romaji",
             (16 * 16 + 4, 88),
             (v, h),
             font=2,
         )
         puts_at(
-            dr,
+            text,
             "月火水木金土日年円時分秒百千万大中小",
             (16 * 16 + 4, 104),
             (v, h),
@@ -801,22 +682,24 @@ def msxbioskanjiviz(bios, kanji_roms, bioskanji_png):
 
 def main():
     kanji_roms = []
+    indexed = "--indexed" in sys.argv
+    argv = [arg for arg in sys.argv if arg != "--indexed"]
     try:
-        _, bios, bioskanji_png = sys.argv
+        _, bios, bioskanji_png = argv
     except:
         try:
-            _, bios, kanji_rom, bioskanji_png = sys.argv
+            _, bios, kanji_rom, bioskanji_png = argv
             kanji_roms = [kanji_rom]
         except:
-            (  # usage: python msxbioskanjiviz.py BIOS.ROM [ KANJI.ROM or KANJI1.ROM KANJI2.ROM ] ] OUTPUT
+            (  # usage: python msxbioskanjiviz.py [ --indexed ] BIOS.ROM [ KANJI.ROM or KANJI1.ROM KANJI2.ROM ] ] OUTPUT
                 _,
                 bios,
                 kanji_rom1,
                 kanji_rom2,
                 bioskanji_png,
-            ) = sys.argv
+            ) = argv
             kanji_roms = [kanji_rom1, kanji_rom2]
-    msxbioskanjiviz(bios, kanji_roms, bioskanji_png)
+    msxbioskanjiviz(bios, kanji_roms, bioskanji_png, indexed)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,333 @@
+#!/usr/bin/env python3
+
+"""
+PC-6001 N60-BASIC tokenizer and detokenizer
+
+usage: python3 n60basic.py [ --to txt|bas|p6|p6t; default txt for tokenized INPUTs, bas for listings ] [ --base ADDRESS; default 0x8401 ] [ -o OUTDIR ] INPUT [ INPUT ... ]
+
+Each INPUT is a listing (.txt or .asc, in UTF-8), a tokenized program
+(.bas, as CSAVE writes it after the tape header) or a tape (.p6 or
+.p6t) holding one, and is converted to the format given by --to,
+written next to it (or in OUTDIR): `NAME_bas.txt` for a listing,
+`NAME.bas` for a program, and `NAME.p6` or `NAME.p6t` for a tape named
+after the first 6 characters of NAME.
+
+A tokenized line is the address of the next line (2 bytes, least
+significant first), the line number (2 bytes), the text with each
+keyword replaced by its token byte, and a 0 byte; the program ends
+with a 0 link and CSAVE adds 9 more 0 bytes. Numbers stay as text.
+Strings in quotes, the rest of a line after REM and DATA up to the
+next `:` are not tokenized. Text is converted with the `pc6001-8bit`
+codec from charsets.py.
+
+Keywords are found with one regular expression compiled from a trie
+of them, so the longest keyword at each position wins (`INPUT` over
+`INP`, `INKEY$` over `INT`... ), in either case as N-BASIC does
+(`print` is `PRINT`), and lines are tokenized into a buffer allocated
+for the whole program at once.
+
+Only the N60-BASIC token table (modes 1 to 4) is here. N60m-BASIC
+(PC-6001mkII mode 5) and N66-BASIC (PC-6601 mode 6) tokenize
+differently, so tapes whose .p6t footer names those modes are refused
+rather than misread; another table would be another `Dialect`.
+"""
+
+import argparse
+import re
+import struct
+import sys
+from pathlib import Path
+
+import charsets  # registers the pc6001-8bit codec
+from p6tape import HEADER_MARK, Tape
+
+BASE = 0x8401  # where a program is loaded with 32K of RAM (0xC401 with 16K)
+CODEC = "pc6001-8bit"
+TRAILER = bytes(11)  # the 0 link that ends a program, and what CSAVE adds
+N60_MODES = range(1, 5)  # the .p6t BASIC modes that run N60-BASIC
+
+# fmt: off
+TOKENS = {
+    0x80: "END", 0x81: "FOR", 0x82: "NEXT", 0x83: "DATA",
+    0x84: "INPUT", 0x85: "DIM", 0x86: "READ", 0x87: "LET",
+    0x88: "GOTO", 0x89: "RUN", 0x8A: "IF", 0x8B: "RESTORE",
+    0x8C: "GOSUB", 0x8D: "RETURN", 0x8E: "REM", 0x8F: "STOP",
+    0x90: "OUT", 0x91: "ON", 0x92: "LPRINT", 0x93: "DEF",
+    0x94: "POKE", 0x95: "PRINT", 0x96: "CONT", 0x97: "LIST",
+    0x98: "LLIST", 0x99: "CLEAR", 0x9A: "COLOR", 0x9B: "PSET",
+    0x9C: "PRESET", 0x9D: "LINE", 0x9E: "PAINT", 0x9F: "SCREEN",
+    0xA0: "CLS", 0xA1: "LOCATE", 0xA2: "CONSOLE", 0xA3: "CLOAD",
+    0xA4: "CSAVE", 0xA5: "EXEC", 0xA6: "SOUND", 0xA7: "PLAY",
+    0xA8: "KEY", 0xA9: "LCOPY", 0xAA: "NEW", 0xAB: "RENUM",
+    0xAC: "CIRCLE", 0xAD: "GET", 0xAE: "PUT", 0xAF: "BLOAD",
+    0xB0: "BSAVE", 0xB1: "FILES", 0xB2: "LFILES", 0xB3: "LOAD",
+    0xB4: "MERGE", 0xB5: "NAME", 0xB6: "SAVE", 0xB7: "FIELD",
+    0xB8: "LSET", 0xB9: "RSET", 0xBA: "OPEN", 0xBB: "CLOSE",
+    0xBC: "DSKO$", 0xBD: "KILL", 0xBE: "TALK", 0xBF: "MON",
+    0xC0: "KANJI", 0xC1: "DELETE", 0xC2: "TAB(", 0xC3: "TO",
+    0xC4: "FN", 0xC5: "SPC(", 0xC6: "INKEY$", 0xC7: "THEN",
+    0xC8: "NOT", 0xC9: "STEP", 0xCA: "+", 0xCB: "-",
+    0xCC: "*", 0xCD: "/", 0xCE: "^", 0xCF: "AND",
+    0xD0: "OR", 0xD1: ">", 0xD2: "=", 0xD3: "<",
+    0xD4: "SGN", 0xD5: "INT", 0xD6: "ABS", 0xD7: "USR",
+    0xD8: "FRE", 0xD9: "INP", 0xDA: "LPOS", 0xDB: "POS",
+    0xDC: "SQR", 0xDD: "RND", 0xDE: "LOG", 0xDF: "EXP",
+    0xE0: "COS", 0xE1: "SIN", 0xE2: "TAN", 0xE3: "PEEK",
+    0xE4: "LEN", 0xE5: "HEX$", 0xE6: "STR$", 0xE7: "VAL",
+    0xE8: "ASC", 0xE9: "CHR$", 0xEA: "LEFT$", 0xEB: "RIGHT$",
+    0xEC: "MID$", 0xED: "POINT", 0xEE: "CSRLIN", 0xEF: "STICK",
+    0xF0: "STRIG", 0xF1: "TIME", 0xF2: "PAD", 0xF3: "DSKI$",
+    0xF4: "LOF", 0xF5: "LOC", 0xF6: "EOF", 0xF7: "DSKF",
+    0xF8: "CVS", 0xF9: "MKS$", 0xFA: "ATN",
+}
+# fmt: on
+ABBREVIATIONS = {"?": "PRINT"}
+
+
+def _trie_pattern(words):
+    """
+    return a regular expression (as bytes) matching the longest of the ASCII `words` that starts at a position
+    """
+    trie = {}
+    for word in words:
+        node = trie
+        for ch in word.encode():
+            node = node.setdefault(ch, {})
+        node[None] = {}
+
+    def pattern(node):
+        # longer matches are tried first, then the word ending here
+        branches = [
+            re.escape(bytes([ch])) + pattern(child)
+            for ch, child in sorted(node.items(), key=lambda item: item[0] or 0)
+            if ch is not None
+        ]
+        if not branches:
+            return b""
+        group = b"|".join(branches)
+        if len(branches) > 1 or None in node:
+            group = b"(?:" + group + b")"
+        return group + b"?" if None in node else group
+
+    return pattern(trie)
+
+
+class Dialect:
+    """
+    the tokens of a BASIC, and the precompiled expressions for tokenizing and detokenizing its lines
+    """
+
+    def __init__(self, tokens, abbreviations=(), rem="REM", data="DATA"):
+        self.tokens = dict(tokens)
+        keywords = {keyword: token for token, keyword in self.tokens.items()}
+        for short, long in dict(abbreviations).items():
+            keywords[short] = keywords[long]
+        self._tokens = {k.encode(): bytes([token]) for k, token in keywords.items()}
+        self._keywords = {token: k.encode() for token, k in self.tokens.items()}
+        # not tokenized: strings, the rest of a line after REM, and DATA
+        # items up to the next statement
+        literal = rb'"[^"]*"?'
+        rest = rb"[\s\S]*"
+        items = rb'(?:"[^"]*"?|[^:"])*'
+        rem, data = rem.encode(), data.encode()
+        self._tokenizer = re.compile(
+            b"|".join(
+                [
+                    literal,
+                    b"(?P<rem>" + re.escape(rem) + b")" + rest,
+                    b"(?P<data>" + re.escape(data) + b")" + items,
+                    _trie_pattern(keywords),
+                ]
+            ),
+            re.IGNORECASE,  # only ASCII letters, so kana are left alone
+        )
+        rem_token, data_token = (self._tokens[k] for k in (rem, data))
+        self._detokenizer = re.compile(
+            b"|".join(
+                [
+                    literal,
+                    re.escape(rem_token) + rest,
+                    re.escape(data_token) + items,
+                    rb"[\x80-\xff]",
+                ]
+            )
+        )
+
+    def _tokenized(self, match):
+        text = match[0]
+        if text[:1] == b'"':
+            return text
+        keyword = match["rem"] or match["data"]
+        if keyword:
+            return self._tokens[keyword.upper()] + text[len(keyword) :]
+        return self._tokens[text.upper()]
+
+    def _detokenized(self, match):
+        text = match[0]
+        if text[:1] == b'"':
+            return text
+        return self._keywords.get(text[0], text[:1]) + text[1:]
+
+    def tokenize(self, listing, base=BASE):
+        """
+        return the tokenized program for the text `listing`, to be loaded at address `base`
+        """
+        lines = []
+        for i, line in enumerate(listing.splitlines(), 1):
+            if not line.strip():
+                continue
+            match = re.match(r"\s*(\d+) ?", line)
+            if not match or int(match[1]) > 65529:
+                raise ValueError(f"line {i}: no line number in {line!r}")
+            lines.append((int(match[1]), line[match.end() :].encode(CODEC)))
+        # every line fits in its text and 5 bytes, as tokens are no longer
+        # than their keywords
+        buf = bytearray(sum(len(body) + 5 for _, body in lines) + len(TRAILER))
+        n = 0
+        for number, body in lines:
+            body = self._tokenizer.sub(self._tokenized, body)
+            end = n + 4 + len(body)
+            if base + end + 1 > 0xFFFF:
+                raise ValueError(f"line {number} is past the end of memory")
+            struct.pack_into("<HH", buf, n, base + end + 1, number)
+            buf[n + 4 : end] = body
+            buf[end] = 0
+            n = end + 1
+        buf[n : n + len(TRAILER)] = TRAILER
+        return bytes(buf[: n + len(TRAILER)])
+
+    def detokenize(self, program, newline="\r\n"):
+        """
+        return the listing of the tokenized program `program`, each line ended with `newline`
+        """
+        lines = []
+        p = 0
+        while p + 4 <= len(program):
+            link, number = struct.unpack_from("<HH", program, p)
+            if not link:
+                break
+            end = program.find(b"\0", p + 4)
+            if end < 0:
+                raise ValueError(f"line {number} at {p} has no end")
+            body = self._detokenizer.sub(self._detokenized, program[p + 4 : end])
+            lines.append(f"{number} {body.decode(CODEC)}{newline}")
+            p = end + 1
+        return "".join(lines)
+
+
+N60 = Dialect(TOKENS, ABBREVIATIONS)
+
+
+def tokenize(listing, base=BASE):
+    return N60.tokenize(listing, base)
+
+
+def detokenize(program, newline="\r\n"):
+    return N60.detokenize(program, newline)
+
+
+def programs(tape):
+    """
+    return the (name, program) of each BASIC program on `tape`: the block after each header
+    """
+    found = []
+    for header, block in zip(tape.blocks, tape.blocks[1:]):
+        if header.data.startswith(HEADER_MARK) and not block.data.startswith(HEADER_MARK):
+            found.append((header.data[len(HEADER_MARK) :], block.data))
+    return found
+
+
+def to_tape(name, program):
+    """
+    return the tape CSAVE would make of `program` under the (up to 6 character) `name`
+    """
+    header = HEADER_MARK + name.encode(CODEC)[:6].ljust(6, b"\0")
+    return Tape.from_p6(header + program)
+
+
+def smoke_test_n60basic():
+    here = Path(__file__).parent
+    for name in ("m1p1cg-full", "m1p1cg-orange"):
+        listing = (here / f"{name}_bas.txt").read_bytes().decode()
+        program = (here / f"{name}.bas").read_bytes()
+        assert tokenize(listing) == program, name
+        assert detokenize(program) == listing, name
+        tape = Tape.from_p6((here / f"{name}.p6").read_bytes())
+        assert programs(tape) == [(b"m1p1cg", program)]
+        assert to_tape("m1p1cg", program) == tape
+    listing = (
+        '10 INPUT "ｶﾅ IF";A:IF INKEY$<>"" THEN ?INT(A)\r\n'
+        "20 DATA 1,PRINT,\"A:B\":REM FOR: TO\r\n"
+        "30 X=INP(1)+PEEK(&HFA00)\r\n"
+    )
+    program = tokenize(listing)
+    assert program[4:10] == b'\x84 "\xb6\xc5 '
+    assert b"\x95\xd5(" in program and b"FOR" in program and b"PRINT" in program
+    assert detokenize(program) == listing.replace("?", "PRINT")
+    assert detokenize(tokenize("\n")) == ""
+    # keywords in lower (or mixed) case are tokenized too, other text is kept
+    lower = '10 input "a";a:if inkey$<>"" then ?int(a)\r\n20 data x,y:Rem z\r\n'
+    upper = '10 INPUT "a";a:IF INKEY$<>"" THEN PRINTINT(a)\r\n20 DATA x,y:REM z\r\n'
+    assert tokenize(lower) == tokenize(upper) and detokenize(tokenize(lower)) == upper
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Convert PC-6001 N60-BASIC programs between listings and tokens."
+    )
+    parser.add_argument("inputs", metavar="INPUT", nargs="+")
+    parser.add_argument("--to", choices=["txt", "bas", "p6", "p6t"])
+    parser.add_argument(
+        "--base",
+        type=lambda s: int(s, 0),
+        default=BASE,
+        help=f"load address of tokenized programs (default {BASE:#06x})",
+    )
+    parser.add_argument("-o", "--output-dir", metavar="OUTDIR", type=Path)
+    args = parser.parse_args()
+    smoke_test_n60basic()
+    failed = False
+    for name in args.inputs:
+        path = Path(name)
+        suffix = path.suffix.lower()
+        stem = path.stem.removesuffix("_bas")
+        if suffix in (".p6", ".p6t"):
+            data = path.read_bytes()
+            tape = Tape.from_p6t(data) if suffix == ".p6t" else Tape.from_p6(data)
+            if tape.basic_mode not in N60_MODES:
+                print(
+                    f"{name}: BASIC mode {tape.basic_mode} is not N60-BASIC",
+                    file=sys.stderr,
+                )
+                failed = True
+                continue
+            found = programs(tape)
+            if len(found) != 1:
+                print(f"{name}: {len(found)} BASIC programs", file=sys.stderr)
+                failed = True
+                continue
+            program = found[0][1]
+        elif suffix == ".bas":
+            program = path.read_bytes()
+        else:
+            program = tokenize(path.read_bytes().decode(), args.base)
+        to = args.to or ("bas" if suffix in (".txt", ".asc") else "txt")
+        output = path.with_name(f"{stem}_bas.txt" if to == "txt" else f"{stem}.{to}")
+        if args.output_dir:
+            output = args.output_dir / output.name
+        if output.resolve() == path.resolve():
+            parser.error(f"{name} is already a .{to} file")
+        if to == "txt":
+            output.write_text(detokenize(program), newline="")
+        elif to == "bas":
+            output.write_bytes(program)
+        else:
+            tape = to_tape(stem, program)
+            output.write_bytes(tape.p6t() if to == "p6t" else tape.p6())
+        print(f"Converted {name} → {output}")
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
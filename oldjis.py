@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+
+"""
+which ku/ten cells are missing from old JIS (JIS C 6226-1978 a.k.a. JIS X 0208-1978)
+
+The visualizers used to find this out per pixel by pushing the EUC-JP
+bytes for a cell through the `iso2022_jp_1` codec and back (`rtok()`
+below). The answer only depends on the cell, so it is stored here as a
+packed 96x96 bit table instead, one bit per cell, most significant bit
+first, in ku-major order. Cells with ku or ten 0 or 95 are never valid.
+
+usage: python3 oldjis.py
+
+(running it checks the table against the codec round trip for every cell)
+"""
+
+import codecs
+import gzip
+
+
+def _decompress_cell_bits(compressed_cell_bits):
+    cell_bits = gzip.decompress(codecs.decode(compressed_cell_bits, "base64"))
+    assert len(cell_bits) == 96 * 96 // 8
+    return cell_bits
+
+
+MISSING_FROM_OLD_JIS = _decompress_cell_bits(
+    b"H4sIAAAAAAACA/v/HwEaGOCAsYHx/wH7A/UfGOQP2P7/z2APlJOHYijgR1LPCGLXgzDMHHsksv4/"
+    b"7QCKm0fZdGTzj4b/EGQ3/h9cAACb35yygAQAAA=="
+)
+
+
+def missing_from_old_jis(ku, ten):
+    """
+    return True if the cell at `ku`, `ten` (each 0...95) has no character in old JIS
+    """
+    i = 96 * ku + ten
+    return bool(MISSING_FROM_OLD_JIS[i >> 3] & (0x80 >> (i & 7)))
+
+
+def rtok(byts):
+    return (
+        byts.decode("EUC-JP", "ignore")
+        .encode("iso2022_jp_1", "ignore")
+        .decode("iso2022_jp_1", "ignore")
+        .encode("EUC-JP")
+        == byts
+    )
+
+
+def smoke_test_missing_from_old_jis():
+    mismatches = [
+        (ku, ten)
+        for ku in range(96)
+        for ten in range(96)
+        if missing_from_old_jis(ku, ten) != (not rtok(bytes([ku + 0xA0, ten + 0xA0])))
+    ]
+    assert not mismatches, mismatches
+    assert missing_from_old_jis(0, 0) and missing_from_old_jis(95, 95)
+    assert not missing_from_old_jis(16, 1)  # 亜
+
+
+if __name__ == "__main__":
+    smoke_test_missing_from_old_jis()
@@ -0,0 +1,404 @@
+#!/usr/bin/env python3
+
+"""
+PC-6001 series cassette tapes: raw .p6 images, .p6t images and .wav recordings
+
+usage: python3 p6tape.py [ --to p6|p6t|wav; default p6t ] [ -o OUTDIR ] [ --p6t-timing ] INPUT.p6|INPUT.p6t|INPUT.wav [ INPUT ... ]
+   or: python3 p6tape.py --info INPUT [ INPUT ... ]
+
+Each INPUT is converted to the format given by --to, written next to it
+(or in OUTDIR) with the matching extension.
+
+A .p6 file is just the bytes on the tape. A .p6t file has the same
+bytes followed by a footer: "P6", a version (2), the number of blocks,
+an autostart flag, the BASIC mode and number of pages, the keys typed
+to autostart (e.g. `CLOAD\\nRUN\\r`) and any extended header, then a
+"TI" descriptor per block (its ID, name, baud rate, the silence and
+pilot tone before it in milliseconds, and its offset and size), and
+last the offset of the footer.
+
+On tape each byte is a 12-bit frame at 1200 baud: a 0 start bit, the
+8 data bits least significant first and three 1 stop bits, a 0 being
+one cycle of 1200 Hz and a 1 two cycles of 2400 Hz. Every bit starts
+at phase 0 (exactly `sample_rate / baud` samples apart on average),
+so the waveform is looked up in a table by the phase of each sample.
+Blocks are preceded by a pilot tone of 1s. By default a recording is
+laid out the way the .wav files here are (2 s of silence, 3.5 s of
+pilot, 0.5 s between blocks, then 0.05 s of 1s and 0.6 s of silence);
+`--p6t-timing` uses the silence and pilot times in the .p6t footer
+instead.
+
+WAV files are written and read a block at a time, with the FSK modem
+in ktst31/fsktape.py that the MSX tape tools use too. Recordings are
+decoded from their zero crossings (with hysteresis) by classifying
+each half-cycle as short or long, splitting the bits at pilot tones
+and checking the frames in between, vectorized with numpy.
+"""
+
+import argparse
+import math
+import struct
+import sys
+import wave
+from pathlib import Path
+
+import numpy as np
+
+# the tape modem is shared with the MSX tape tools
+sys.path.insert(0, str(Path(__file__).resolve().parent / "ktst31"))
+from fsktape import PhaseModulator, decode_wav, frame_bits, read_samples
+
+BAUD = 1200
+SAMPLE_RATE = 44100
+CHANNELS = 2
+AMPLITUDE = 32767
+STOP_BITS = 3
+HEADER_MARK = b"\xd3" * 10  # starts the header block of a CSAVE'd BASIC program
+BLOCK_BITS = 1 << 16  # bits synthesized at a time
+
+# the layout of the recordings here, in seconds
+LEAD_SILENCE = 2.0
+FIRST_PILOT = 3.5
+PILOT = 0.5
+TRAILER = 0.05
+FINAL_SILENCE = 0.6
+
+# the .p6t footer, and the descriptor of each block
+_FOOTER = struct.Struct("<2sBBBBBH")
+_TI = struct.Struct("<2sB16sHHHII")
+
+
+class TapeBlock:
+    """
+    the bytes between two pilot tones, with their .p6t descriptor fields
+    """
+
+    __slots__ = ("data", "id", "name", "baud", "silence_ms", "pilot_ms")
+
+    def __init__(self, data, id=0, name=b"", baud=BAUD, silence_ms=0, pilot_ms=634):
+        self.data = bytes(data)
+        self.id = id
+        self.name = bytes(name).rstrip(b"\0")
+        self.baud = baud
+        self.silence_ms = silence_ms
+        self.pilot_ms = pilot_ms
+
+    def __eq__(self, other):
+        return all(getattr(self, k) == getattr(other, k) for k in self.__slots__)
+
+    def __repr__(self):
+        return (
+            f"TapeBlock({len(self.data)} bytes, name={self.name!r}, baud={self.baud},"
+            f" silence_ms={self.silence_ms}, pilot_ms={self.pilot_ms})"
+        )
+
+
+def _split_p6(data):
+    # a block for each CSAVE header (its mark and a 6-character name)
+    # and for the data up to the next one
+    starts, i = [], data.find(HEADER_MARK)
+    while i >= 0:
+        starts += [i, i + len(HEADER_MARK) + 6]
+        i = data.find(HEADER_MARK, i + len(HEADER_MARK) + 6)
+    bounds = sorted({0, *starts, len(data)})
+    return [data[a:b] for a, b in zip(bounds, bounds[1:]) if b > a]
+
+
+class Tape:
+    """
+    a PC-6001 cassette tape: its blocks, and the autostart settings of its .p6t footer
+    """
+
+    __slots__ = ("blocks", "autostart", "basic_mode", "pages", "keys", "extended")
+
+    def __init__(
+        self,
+        blocks,
+        autostart=True,
+        basic_mode=1,
+        pages=1,
+        keys=b"CLOAD\nRUN\r",
+        extended=b"",
+    ):
+        self.blocks = list(blocks)
+        self.autostart = autostart
+        self.basic_mode = basic_mode
+        self.pages = pages
+        self.keys = keys
+        self.extended = extended
+
+    def __eq__(self, other):
+        return all(getattr(self, k) == getattr(other, k) for k in self.__slots__)
+
+    @classmethod
+    def from_p6(cls, data):
+        """
+        return the tape for the raw .p6 image `data`, split into header and data blocks with the usual .p6t settings
+        """
+        blocks = []
+        for byts in _split_p6(bytes(data)):
+            if byts.startswith(HEADER_MARK) and len(byts) == len(HEADER_MARK) + 6:
+                name = byts[len(HEADER_MARK) :]
+                blocks.append(TapeBlock(byts, 0, name, silence_ms=3400, pilot_ms=3400))
+            else:
+                blocks.append(TapeBlock(byts))
+        return cls(blocks)
+
+    @classmethod
+    def from_p6t(cls, buf):
+        """
+        return the tape for the .p6t image `buf`
+        """
+        (footer,) = struct.unpack_from("<I", buf, len(buf) - 4)
+        magic, version, count, autostart, basic_mode, pages, key_size = (
+            _FOOTER.unpack_from(buf, footer)
+        )
+        if magic != b"P6" or version != 2:
+            raise ValueError(f"not a version 2 .p6t image ({magic!r}, {version})")
+        i = footer + _FOOTER.size
+        keys, i = buf[i : i + key_size], i + key_size
+        (extended_size,) = struct.unpack_from("<H", buf, i)
+        extended, i = buf[i + 2 : i + 2 + extended_size], i + 2 + extended_size
+        blocks = []
+        for _ in range(count):
+            magic, id, name, baud, silence_ms, pilot_ms, offset, size = _TI.unpack_from(
+                buf, i
+            )
+            if magic != b"TI":
+                raise ValueError(f"bad block descriptor at {i}")
+            data = buf[offset : offset + size]
+            blocks.append(TapeBlock(data, id, name, baud, silence_ms, pilot_ms))
+            i += _TI.size
+        keys, extended = bytes(keys), bytes(extended)
+        return cls(blocks, bool(autostart), basic_mode, pages, keys, extended)
+
+    def p6(self):
+        """
+        return the raw .p6 image: the bytes of every block
+        """
+        return b"".join(block.data for block in self.blocks)
+
+    def p6t(self):
+        """
+        return the .p6t image
+        """
+        data = self.p6()
+        footer = [
+            _FOOTER.pack(
+                b"P6",
+                2,
+                len(self.blocks),
+                self.autostart,
+                self.basic_mode,
+                self.pages,
+                len(self.keys),
+            ),
+            self.keys,
+            struct.pack("<H", len(self.extended)),
+            self.extended,
+        ]
+        offset = 0
+        for block in self.blocks:
+            footer.append(
+                _TI.pack(
+                    b"TI",
+                    block.id,
+                    block.name,
+                    block.baud,
+                    block.silence_ms,
+                    block.pilot_ms,
+                    offset,
+                    len(block.data),
+                )
+            )
+            offset += len(block.data)
+        return data + b"".join(footer) + struct.pack("<I", len(data))
+
+    def layout(self, p6t_timing=False):
+        """
+        yield the recording as ("silence", seconds) and ("bits", baud, bit array) pieces
+        """
+        for i, block in enumerate(self.blocks):
+            if p6t_timing:
+                silence, pilot = block.silence_ms / 1000, block.pilot_ms / 1000
+            else:
+                silence, pilot = (LEAD_SILENCE, FIRST_PILOT) if i == 0 else (0, PILOT)
+            if silence:
+                yield "silence", silence
+            yield "bits", block.baud, np.ones(round(pilot * block.baud), dtype=np.uint8)
+            for start in range(0, len(block.data), BLOCK_BITS // 12):
+                data = block.data[start : start + BLOCK_BITS // 12]
+                frames = FRAME_BITS[np.frombuffer(data, np.uint8)]
+                yield "bits", block.baud, frames.ravel()
+        if self.blocks:
+            baud = self.blocks[-1].baud
+            yield "bits", baud, np.ones(round(TRAILER * baud), dtype=np.uint8)
+        yield "silence", FINAL_SILENCE
+
+    def write_wav(
+        self, wav_filename, sample_rate=SAMPLE_RATE, channels=CHANNELS, p6t_timing=False
+    ):
+        """
+        write the recording of the tape to `wav_filename`, a piece at a time
+        """
+        synthesizer = Synthesizer(sample_rate)
+        with wave.open(str(wav_filename), "wb") as wav_file:
+            wav_file.setnchannels(channels)
+            wav_file.setsampwidth(2)
+            wav_file.setframerate(sample_rate)
+            for kind, *args in self.layout(p6t_timing):
+                samples = getattr(synthesizer, kind)(*args)
+                wav_file.writeframes(np.repeat(samples, channels).tobytes())
+
+    @classmethod
+    def from_wav(cls, wav_filename, baud=None):
+        """
+        return the tape decoded from the recording `wav_filename`, and the sample offsets of any framing errors
+        """
+        baud, blocks = decode_wav(wav_filename, STOP_BITS, baud)
+        tape = cls.from_p6(b"".join(data for _, data, _ in blocks))
+        for block in tape.blocks:
+            block.baud = baud
+        return tape, sorted({error for *_, errors in blocks for error in errors})
+
+
+# the 12-bit frame of each byte value: a start bit, the 8 data bits
+# least significant first, and three stop bits
+FRAME_BITS = frame_bits(STOP_BITS)
+
+
+class Synthesizer:
+    """
+    the samples of a recording, a piece at a time
+
+    Runs of bits are continuous, and synthesized by an `fsktape.PhaseModulator` with the (inverted) wave of the .wav files here, so bit n of a run starts at `n * sample_rate / baud` samples. Silence, or a change of baud rate, ends a run.
+    """
+
+    __slots__ = ("sample_rate", "amplitude", "_run")
+
+    def __init__(self, sample_rate=SAMPLE_RATE, amplitude=AMPLITUDE):
+        self.sample_rate = sample_rate
+        self.amplitude = amplitude
+        self._run = None
+
+    def bits(self, baud, bits):
+        """
+        return the samples for `bits`, following on from the last run at the same baud rate
+        """
+        if self._run is None or self._run.baud != baud:
+            self._run = PhaseModulator(self.sample_rate, baud, -self.amplitude)
+        return self._run.bits(bits)
+
+    def silence(self, seconds):
+        """
+        return `seconds` of silence, after the sample that closes the last run if its end falls on one
+        """
+        closing = self._run is not None and self._run.ends_on_sample()
+        self._run = None
+        return np.zeros(closing + math.ceil(seconds * self.sample_rate), dtype="<i2")
+
+
+def load(path):
+    """
+    return the tape in the .p6, .p6t or .wav file `path`, and the sample offsets of framing errors in a .wav
+    """
+    path = Path(path)
+    suffix = path.suffix.lower()
+    if suffix == ".wav":
+        return Tape.from_wav(path)
+    data = path.read_bytes()
+    if suffix == ".p6t":
+        return Tape.from_p6t(data), []
+    return Tape.from_p6(data), []
+
+
+def save(tape, path, p6t_timing=False):
+    """
+    write `tape` to the .p6, .p6t or .wav file `path`
+    """
+    path = Path(path)
+    suffix = path.suffix.lower()
+    if suffix == ".wav":
+        tape.write_wav(path, p6t_timing=p6t_timing)
+    elif suffix == ".p6t":
+        path.write_bytes(tape.p6t())
+    else:
+        path.write_bytes(tape.p6())
+
+
+def smoke_test_p6tape():
+    import os, random, tempfile
+
+    here = Path(__file__).parent
+    for name in ("m1p1cg-full", "m1p1cg-orange"):
+        p6 = (here / f"{name}.p6").read_bytes()
+        p6t = (here / f"{name}.p6t").read_bytes()
+        tape = Tape.from_p6t(p6t)
+        assert tape.p6() == p6 and tape.p6t() == p6t
+        assert Tape.from_p6(p6) == tape
+        assert tape.blocks[1].data == (here / f"{name}.bas").read_bytes()
+        decoded, errors = Tape.from_wav(here / f"{name}.wav")
+        assert decoded == tape and errors == []
+        with tempfile.TemporaryDirectory() as tmp:
+            wav = os.path.join(tmp, "t.wav")
+            tape.write_wav(wav)
+            # the same recording as the one here, to within rounding
+            ours = np.concatenate(list(read_samples(wav))[1:])
+            theirs = np.concatenate(list(read_samples(here / f"{name}.wav"))[1:])
+            assert len(ours) == len(theirs) and np.abs(ours - theirs).max() <= 2
+    rng = random.Random(6001)
+    data = HEADER_MARK + b"GAME\0\0" + rng.randbytes(500) + bytes([0, 0xFF] * 10)
+    tape = Tape.from_p6(data)
+    assert [len(block.data) for block in tape.blocks] == [16, 520]
+    with tempfile.TemporaryDirectory() as tmp:
+        for sample_rate, channels, p6t_timing in ((22050, 1, True), (48000, 2, False)):
+            wav = os.path.join(tmp, "t.wav")
+            tape.write_wav(wav, sample_rate, channels, p6t_timing)
+            decoded, errors = Tape.from_wav(wav)
+            assert decoded == tape and errors == [], (sample_rate, errors)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Convert PC-6001 tapes between .p6, .p6t and .wav."
+    )
+    parser.add_argument("inputs", metavar="INPUT", nargs="+")
+    parser.add_argument("--to", choices=["p6", "p6t", "wav"], default="p6t")
+    parser.add_argument("-o", "--output-dir", metavar="OUTDIR", type=Path)
+    parser.add_argument(
+        "--p6t-timing",
+        action="store_true",
+        help="use the silence and pilot times of the .p6t footer in .wav files",
+    )
+    parser.add_argument(
+        "--info", action="store_true", help="describe the INPUT tapes instead"
+    )
+    args = parser.parse_args()
+    smoke_test_p6tape()
+    failed = False
+    for name in args.inputs:
+        tape, errors = load(name)
+        for offset in errors:
+            print(f"{name}: framing error at sample {offset}", file=sys.stderr)
+            failed = True
+        if args.info:
+            print(
+                f"{name}: autostart={tape.autostart} basic_mode={tape.basic_mode}"
+                f" pages={tape.pages} keys={tape.keys!r}"
+            )
+            for block in tape.blocks:
+                print(f"  {block!r}")
+            continue
+        path = Path(name).with_suffix(f".{args.to}")
+        if args.output_dir:
+            path = args.output_dir / path.name
+        if path.resolve() == Path(name).resolve():
+            parser.error(f"{name} is already a .{args.to} file")
+        save(tape, path, args.p6t_timing)
+        print(f"Converted {name} → {path}")
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
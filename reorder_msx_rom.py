@@ -1,70 +1,269 @@
-#!/usr/bin/env python3
-
-import argparse
-from pathlib import Path
-
-import numpy as np
-
-
-def reorder_bits_to_ic(io: bytes) -> bytes:
-    arr = np.frombuffer(io, dtype=np.uint8)
-    indices = np.arange(len(io), dtype=np.uint32)
-    reordered = (
-        ((indices & 0b11000000000000000) >> 12)
-        | ((indices & 0b111111111111000) << 2)
-        | (indices & 0b100000000000000111)
-    )
-    return arr[reordered].tobytes()
-
-
-def reorder_bits_to_io(ic: bytes) -> bytes:
-    arr = np.frombuffer(ic, dtype=np.uint8)
-    indices = np.arange(len(ic), dtype=np.uint32)
-    reordered = (
-        ((indices & 0b11000) << 12)
-        | ((indices & 0b11111111111100000) >> 2)
-        | (indices & 0b100000000000000111)
-    )
-    return arr[reordered].tobytes()
-
-
-def main() -> None:
-    parser = argparse.ArgumentParser(
-        description="Convert ROM files between I/O-ordered and IC-ordered formats."
-    )
-    parser.add_argument(
-        "--io",
-        metavar="PATH",
-        type=Path,
-        required=True,
-        help="Path to the I/O-ordered ROM file",
-    )
-    parser.add_argument(
-        "--ic",
-        metavar="PATH",
-        type=Path,
-        required=True,
-        help="Path to the IC-ordered ROM file",
-    )
-    parser.add_argument(
-        "--to",
-        choices=["ic", "io"],
-        required=True,
-        help="Conversion direction: 'ic' or 'io'",
-    )
-    args = parser.parse_args()
-
-    if args.to == "ic":
-        data = args.io.read_bytes()
-        assert len(data) in {2**17, 2**18}, f"Unexpected ROM size: {len(data)} bytes"
-        args.ic.write_bytes(reorder_bits_to_ic(data))
-        print(f"Converted {args.io} → {args.ic} (I/O-ordered → IC-ordered)")
-    else:
-        data = args.ic.read_bytes()
-        assert len(data) in {2**17, 2**18}, f"Unexpected ROM size: {len(data)} bytes"
-        args.io.write_bytes(reorder_bits_to_io(data))
-        print(f"Converted {args.ic} → {args.io} (IC-ordered → I/O-ordered)")
-
-
-if __name__ == "__main__":
-    main()
+#!/usr/bin/env python3
+
+"""
+reorder ROM images by permuting their address (and data) lines
+
+A permutation is written as a spec string: the input bit that drives
+each output bit, most significant first, with `~` marking an inverted
+line and `A-B` standing for a run of bits. The address bits may be
+followed by `/` and the eight data bits. For example `4-3 16-5 2-0` is
+the MSX Kanji ROM I/O port order to IC order shuffle: IC address bits
+16 and 15 come from I/O address bits 4 and 3, IC bits 14...3 from I/O
+bits 16...5, and bits 2...0 are unchanged. `/ 0-7`, with no address
+bits at all, would just mirror every byte.
+
+A spec with n address bits is applied to each 2**n byte block of the
+image in turn, so higher address bits are passed through unchanged and
+images of any size are reordered a chunk at a time. Each spec is
+compiled once into a gather index (and a data lookup table), and its
+inverse is derived automatically.
+"""
+
+import argparse
+import functools
+import re
+from pathlib import Path
+
+import numpy as np
+
+CHUNK_SIZE = 1 << 20
+
+_TOKEN = re.compile(r"(~?)(\d+)(?:-(\d+))?$")
+
+
+def _parse_bits(tokens: str) -> tuple:
+    bits = []
+    for token in tokens.split():
+        match = _TOKEN.match(token)
+        if not match:
+            raise ValueError(f"bad bit spec {token!r}")
+        inverted = match[1] == "~"
+        first, last = int(match[2]), int(match[3] or match[2])
+        step = -1 if last < first else 1
+        bits += [(bit, inverted) for bit in range(first, last + step, step)]
+    if sorted(bit for bit, _ in bits) != list(range(len(bits))):
+        raise ValueError(f"{tokens!r} is not a permutation of bits 0-{len(bits) - 1}")
+    return tuple(bits[::-1])
+
+
+def _format_bits(bits: tuple) -> str:
+    runs = []
+    for bit, inverted in bits[::-1]:
+        if runs:
+            first, last, run_inverted = runs[-1]
+            step = (last > first) - (last < first) if last != first else bit - last
+            if run_inverted == inverted and step in (-1, 1) and bit == last + step:
+                runs[-1] = (first, bit, inverted)
+                continue
+        runs.append((bit, bit, inverted))
+    return " ".join(
+        ("~" if inverted else "") + (f"{first}" if first == last else f"{first}-{last}")
+        for first, last, inverted in runs
+    )
+
+
+def _invert_bits(bits: tuple) -> tuple:
+    inverse = [None] * len(bits)
+    for i, (bit, inverted) in enumerate(bits):
+        inverse[bit] = (i, inverted)
+    return tuple(inverse)
+
+
+def gather_index(address: tuple, cached: bool = True) -> np.ndarray:
+    """
+    return the read-only gather index of the address-line permutation `address` (as in `Reorder.address`): output byte `j` of each block is input byte `index[j]`; `cached=False` skips the cache, for searches trying many one-off permutations
+    """
+    if cached:
+        return _cached_gather_index(tuple(address))
+    i = np.arange(1 << len(address), dtype=np.uint32)
+    source = np.zeros_like(i)
+    for out_bit, (in_bit, inverted) in enumerate(address):
+        source |= (((i >> out_bit) & 1) ^ inverted) << in_bit
+    source.flags.writeable = False
+    return source
+
+
+@functools.lru_cache(maxsize=None)
+def _cached_gather_index(address: tuple) -> np.ndarray:
+    return gather_index(address, cached=False)
+
+
+@functools.lru_cache(maxsize=None)
+def _data_table(data: tuple) -> np.ndarray:
+    v = np.arange(256, dtype=np.uint8)
+    table = np.zeros_like(v)
+    for out_bit, (in_bit, inverted) in enumerate(data):
+        table |= (((v >> in_bit) & 1) ^ inverted) << out_bit
+    table.flags.writeable = False
+    return table
+
+
+class Reorder:
+    """
+    an address-line permutation, and optionally a data-line permutation, of ROM images
+
+    `address` and `data` hold an `(input bit, inverted)` pair for each output bit, least significant first; `data` is None when the data lines are left alone.
+    """
+
+    __slots__ = ("address", "data")
+
+    def __init__(self, address: tuple, data: tuple = None) -> None:
+        self.address = tuple(address)
+        self.data = None if data is None else tuple(data)
+        assert self.data is None or len(self.data) == 8
+
+    @classmethod
+    def parse(cls, spec: str) -> "Reorder":
+        """
+        return the permutation for `spec`, either a spec string or the name of one of `PRESETS`
+        """
+        spec = PRESETS.get(spec, spec)
+        address, _, data = spec.partition("/")
+        data = _parse_bits(data) if data.strip() else None
+        if data is not None and len(data) != 8:
+            raise ValueError(f"{spec!r} does not permute 8 data bits")
+        return cls(_parse_bits(address), data)
+
+    def __str__(self) -> str:
+        if self.data is None:
+            return _format_bits(self.address)
+        return f"{_format_bits(self.address)} / {_format_bits(self.data)}"
+
+    def __eq__(self, other) -> bool:
+        return (self.address, self.data) == (other.address, other.data)
+
+    def inverse(self) -> "Reorder":
+        """
+        return the permutation that undoes this one
+        """
+        data = self.data and _invert_bits(self.data)
+        return Reorder(_invert_bits(self.address), data)
+
+    @property
+    def block_size(self) -> int:
+        return 1 << len(self.address)
+
+    def apply(self, image: bytes) -> bytes:
+        """
+        return `image` reordered; its size must be a multiple of `block_size`
+        """
+        assert len(image) % self.block_size == 0, f"Unexpected ROM size: {len(image)}"
+        blocks = np.frombuffer(image, dtype=np.uint8).reshape(-1, self.block_size)
+        reordered = blocks[:, gather_index(self.address)]
+        if self.data is not None:
+            reordered = _data_table(self.data)[reordered]
+        return reordered.tobytes()
+
+    def apply_stream(self, infile, outfile, chunk_size: int = CHUNK_SIZE) -> None:
+        """
+        reorder the binary file `infile` into `outfile` a few blocks at a time
+        """
+        chunk_size = max(chunk_size - chunk_size % self.block_size, self.block_size)
+        while chunk := infile.read(chunk_size):
+            outfile.write(self.apply(chunk))
+
+
+# MSX Kanji ROM I/O port order (as read through ports D8h-DBh) to IC
+# order, and PC-6001mkII / PC-6601 KANJIROM.62 / KANJIROM.66 from its
+# two ICs (left and right halves of each glyph) concatenated to 16-bit
+# words; the reverse directions are derived below
+PRESETS = {
+    "msx-ic": "4-3 16-5 2-0",
+    "kanjirom-16bit": "13-0 14",
+}
+PRESETS.update(
+    {
+        "msx-io": str(Reorder.parse("msx-ic").inverse()),
+        "kanjirom-ics": str(Reorder.parse("kanjirom-16bit").inverse()),
+    }
+)
+
+
+def reorder_bits_to_ic(io: bytes) -> bytes:
+    return Reorder.parse("msx-ic").apply(io)
+
+
+def reorder_bits_to_io(ic: bytes) -> bytes:
+    return Reorder.parse("msx-io").apply(ic)
+
+
+def smoke_test_reorder_msx_rom() -> None:
+    io = np.random.default_rng(6001).integers(0, 256, 2**18, np.uint8).tobytes()
+    i = np.arange(len(io), dtype=np.uint32)
+    to_ic = (
+        ((i & 0b11000000000000000) >> 12)
+        | ((i & 0b111111111111000) << 2)
+        | (i & 0b100000000000000111)
+    )
+    assert reorder_bits_to_ic(io) == np.frombuffer(io, np.uint8)[to_ic].tobytes()
+    assert reorder_bits_to_io(reorder_bits_to_ic(io)) == io
+    assert reorder_bits_to_io(io[: 2**17]) == reorder_bits_to_io(io)[: 2**17]
+    assert PRESETS["msx-io"] == "14-3 16-15 2-0"
+    assert PRESETS["kanjirom-ics"] == "0 14-1"
+    kanjirom = Reorder.parse("kanjirom-ics").apply(b"LR" * 2**14)
+    assert kanjirom == b"L" * 2**14 + b"R" * 2**14
+    assert Reorder.parse("/ 0-7").apply(b"\x01\x80") == b"\x80\x01"
+    reorder = Reorder.parse("~0 2 1 / ~7 6-0")
+    assert reorder.apply(bytes(range(8))) == bytes.fromhex("8183858780828486")
+    assert reorder.inverse().apply(reorder.apply(io)) == io
+    assert Reorder.parse(str(reorder)) == reorder
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Convert ROM files between I/O-ordered and IC-ordered formats,"
+        " or apply any address-line permutation."
+    )
+    parser.add_argument(
+        "--io",
+        metavar="PATH",
+        type=Path,
+        help="Path to the I/O-ordered ROM file",
+    )
+    parser.add_argument(
+        "--ic",
+        metavar="PATH",
+        type=Path,
+        help="Path to the IC-ordered ROM file",
+    )
+    parser.add_argument(
+        "--to",
+        choices=["ic", "io"],
+        help="Conversion direction: 'ic' or 'io'",
+    )
+    parser.add_argument(
+        "--spec",
+        type=Reorder.parse,
+        help="permutation spec string, or one of the presets: " + ", ".join(PRESETS),
+    )
+    parser.add_argument(
+        "--inverse", action="store_true", help="apply the inverse of --spec"
+    )
+    parser.add_argument("input", metavar="INPUT", type=Path, nargs="?")
+    parser.add_argument("output", metavar="OUTPUT", type=Path, nargs="?")
+    args = parser.parse_args()
+    smoke_test_reorder_msx_rom()
+
+    if args.spec:
+        if not (args.input and args.output):
+            parser.error("--spec needs INPUT and OUTPUT")
+        reorder = args.spec.inverse() if args.inverse else args.spec
+        with open(args.input, "rb") as infile, open(args.output, "wb") as outfile:
+            reorder.apply_stream(infile, outfile)
+        print(f"Converted {args.input} → {args.output} ({reorder})")
+    elif not (args.io and args.ic and args.to):
+        parser.error("either --io, --ic and --to or --spec, INPUT and OUTPUT are needed")
+    elif args.to == "ic":
+        data = args.io.read_bytes()
+        assert len(data) in {2**17, 2**18}, f"Unexpected ROM size: {len(data)} bytes"
+        args.ic.write_bytes(reorder_bits_to_ic(data))
+        print(f"Converted {args.io} → {args.ic} (I/O-ordered → IC-ordered)")
+    else:
+        data = args.ic.read_bytes()
+        assert len(data) in {2**17, 2**18}, f"Unexpected ROM size: {len(data)} bytes"
+        args.io.write_bytes(reorder_bits_to_io(data))
+        print(f"Converted {args.ic} → {args.io} (IC-ordered → I/O-ordered)")
+
+
+if __name__ == "__main__":
+    main()
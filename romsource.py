@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+
+"""
+zero-copy ROM loading and in-place layout assembly shared by the tools
+
+Input files are handed around as read-only `memoryview`s (large ones
+memory-mapped, small ones read in), so slicing out a page or a glyph does not copy
+anything. Derived layouts are written into a single `Layout` buffer
+allocated at its final size, instead of being grown with `+` one
+piece at a time, which copies everything assembled so far at each
+step.
+
+usage: python3 romsource.py
+
+(running it performs a quick self-test)
+"""
+
+import mmap
+import os
+import tempfile
+
+MMAP_THRESHOLD = 1024 * 1024
+
+
+def map_rom(path):
+    """
+    return a read-only `memoryview` of the file named by `path`: images larger than `MMAP_THRESHOLD` bytes are memory-mapped (the mapping and its file descriptor are closed once no view of it is left), smaller ones are read in so that nothing stays open
+    """
+    with open(path, "rb") as f:
+        try:
+            if os.fstat(f.fileno()).st_size > MMAP_THRESHOLD:
+                return memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+        except (ValueError, OSError):  # pipes, /dev/fd/0 ...
+            pass
+        return memoryview(f.read()).toreadonly()
+
+
+def halves(data):
+    """
+    return the two halves of `data`, for ROM images stored as two concatenated pages
+    """
+    assert len(data) % 2 == 0
+    return [data[: len(data) // 2], data[len(data) // 2 :]]
+
+
+def glyphs(data, size=32):
+    """
+    return the `size`-byte glyphs in `data` as a list of views (a short last glyph is dropped)
+    """
+    data = memoryview(data)
+    return [data[i : i + size] for i in range(0, len(data) - size + 1, size)]
+
+
+class Layout:
+    """
+    a preallocated output buffer of `size` bytes initially set to `fill`, written in place
+    """
+
+    __slots__ = ("buf",)
+
+    def __init__(self, size, fill=0x00):
+        self.buf = bytearray([fill]) * size
+
+    def __len__(self):
+        return len(self.buf)
+
+    def write(self, data, offset=0, step=1):
+        """
+        copy `data` to every `step`-th byte starting at `offset`; bytes past the end of the layout are dropped
+        """
+        count = min(len(data), len(range(offset, len(self.buf), step)))
+        self.buf[offset : offset + step * count : step] = memoryview(data)[:count]
+
+    def fill(self, value, start, stop):
+        """
+        set the bytes from `start` up to `stop` to `value`
+        """
+        stop = min(stop, len(self.buf))
+        if stop > start:
+            self.buf[start:stop] = bytes([value]) * (stop - start)
+
+    def interleave(self, pages, offset=0):
+        """
+        write `pages` interleaved byte by byte starting at `offset`
+        """
+        assert len({len(page) for page in pages}) == 1
+        for i, page in enumerate(pages):
+            self.write(page, offset + i, len(pages))
+
+    def view(self):
+        """
+        return a read-only `memoryview` of the whole layout
+        """
+        return memoryview(self.buf).toreadonly()
+
+
+def smoke_test_romsource():
+    layout = Layout(8, 0xFF)
+    layout.interleave([b"\0\2", b"\1\3"])
+    layout.write(b"\4\5\6", 6)
+    layout.fill(0x07, 4, 6)
+    assert layout.view() == b"\0\1\2\3\7\7\4\5"
+    assert [bytes(g) for g in glyphs(b"abcde", 2)] == [b"ab", b"cd"]
+    assert halves(b"abcd") == [b"ab", b"cd"]
+    assert map_rom(__file__)[:2] == b"#!" and map_rom(__file__).readonly
+    with tempfile.NamedTemporaryFile() as f:
+        f.write(bytes(MMAP_THRESHOLD) + b"!")
+        f.flush()
+        big = map_rom(f.name)
+        assert isinstance(big.obj, mmap.mmap) and big[-1:] == b"!"
+
+
+if __name__ == "__main__":
+    smoke_test_romsource()
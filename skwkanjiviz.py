@@ -6,7 +6,12 @@ quick-and-dirty visualizer for font data from:
 """
 
 
-from PIL import Image, ImageDraw
+import numpy as np
+from PIL import ImageDraw
+
+from kanjisheet import GlyphBlitter, new_sheet
+from oldjis import missing_from_old_jis
+from romsource import Layout, map_rom
 
 import codecs
 import gzip
@@ -14,61 +19,77 @@ import sys
 import unicodedata
 
 
+# byte o of a 16x16 cell (two bytes per row) is byte GLYPH_ORDER[o] of
+# the glyph, which is stored as 8x8 quadrants in the order
+# top left, bottom left, top right, bottom right
+GLYPH_ORDER = np.array(
+    [q + i + half for q in (0, 8) for i in range(8) for half in (0, 16)]
+)
+
+
 def shuffle_glyph(glyph):
     assert len(glyph) == 32
-    return b"".join(
-        [glyph[i : 1 + i] + glyph[16 + i : 17 + i] for i in range(8)]
-        + [glyph[8 + i : 9 + i] + glyph[24 + i : 25 + i] for i in range(8)]
-    )
+    return np.frombuffer(glyph, dtype=np.uint8)[GLYPH_ORDER].tobytes()
 
 
-def shuffle_kanji_cc(ch):
+def shuffle_kanji_cc(count):
+    """return the glyph index in the ROM for each of `count` glyphs"""
     # TODO: possibly add mappings from more recent SJIS to equivalent
     # MSX extensions to 78JIS?
-    return ch
+    return np.arange(count)
 
 
-def shuffle_kanji(k):
+def shuffle_kanji(k, cc=None):
+    """the glyphs in `k` as 16x16 cells, in the order of the glyph index array `cc` (default `shuffle_kanji_cc`)"""
     assert len(k) % 32 == 0
-    return b"".join(
-        shuffle_glyph(
-            b"".join(bytes([k[32 * shuffle_kanji_cc(ch) + o]]) for o in range(32))
-        )
-        for ch in range(len(k) // 32)
-    )
+    glyphs = np.frombuffer(k, dtype=np.uint8).reshape(-1, 32)
+    if cc is None:
+        cc = shuffle_kanji_cc(len(glyphs))
+    return glyphs[np.asarray(cc)[:, None], GLYPH_ORDER].tobytes()
 
 def expand_kanji(k, xk):
     """Expand kanji data and mask from 94x94 to 96x96"""
-    k, xk = (
-        32 * 96 * b"\0" + b"".join(32*b"\0" + k[i:32*94+i] + 32*b"\0" for i in range(0, len(k), 32*94)),
-        32 * 96 * b"\xFF" + b"".join(32*b"\xFF" + xk[i:32*94+i] + 32*b"\xFF" for i in range(0, len(xk), 32*94)),
+    # each ku row gets an empty cell on both sides, ku 0 is empty, and the
+    # rows from ku 44 on move down to ku 12 (at least one row's worth)
+    row = 96 * 32
+    size = 96 * 32 + sum(
+        32 + len(k[i : 32 * 94 + i]) + 32 for i in range(0, len(k), 32 * 94)
     )
-    k, xk = (
-        k[:12*96*32]+k[(48-4)*96*32:]+b"\0"*(96*32-len(k[(48-4)*96*32:]))+k[(16-4)*96*32:(48-4)*96*32],
-        xk[:12*96*32]+xk[(48-4)*96*32:]+b"\xFF"*(96*32-len(k[(48-4)*96*32:]))+xk[(16-4)*96*32:(48-4)*96*32],
+    tail = max(size - (48 - 4) * row, row)
+
+    def moved(o):
+        if o < 12 * row:
+            return o
+        if o >= (48 - 4) * row:
+            return o - (48 - 4) * row + 12 * row
+        return o + tail
+
+    out_size = (
+        min(size, 12 * row) + tail + max(0, min(size, (48 - 4) * row) - 12 * row)
     )
-    return (k, xk)
+    out_k, out_xk = Layout(out_size), Layout(out_size, 0xFF)
+    for ku, i in enumerate(range(0, len(k), 32 * 94), 1):
+        out_k.write(k[i : 32 * 94 + i], moved(ku * row) + 32)
+        out_xk.write(xk[i : 32 * 94 + i], moved(ku * row) + 32)
+    return (out_k.view(), out_xk.view())
 
 
-def skwkanjiviz(kanji_roms, skwkanji_png):
-    """Given input files named by `kanji_roms` containing Yamaha SKW-01 KAnji Word Processor Unit Kanji font ROM data, produce a visualization and save it as a PNG in the output file named by `skwkanji_png`."""
-    b = b"".join([open(kanji_rom, "rb").read() for kanji_rom in kanji_roms])
+def skwkanji_layout(kanji_roms):
+    """Given input files named by `kanji_roms` containing Yamaha SKW-01 Kanji font ROM data, return `(b, xb)`: the glyph data laid out as 16x16 cells in 96x96 JIS order, and the matching mask data."""
+    b = b"".join([map_rom(kanji_rom) for kanji_rom in kanji_roms])
     b = shuffle_kanji(b)
     xb = b"\0" * len(b)
     b, xb = expand_kanji(b, xb)
+    return b, xb
+
+
+def skwkanjiviz(kanji_roms, skwkanji_png, indexed=False):
+    """Given input files named by `kanji_roms` containing Yamaha SKW-01 KAnji Word Processor Unit Kanji font ROM data, produce a visualization and save it as a PNG in the output file named by `skwkanji_png`. With `indexed`, the PNG is an 8-bit palette image instead of RGBA."""
+    b, xb = skwkanji_layout(kanji_roms)
 
     def cvtr(r):
         return 0 * 1 + r + 3 * (r >= 13)
 
-    def rtok(byts):
-        return (
-            byts.decode("EUC-JP", "ignore")
-            .encode("iso2022_jp_1", "ignore")
-            .decode("iso2022_jp_1", "ignore")
-            .encode("EUC-JP")
-            == byts
-        )
-
     def invc(cc):
         if cc // 96 == 2 and cc % 96 not in range(
             1, 14 + 1
@@ -78,16 +99,7 @@ def skwkanjiviz(kanji_roms, skwkanji_png):
             return True  # added in 83jis, not in 78jis
         if cc // 96 == 84 - 4 and cc % 96 in {5, 6}:
             return True  # added in 90jis, not in 78jis / 83jis
-        return (
-            not rtok(
-                bytes(
-                    [
-                        min(cvtr(cc // 96), 95) + 0xA0,
-                        cc % 96 + 0xA0,
-                    ]
-                )
-            )
-        )
+        return missing_from_old_jis(min(cvtr(cc // 96), 95), cc % 96)
 
     z = 16
 
@@ -105,8 +117,8 @@ def skwkanjiviz(kanji_roms, skwkanji_png):
     k3 = (255, 255, 255)
     w4 = (0, 255, 255)
 
-    im = Image.new(
-        "RGBA",
+    palette = [k, w, g, h, v, w1, k1, w2, k2, w3, k3, w4]
+    im, inks = new_sheet(
         (
             max((z + 1) * z, 16) * 16,
             (
@@ -116,8 +128,11 @@ def skwkanjiviz(kanji_roms, skwkanji_png):
             * 16
             + 8,
         ),
+        palette,
         g,
+        indexed,
     )
+    k, w, g, h, v, w1, k1, w2, k2, w3, k3, w4 = inks
 
     def kuten_ch(kuten):
         return (
@@ -125,31 +140,15 @@ def skwkanjiviz(kanji_roms, skwkanji_png):
             + kuten[1]
         )
 
-    def putkuten_at(dr, kuten, coords, color_pair):
-        x, y = coords
-        fg, bg = color_pair
-        for i in range(256):
-            dr.point(
-                (x + i % 16, y + i // 16),
-                (fg if b[kuten_ch(kuten) * 32 + (i // 8)] & (0x80 >> (i % 8)) else bg),
-            )
+    def putkuten_at(text, kuten, coords, color_pair):
+        text.blit((16, b[kuten_ch(kuten) * 32 :][:32], b""), coords, color_pair)
 
-    def putch_at(dr, ch, coords, color_pair, font, scale=1):
-        x, y = coords
-        fg, bg = color_pair
+    def putch_at(text, ch, coords, color_pair, font, scale=1):
         byt = ord(ch.encode("SJIS"))
-        for i in range(128):
-            dr.point(
-                (x + i % 8, y + i // 8),
-                (
-                    fg
-                    if b[8 * 96 * 32 + 32 * (byt - 0x20 * (2 if (byt & 0x80) else 1)) + 2 * (i // 8)]
-                    & (0x80 >> (i % 8))
-                    else bg
-                ),
-            )
+        o = 8 * 96 * 32 + 32 * (byt - 0x20 * (2 if (byt & 0x80) else 1))
+        text.blit((8, b[o : o + 32 : 2], b""), coords, color_pair)
 
-    def puts_at(dr, s, coords, color_pair, font=0, scale=1):
+    def puts_at(text, s, coords, color_pair, font=0, scale=1):
         x, y = coords
         if font != 2:
             s = unicodedata.normalize("NFD", s)
@@ -163,7 +162,7 @@ def skwkanjiviz(kanji_roms, skwkanji_png):
             ):
                 kuten = [byt - 0xA0 for byt in ch.encode("EUC-JP")]
                 putkuten_at(
-                    dr,
+                    text,
                     kuten,
                     (x + 8 * scale * i, y),
                     color_pair,
@@ -179,7 +178,7 @@ def skwkanjiviz(kanji_roms, skwkanji_png):
             elif ch == "\N{UPWARDS ARROW}":
                 ch = "^"
             putch_at(
-                dr,
+                text,
                 ch,
                 (x + (6 if font == 1 else 8) * scale * i, y),
                 color_pair,
@@ -187,48 +186,48 @@ def skwkanjiviz(kanji_roms, skwkanji_png):
                 scale,
             )
 
-    dr = ImageDraw.Draw(im)
+    text = GlyphBlitter(im)
     puts_at(
-        dr,
+        text,
         " SKW-01 Kanji ROM ",
         (16 * 16 + 8, 0),
         (v, h),
         font=2,
     )
     puts_at(
-            dr,
+            text,
             "  Halfwidth Roman and Katakana (ｶﾀｶﾅ) set (8x16)",
             (16 * 16 + 4, 52),
             (k3, w3),
             font=2,
         )
     puts_at(
-            dr,
+            text,
             "\N{DOWNWARDS ARROW} (row number)",
             ((16 + 1) * 16 + 8, (16 - (96 + z - 1) // z - 1) * 16 - 4),
             (w1, k),
         )
     puts_at(
-            dr,
+            text,
             "\N{DOWNWARDS ARROW} (unallocated in 78JIS)",
             ((32 + z + 4) * 16 + 8, (16 - (96 + z - 1) // z - 1) * 16 - 4),
             (w2, k),
         )
     puts_at(
-            dr,
+            text,
             "fullwidth character set (extended 78JIS)",
             (16 * 16 + 8, (16 - (96 + z - 1) // z - 2) * 16 - 4),
             (w, k),
         )
     for i in range(96):
         puts_at(
-                dr,
+                text,
                 "%02d" % i,
                 (16 * (i % z + 3 * (z + 1) - z // 2), 24 + 16 * (i // z)),
                 ([w1, k][i % 2], [k, w1][i % 2]),
             )
         puts_at(
-            dr,
+            text,
             "\N{LEFTWARDS ARROW} (column number key)",
             (-12 + 16 * (4 * (z + 1) - z // 2), 24 + 12),
             (w1, k),
@@ -248,6 +247,9 @@ def skwkanjiviz(kanji_roms, skwkanji_png):
             + 16
         )
 
+    cell_invc = [invc(cc) for cc in range(len(b) // 32)]
+    dr = ImageDraw.Draw(im)
+
     for i in range(8 * 32 * 96, 8 * len(b)):
         if (i // (8 * 32) % 96) in {0, 95}:
             continue
@@ -273,13 +275,13 @@ def skwkanjiviz(kanji_roms, skwkanji_png):
                         w2,
                         w1,
                     ]
-                )[2 * invc(i // 256) + (xb[i // 8] != 0)],
+                )[2 * cell_invc[i // 256] + (xb[i // 8] != 0)],
             )
     for i in range(1, 96 - 3):
             if i * 96 * 32 >= len(b):
                 continue
             puts_at(
-                dr,
+                text,
                 f"{i + (3 if i >= 13 else 0):02d}",
                 (
                     16 * chx(96 * i),
@@ -288,7 +290,7 @@ def skwkanjiviz(kanji_roms, skwkanji_png):
                 (k, w1),
             )
             puts_at(
-                dr,
+                text,
                 f"{i + (3 if i >= 13 else 0):02d}",
                 (
                     16 * chx(96 * i + 95),
@@ -297,14 +299,14 @@ def skwkanjiviz(kanji_roms, skwkanji_png):
                 (k, w1),
             )
     puts_at(
-            dr,
+            text,
             "漢字、ひらがな、カタカナ、Ｒｏｍａｊｉ、ｶﾀｶﾅ､Romaji",
             (16 * 16 + 4, 88),
             (v, h),
             font=2,
         )
     puts_at(
-            dr,
+            text,
             "月火水木金土日年円時分秒百千万大中小",
             (16 * 16 + 4, 104),
             (v, h),
@@ -315,11 +317,12 @@ def skwkanjiviz(kanji_roms, skwkanji_png):
 
 def main():
     kanji_roms = []
-    (  # usage: python skwkanjiviz.py FONT1.ROM OUTPUT
+    indexed = "--indexed" in sys.argv
+    (  # usage: python skwkanjiviz.py [ --indexed ] FONT1.ROM OUTPUT
         _, skwkanji_rom, skwkanji_png
-    ) = sys.argv
+    ) = [arg for arg in sys.argv if arg != "--indexed"]
     kanji_roms = [skwkanji_rom]
-    skwkanjiviz(kanji_roms, skwkanji_png)
+    skwkanjiviz(kanji_roms, skwkanji_png, indexed)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,360 @@
+#!/usr/bin/env python3
+
+"""
+transcode text files, e.g. BASIC listings, between character sets
+
+usage: python3 transcode.py [ --from CHARSET; default utf-8 ] [ --to CHARSET; default utf-8 ] [ --errors strict|replace|report; default strict ] [ -j JOBS; default 1 ] [ --glob PATTERN; default *.asc and *.txt ] [ -o OUTPUT; default /dev/fd/1 ] INPUT [INPUT ...]
+
+CHARSET is any Python codec, including `pc6001-8bit` and `msxjp-8bit` from charsets.py
+
+each INPUT is a file, or a directory which is searched for files matching the --glob patterns (which may be repeated); with a single INPUT file OUTPUT is the output file, otherwise it is a directory the files are written to under the same relative paths (for a directory INPUT, relative to the directory)
+
+with --errors strict the first character with no mapping stops that file, which is not written (nor any of it to stdout); with --errors replace each one is replaced (by `?`, or U+FFFD when decoding), and with --errors report each one is also listed with its location. The characters with no mapping are counted for each file either way
+
+files are read and written a chunk at a time, so memory use does not grow with their size; with -j, JOBS files are transcoded at once in separate processes
+"""
+
+import argparse
+import bisect
+import codecs
+import collections
+import concurrent.futures
+import contextlib
+import io
+import itertools
+import re
+import shutil
+import sys
+import tempfile
+import threading
+import unicodedata
+from pathlib import Path
+
+import charsets  # registers the pc6001-8bit and msxjp-8bit codecs
+
+CHUNK_SIZE = 64 * 1024
+DEFAULT_GLOBS = ("*.asc", "*.txt")
+
+_handler_names = itertools.count()
+_free_handlers = []
+_handlers_lock = threading.Lock()
+
+
+@contextlib.contextmanager
+def _error_handler(stats):
+    """
+    name a codec error handler passing the errors in the block to `stats`; each block gets a name of its own, so transcodes on the same thread do not interfere, and names are only registered once and then reused
+    """
+    with _handlers_lock:
+        if _free_handlers:
+            name, target = _free_handlers.pop()
+        else:
+            name, target = f"transcode-{next(_handler_names)}", [None]
+            codecs.register_error(name, lambda exc: target[0].unmappable_found(exc))
+    target[0] = stats
+    try:
+        yield name
+    finally:
+        target[0] = None
+        with _handlers_lock:
+            _free_handlers.append((name, target))
+
+
+def describe(ch):
+    """
+    return a description of the character (or undecodable bytes) `ch` for messages
+    """
+    if isinstance(ch, bytes):
+        return ch.hex(" ").upper()
+    return f"U+{ord(ch):04X} {unicodedata.name(ch, repr(ch))}"
+
+
+class Stats:
+    """
+    the sizes of one transcoded file and the characters in it with no mapping
+
+    `unmappable` counts each character (or run of undecodable bytes); with `report` the location of each one is written to stderr as it is found.
+    """
+
+    def __init__(self, path, report=False, errors="strict"):
+        self.path = path
+        self.report = report
+        self.errors = errors
+        self.bytes_in = self.bytes_out = 0
+        self.unmappable = collections.Counter()
+        self.failure = None
+        self.line, self.column = 1, 1
+        self._offset = 0
+        self._pending = []
+
+    def unmappable_found(self, exc):
+        bad = exc.object[exc.start : exc.end]
+        if isinstance(exc, UnicodeDecodeError):
+            self.unmappable[bad] += 1
+            where = f"{self.path}: byte {self._offset + exc.start}"
+            self._found(f"{where}: {describe(bad)} cannot be decoded as {exc.encoding}")
+            if self.errors == "strict":
+                raise exc
+            return "\ufffd", exc.end
+        # encoding positions are worked out a chunk at a time, in `advance`
+        for i, ch in enumerate(bad):
+            self.unmappable[ch] += 1
+            self._pending.append((exc.start + i, ch, exc.encoding))
+        if self.errors == "strict":
+            raise exc
+        return "?" * len(bad), exc.end
+
+    def _found(self, message):
+        if self.errors == "strict":
+            self.failure = message
+        elif self.report:
+            print(message, file=sys.stderr)
+
+    def decoding(self, buffered):
+        """
+        note that the next chunk is decoded after `buffered` bytes still held by the decoder
+        """
+        self._offset = self.bytes_in - buffered
+
+    def advance(self, text):
+        """
+        note the locations of the characters with no mapping in the chunk `text` just encoded, and move past it
+        """
+        if self._pending:
+            newlines = [m.start() for m in re.finditer("\n", text)]
+            for i, ch, encoding in self._pending:
+                k = bisect.bisect_left(newlines, i)
+                line = self.line + k
+                column = i - newlines[k - 1] if k else self.column + i
+                where = f"{self.path}:{line}:{column}"
+                self._found(f"{where}: {describe(ch)} has no mapping in {encoding}")
+            self._pending = []
+        last = text.rfind("\n")
+        self.line += text.count("\n")
+        self.column = len(text) - last if last >= 0 else self.column + len(text)
+
+    def __str__(self):
+        summary = f"{self.path}: {self.bytes_in} → {self.bytes_out} bytes"
+        if self.unmappable:
+            summary += f", {sum(self.unmappable.values())} with no mapping: " + ", ".join(
+                f"{describe(ch)} ×{count}" for ch, count in self.unmappable.most_common()
+            )
+        if self.failure:
+            summary += ", not written"
+        return summary
+
+
+def transcode(
+    infile,
+    outfile,
+    stats,
+    decoding="utf-8",
+    encoding="utf-8",
+    chunk_size=CHUNK_SIZE,
+):
+    """
+    transcode the binary file `infile` from `decoding` to `encoding` into `outfile` a chunk at a time, counting into `stats`; with `stats.errors` "strict" a character with no mapping raises `UnicodeError`
+    """
+    with _error_handler(stats) as errors:
+        decoder = codecs.getincrementaldecoder(decoding)(errors)
+        encoder = codecs.getincrementalencoder(encoding)(errors)
+        while True:
+            chunk = infile.read(chunk_size)
+            stats.decoding(len(decoder.getstate()[0]))
+            stats.bytes_in += len(chunk)
+            text = decoder.decode(chunk, final=not chunk)
+            try:
+                byts = encoder.encode(text, final=not chunk)
+            finally:
+                stats.advance(text)
+            outfile.write(byts)
+            stats.bytes_out += len(byts)
+            if not chunk:
+                return stats
+
+
+def transcode_file(source, destination, decoding, encoding, errors="strict"):
+    """
+    transcode the file `source` into `destination` (None for stdout), which is only replaced once it is complete; return its `Stats`
+    """
+    stats = Stats(source, errors == "report", errors)
+    with open(source, "rb") as infile:
+        if destination is None:
+            # with errors "strict" the output is held back (on disk once it
+            # is large) until the whole file is transcoded
+            if errors == "strict":
+                spool = tempfile.SpooledTemporaryFile(CHUNK_SIZE)
+            else:
+                spool = contextlib.nullcontext(sys.stdout.buffer)
+            with spool as outfile:
+                try:
+                    transcode(infile, outfile, stats, decoding, encoding)
+                except UnicodeError as e:
+                    stats.failure = stats.failure or f"{source}: {e}"
+                if outfile is not sys.stdout.buffer and not stats.failure:
+                    outfile.seek(0)
+                    shutil.copyfileobj(outfile, sys.stdout.buffer, CHUNK_SIZE)
+            sys.stdout.flush()
+            return stats
+        destination.parent.mkdir(parents=True, exist_ok=True)
+        partial = destination.with_name(f".{destination.name}.partial")
+        with open(partial, "wb") as outfile:
+            try:
+                transcode(infile, outfile, stats, decoding, encoding)
+            except UnicodeError as e:
+                stats.failure = stats.failure or f"{source}: {e}"
+    if stats.failure:
+        partial.unlink()
+    else:
+        partial.replace(destination)
+    return stats
+
+
+def find_files(inputs, globs=DEFAULT_GLOBS):
+    """
+    return the `(path, relative path)` of each file named in `inputs` or matching `globs` in a directory named there
+    """
+    found = []
+    for name in inputs:
+        path = Path(name)
+        if not path.is_dir():
+            found.append((path, Path(path.name)))
+            continue
+        matches = {match for pattern in globs for match in path.rglob(pattern)}
+        found += [(match, match.relative_to(path)) for match in sorted(matches)]
+    return found
+
+
+def _transcode_job(job):
+    return transcode_file(*job)
+
+
+def smoke_test_transcode():
+    text = '10 PRINT "ﾊﾟﾋﾟｺﾝ だいすき"\r\n20 PRINT "漢字"\r\n' * 1000
+    data = text.replace("漢字", "??").encode("pc6001-8bit")
+    for size in (1, 7, CHUNK_SIZE):
+        outfile = io.BytesIO()
+        stats = Stats("t")
+        transcode(io.BytesIO(data), outfile, stats, "pc6001-8bit", chunk_size=size)
+        assert outfile.getvalue().decode() == data.decode("pc6001-8bit")
+        assert (stats.bytes_in, stats.bytes_out) == (len(data), len(outfile.getvalue()))
+        outfile = io.BytesIO()
+        stats = Stats("t", errors="replace")
+        infile = io.BytesIO(text.encode())
+        transcode(infile, outfile, stats, encoding="pc6001-8bit", chunk_size=size)
+        assert outfile.getvalue() == data, size
+        assert stats.unmappable == {"漢": 1000, "字": 1000}
+        assert (stats.line, stats.column) == (2001, 1)
+    stats = Stats("t")
+    try:
+        transcode(io.BytesIO(text.encode()), io.BytesIO(), stats, encoding="msxjp-8bit")
+        assert False, "no error"
+    except UnicodeEncodeError:
+        pass
+    assert stats.failure == "t:2:11: U+6F22 CJK UNIFIED IDEOGRAPH-6F22 has no mapping in msxjp-8bit"
+    stats = Stats("t", errors="replace")
+    outfile = io.BytesIO()
+    transcode(io.BytesIO(b"a\xffb"), outfile, stats, chunk_size=1)
+    assert outfile.getvalue() == "a\ufffdb".encode() and stats.unmappable == {b"\xff": 1}
+    # a transcode nested on the same thread keeps its errors to itself
+    inner = Stats("inner", errors="replace")
+
+    class NestedReads(io.BytesIO):
+        def read(self, size=-1):
+            transcode(io.BytesIO(b"\xfe"), io.BytesIO(), inner)
+            return super().read(size)
+
+    stats = Stats("t", errors="replace")
+    transcode(NestedReads(b"a\xffb"), io.BytesIO(), stats, chunk_size=1)
+    assert stats.unmappable == {b"\xff": 1} and inner.unmappable == {b"\xfe": 4}
+    # nothing of a file that fails goes to stdout, not even the chunks before
+    with tempfile.TemporaryDirectory() as tmp:
+        source = Path(tmp) / "t.txt"
+        stdout = sys.stdout
+        cases = (("A" * CHUNK_SIZE + "漢", "strict"), ("ﾊﾟ漢", "replace"))
+        for text, errors in cases:
+            source.write_text(text)
+            sys.stdout = io.TextIOWrapper(io.BytesIO())
+            try:
+                stats = transcode_file(source, None, "utf-8", "msxjp-8bit", errors)
+                written = sys.stdout.buffer.getvalue()
+            finally:
+                sys.stdout = stdout
+            if errors == "strict":
+                assert stats.failure and written == b"", len(written)
+            else:
+                assert written == "ﾊﾟ?".encode("msxjp-8bit")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Transcode text files between character sets, a chunk at a time."
+    )
+    parser.add_argument(
+        "--from",
+        dest="decoding",
+        metavar="CHARSET",
+        default="utf-8",
+        help="character set of the INPUT files (default utf-8)",
+    )
+    parser.add_argument(
+        "--to",
+        dest="encoding",
+        metavar="CHARSET",
+        default="utf-8",
+        help="character set of the OUTPUT files (default utf-8)",
+    )
+    parser.add_argument(
+        "--errors", choices=["strict", "replace", "report"], default="strict"
+    )
+    parser.add_argument(
+        "-j", "--jobs", type=int, default=1, help="files transcoded at once (default 1)"
+    )
+    parser.add_argument(
+        "--glob",
+        metavar="PATTERN",
+        action="append",
+        help="file name pattern for directory INPUTs, may be repeated"
+        " (default " + " and ".join(DEFAULT_GLOBS) + ")",
+    )
+    parser.add_argument("-o", "--output", metavar="OUTPUT")
+    parser.add_argument("inputs", metavar="INPUT", nargs="+")
+    args = parser.parse_args()
+    smoke_test_transcode()
+    for name in (args.decoding, args.encoding):
+        try:
+            codecs.lookup(name)
+        except LookupError:
+            parser.error(f"unknown character set {name!r}")
+    files = find_files(args.inputs, args.glob or DEFAULT_GLOBS)
+    output = args.output and Path(args.output)
+    if len(args.inputs) == 1 and not Path(args.inputs[0]).is_dir():
+        single = output is None or not output.is_dir()
+    else:
+        single = False
+    if single:
+        jobs = [(files[0][0], output)]
+    else:
+        if not output:
+            parser.error("-o is needed to name the OUTPUT directory")
+        relative = [path for _, path in files]
+        if len(set(relative)) != len(relative):
+            parser.error("some INPUT files would have the same OUTPUT name")
+        jobs = [(source, output / path) for source, path in files]
+    jobs = [(*job, args.decoding, args.encoding, args.errors) for job in jobs]
+    failed = False
+    with concurrent.futures.ProcessPoolExecutor(args.jobs) as executor:
+        results = executor.map(_transcode_job, jobs) if args.jobs > 1 else map(
+            _transcode_job, jobs
+        )
+        for stats in results:
+            if stats.failure:
+                print(stats.failure, file=sys.stderr)
+                failed = True
+            print(stats, file=sys.stderr)
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+
+"""
+typeset UTF-8 text with ROM fonts
+
+Full-width characters come from the Kanji ROM and half-width ones from
+the CGROM, BIOS or Kanji ROM half-width font, encoded the same way the
+visualizers label their sheets. Each character is turned into one or
+more 8x16 tiles the first time it is seen; the page is then a grid of
+tile numbers, and the whole image comes out of a single NumPy gather.
+
+usage: python3 typeset.py --font FORMAT --rom ROM [ --rom ROM ... ] [ --columns N ] -o OUTPUT.png [ INPUT.txt; default /dev/fd/0 ]
+
+FORMAT is one of exkanji, kanjirom, cgrom, nwp, msx or skw, and the
+ROMs are given in the same order as for the matching visualizer.
+"""
+
+import argparse
+import unicodedata
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+from charsets import encode_msxjp_8bit_charset, encode_pc6001_8bit_charset
+from glyphfont import GlyphFont
+
+
+def _encode_jisx0201(ch):
+    byts = ch.encode("SJIS", "ignore")
+    return [byts[0]] if len(byts) == 1 else None
+
+
+def _encode_pc6001(ch):
+    try:
+        byts = encode_pc6001_8bit_charset(ch)
+    except UnicodeEncodeError:
+        return None
+    if byts[:1] == b"\x14" and len(byts) == 2:
+        return [byts[1] - 0x30]
+    return list(byts)
+
+
+def _encode_msxjp(ch):
+    try:
+        byts = encode_msxjp_8bit_charset(ch)
+    except UnicodeEncodeError:
+        return None
+    if byts[:1] == b"\x01" and len(byts) == 2:
+        return [byts[1] - 0x40]
+    return list(byts)
+
+
+# how to load each ROM set from the list of ROM images, and how to
+# encode characters for its half-width font
+FORMATS = {
+    "exkanji": (lambda roms: GlyphFont.from_exkanji(*roms), _encode_jisx0201),
+    "kanjirom": (GlyphFont.from_kanjirom, None),
+    "cgrom": (
+        lambda roms: GlyphFont.from_cgrom(*roms[:1], *roms[1:2], roms[2:]),
+        _encode_pc6001,
+    ),
+    "nwp": (lambda roms: GlyphFont.from_nwp(*roms), _encode_pc6001),
+    "msx": (lambda roms: GlyphFont.from_msx(roms[0], roms[1:]), _encode_msxjp),
+    "skw": (GlyphFont.from_skw, _encode_jisx0201),
+}
+
+
+class Typesetter:
+    """
+    lay out text in a `GlyphFont` as a grid of 8x16 tiles
+
+    `encode_halfwidth` turns one character into a list of half-width codes, or returns None if it cannot. Tiles are kept in `tiles`, tile 0 being blank, and the tiles for each character are remembered in a dictionary, so each distinct character is only looked up and unpacked once.
+    """
+
+    __slots__ = ("font", "encode_halfwidth", "tiles", "_cells")
+
+    def __init__(self, font, encode_halfwidth=None):
+        self.font = font
+        self.encode_halfwidth = encode_halfwidth
+        self.tiles = [np.zeros((16, 8), dtype=bool)]
+        self._cells = {}
+
+    def _add_tile(self, tile):
+        self.tiles.append(tile)
+        return len(self.tiles) - 1
+
+    def _fullwidth(self, ch):
+        glyph = self.font.unicode(ch)
+        if glyph is None:
+            return None
+        bits = np.unpackbits(np.frombuffer(glyph, dtype=np.uint8)).reshape(16, 16)
+        bits = bits != 0
+        return self._add_tile(bits[:, :8]), self._add_tile(bits[:, 8:])
+
+    def _halfwidth(self, ch):
+        codes = self.encode_halfwidth and self.encode_halfwidth(ch)
+        glyphs = [self.font.halfwidth(code) for code in codes or ()]
+        if not glyphs or None in glyphs:
+            return None
+        cells = []
+        for glyph in glyphs:
+            # half-width glyphs may be strided views, and fewer than 16 rows high
+            bits = np.unpackbits(np.frombuffer(bytes(glyph), dtype=np.uint8))
+            bits = bits.reshape(-1, 8) != 0
+            cells.append(self._add_tile(bits[np.arange(16) * len(bits) // 16]))
+        return tuple(cells)
+
+    def cells(self, ch):
+        """
+        return the tile numbers for the character `ch`, one per 8-pixel column
+        """
+        cells = self._cells.get(ch)
+        if cells is None:
+            wide = unicodedata.east_asian_width(ch) in "WF"
+            cells = (
+                (wide and self._fullwidth(ch))
+                or self._halfwidth(ch)
+                or self._fullwidth(ch)
+                or (ch != "?" and self.cells("?"))
+                or (0,)
+            )
+            self._cells[ch] = cells
+        return cells
+
+    def layout(self, text, columns=None):
+        """
+        return a 2D array of tile numbers for `text`, wrapping lines longer than `columns` half-width columns
+        """
+        rows = []
+        for line in text.expandtabs(8).splitlines():
+            row = []
+            for ch in line:
+                if unicodedata.category(ch) in ("Cc", "Mn"):
+                    continue
+                cells = self.cells(ch)
+                if columns and row and len(row) + len(cells) > columns:
+                    rows.append(row)
+                    row = []
+                row.extend(cells)
+            rows.append(row)
+        grid = np.zeros((len(rows), max(map(len, rows), default=0)), dtype=np.intp)
+        for y, row in enumerate(rows):
+            grid[y, : len(row)] = row
+        return grid
+
+    def render(self, text, columns=None, colors=((0, 0, 0), (255, 255, 255))):
+        """
+        return `text` typeset as a two-colour "P" image, `colors` being the background and foreground
+        """
+        grid = self.layout(text, columns)
+        pixels = np.stack(self.tiles)[grid].transpose(0, 2, 1, 3)
+        pixels = pixels.reshape(16 * grid.shape[0], 8 * grid.shape[1])
+        im = Image.fromarray(pixels.astype(np.uint8), "P")
+        im.putpalette(b"".join(bytes(color[:3]) for color in colors), "RGB")
+        return im
+
+
+def typeset(text, fmt, roms, columns=None):
+    """
+    return `text` typeset with the ROM set `roms` in format `fmt` (a key of `FORMATS`) as a "P" image
+    """
+    load, encode_halfwidth = FORMATS[fmt]
+    return Typesetter(load(roms), encode_halfwidth).render(text, columns)
+
+
+def smoke_test_typeset():
+    data = bytearray(32 * 96 * 96)
+    data[32 * (96 * 16 + 1) : 32 * (96 * 16 + 2)] = b"\xff\x00" * 16  # 亜: left half
+    data[32 * 0x41 : 32 * 0x42] = b"\x80\x00" * 16  # A: leftmost column
+    pages = (([32 * c for c in range(256)], 2, 16),)
+    font = GlyphFont(data, bytes(len(data)), 0, tuple(range(96)), data, pages)
+    typesetter = Typesetter(font, _encode_jisx0201)
+    assert typesetter.cells("亜") == (1, 2) and typesetter.cells("A") == (3,)
+    grid = typesetter.layout("A亜\n\nAAA", columns=2)
+    assert grid.tolist() == [[3, 0], [1, 2], [0, 0], [3, 3], [3, 0]]
+    pixels = np.array(typesetter.render("A亜"))
+    assert pixels.shape == (16, 24)
+    assert (pixels[:, 0] == 1).all() and (pixels[:, 8:16] == 1).all()
+    assert pixels[:, 1:8].sum() == 0 and pixels[:, 16:].sum() == 0
+    # a 12-row half-width glyph is stretched to the full cell height
+    halfwidth = bytes(256 * 11) + b"\x80" * 256
+    pages = ((range(256), 256, 12),)
+    font = GlyphFont(data, bytes(len(data)), 0, tuple(range(96)), halfwidth, pages)
+    typesetter = Typesetter(font, _encode_jisx0201)
+    (cell,) = typesetter.cells("A")
+    assert typesetter.tiles[cell][:, 0].tolist() == [False] * 15 + [True]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Typeset UTF-8 text with ROM fonts."
+    )
+    parser.add_argument(
+        "--font", choices=FORMATS, required=True, help="ROM set format"
+    )
+    parser.add_argument(
+        "--rom",
+        metavar="PATH",
+        action="append",
+        required=True,
+        help="ROM image, repeated in the order the matching visualizer takes them",
+    )
+    parser.add_argument(
+        "--columns", type=int, help="wrap lines at this many half-width columns"
+    )
+    parser.add_argument(
+        "-o", "--output", metavar="PATH", type=Path, required=True, help="output PNG"
+    )
+    parser.add_argument(
+        "text", metavar="INPUT", type=Path, nargs="?", default=Path("/dev/fd/0")
+    )
+    args = parser.parse_args()
+    smoke_test_typeset()
+    text = args.text.read_text(encoding="utf-8")
+    typeset(text, args.font, args.rom, args.columns).save(args.output)
+
+
+if __name__ == "__main__":
+    main()